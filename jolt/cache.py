@@ -1,6 +1,7 @@
 import atexit
 import contextlib
 from collections import namedtuple, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime
 import fasteners
 import json
@@ -20,11 +21,28 @@ from jolt import tasks
 from jolt.options import JoltOptions
 from jolt.error import raise_error, raise_error_if
 from jolt.error import raise_task_error, raise_task_error_if
+from jolt.eviction import ArtifactEvictionPolicyRegister, ArtifactRecord
 from jolt.expires import ArtifactEvictionStrategyRegister
 
 
 DEFAULT_ARCHIVE_TYPE = ".tar.zst"
 
+ARTIFACT_COLUMNS = [
+    ("identity", "text PRIMARY KEY"),
+    ("name", "text"),
+    ("size", "integer"),
+    ("last_used", "timestamp"),
+    ("created", "timestamp"),
+    ("expires", "text"),
+    ("cost", "real"),
+    ("hits", "integer"),
+    ("priority", "real"),
+]
+ARTIFACT_SELECT = ", ".join(column for column, _ in ARTIFACT_COLUMNS)
+
+# A row in the artifact cache database table ``upload_queue``.
+UploadRecord = namedtuple("UploadRecord", ["identity", "name", "task", "canonical_name", "session", "pid", "queued"])
+
 
 def locked(func):
     def _f(self, *args, **kwargs):
@@ -962,6 +980,35 @@ class Artifact(object):
         return self._node.task
 
 
+class QueuedArtifact(Artifact):
+    """
+    An artifact restored from the upload queue.
+
+    The artifact isn't associated with a task. Only the information
+    required by storage providers to upload the artifact is available.
+    """
+
+    QueuedTask = namedtuple("QueuedTask", ["name", "canonical_name", "expires"])
+
+    def __init__(self, cache, record, tools):
+        self._queued_task = QueuedArtifact.QueuedTask(
+            record.task, record.canonical_name, expires.Immediately())
+        identity = record.identity.split("@", 1)[-1]
+        super().__init__(cache, None, name=record.name, identity=identity, tools=tools, session=True)
+        self._session = bool(record.session)
+        self._task = self._queued_task
+        self._full_name = f"{record.name}@{record.task}"
+        self._log_name = f"{self._full_name} {identity[:8]}"
+        self._path = cache._fs_get_artifact_path(self._identity, record.canonical_name)
+        self._temp = cache._fs_get_artifact_tmppath(self._identity, record.canonical_name)
+        self._archive = cache._fs_get_artifact_archivepath(self._identity, record.canonical_name)
+        self.reload()
+
+    @property
+    def task(self):
+        return self._queued_task
+
+
 class ArtifactToolsProxy(object):
     """
     An artifact proxy that uses a specific tools object.
@@ -1153,6 +1200,28 @@ class StorageProvider(object):
         """ Return True if downloading is enabled. Default is True. """
         return True
 
+    def download_path(self, artifact: Artifact, force: bool = False) -> str:
+        """
+        Return the path of an artifact archive which can be read directly.
+
+        Providers backed by a local or mounted file system may implement
+        this method to let the artifact be extracted in place, instead
+        of first being copied to the local cache by :func:`~jolt.StorageProvider.download`.
+        The method is called before :func:`~jolt.StorageProvider.download`
+        which is used as a fallback if extraction fails.
+
+        Args:
+            artifact (Artifact): The artifact to locate.
+            force (bool, optional): If True, the path should be returned
+                even if the download is disabled. The default is False.
+
+        Returns:
+            str: Path to the artifact archive, or None if the archive
+            can't be read directly.
+
+        """
+        return None
+
     def upload(self, artifact: Artifact, force: bool = False) -> bool:
         """
         Upload an artifact to the storage location.
@@ -1248,6 +1317,78 @@ class StorageProviderFactory(StorageProvider):
         pass
 
 
+class ArtifactUploadQueue(object):
+    """
+    Durable queue of artifacts pending upload to remote caches.
+
+    Artifacts are recorded in the cache database table ``upload_queue``
+    and are then uploaded by a pool of background threads, off the
+    critical path of the build. Queued artifacts are never evicted from
+    the local cache. A record is removed once its artifact has been
+    uploaded. Records left behind by failed uploads or by processes that
+    terminated prematurely are resumed by ``jolt upload --drain``.
+    """
+
+    def __init__(self, cache, max_workers):
+        self._cache = cache
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="Upload")
+        self._futures = {}
+        self._lock = RLock()
+
+    def _upload(self, artifact, force):
+        try:
+            artifact._info("Upload started")
+            ts = utils.duration()
+            if self._cache.upload(artifact, force=force, locked=True):
+                artifact._info("Upload finished after {}", ts)
+                self._cache._dequeue_upload(artifact.identity)
+                return True
+            artifact._error("Upload failed after {}", ts)
+        except Exception as e:
+            artifact._error("Upload failed: {}", e)
+            # Drop artifacts that will never become uploadable
+            if not self._cache.is_available_locally(artifact) or not artifact.is_uploadable():
+                self._cache._dequeue_upload(artifact.identity)
+        return False
+
+    def submit(self, artifact, force=False):
+        """ Queue an artifact for upload. """
+        with self._lock:
+            future = self._futures.get(artifact.identity)
+            if future is not None and not future.done():
+                return future
+            self._cache._enqueue_upload(artifact)
+            future = self._pool.submit(self._upload, artifact, force)
+            self._futures[artifact.identity] = future
+            return future
+
+    def wait(self, artifacts=None):
+        """
+        Wait for queued uploads to finish.
+
+        Waits for all uploads if no artifacts are given.
+        Returns True if all uploads were successful.
+        """
+        with self._lock:
+            if artifacts is None:
+                futures = list(self._futures.values())
+            else:
+                futures = [self._futures[a.identity] for a in artifacts if a.identity in self._futures]
+        if not futures:
+            return True
+        wait(futures)
+        return all(not future.cancelled() and future.result() for future in futures)
+
+    def pending(self):
+        """ Returns the number of uploads in progress. """
+        with self._lock:
+            return len([future for future in self._futures.values() if not future.done()])
+
+    def shutdown(self):
+        """ Cancel uploads not yet started. They remain in the durable queue. """
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
 def RegisterStorage(cls):
     """ Decorator used to register a storage provider factory. """
     ArtifactCache.storage_provider_factories.append(cls)
@@ -1266,10 +1407,14 @@ class ArtifactCache(StorageProvider):
 
     Unused artifacts can be evicted when new artifacts are committed
     to the cache if the configured cache size is exceeded. Selection
-    follows LRU order, but deviations are possible through artifact
-    eviction policies. For example, an important large artifact could
-    declare that it shouldn't be evicted unless unused for two weeks.
-    It would then not be considered for eviction until later.
+    follows the configured eviction policy, LRU by default. The
+    database records the size, creation time, expiration strategy,
+    rebuild/download cost and reuse count of each artifact so that
+    policies can select candidates without reading manifests.
+    Deviations are possible through artifact expiration strategies.
+    For example, an important large artifact could declare that it
+    shouldn't be evicted unless unused for two weeks. It would then
+    not be considered for eviction until later.
 
     Artifacts in the cache can be accessed by multiple processes in
     parallel. Critical sections are enforced using a combination of
@@ -1324,6 +1469,22 @@ class ArtifactCache(StorageProvider):
         # Read configuration
         self._max_size = config.getsize(
             "jolt", "cachesize", os.environ.get("JOLT_CACHE_SIZE", 1 * 1024 ** 3))
+        self._eviction_policy = ArtifactEvictionPolicyRegister.get().find(
+            config.get("jolt", "eviction", "lru"))
+        self._trace_path = config.get("jolt", "cachetrace")
+        self._traced = set()
+        self._compression_level = config.get("jolt", "compression_level")
+        if self._compression_level not in [None, "auto", "store"]:
+            raise_error_if(
+                not self._compression_level.lstrip("-").isdigit(),
+                "Invalid compression level in configuration: {}", self._compression_level)
+            self._compression_level = int(self._compression_level)
+
+        # Background uploads are disabled for workers which
+        # must have finished uploading before reporting back.
+        self._upload_queue = None
+        if config.getboolean("jolt", "upload_async", False) and not self._options.worker:
+            self._upload_queue = self._create_upload_queue()
 
         # Create cache directory
         self._fs_create_cachedir()
@@ -1347,6 +1508,7 @@ class ArtifactCache(StorageProvider):
             self._db_create_tables(db)
             self._db_invalidate_locks(db)
             self._db_invalidate_references(db)
+            self._db_invalidate_claims(db)
             self._fs_invalidate_pids(db)
             size = self._db_select_sum_artifact_size(db)
             count = self._db_select_artifact_count(db)
@@ -1378,8 +1540,22 @@ class ArtifactCache(StorageProvider):
         cur = db.cursor()
 
         # All artifacts currently residing in the cache
-        cur.execute("CREATE TABLE IF NOT EXISTS artifacts "
-                    "(identity text PRIMARY KEY, name text, size integer, last_used timestamp)")
+        cur.execute("CREATE TABLE IF NOT EXISTS artifacts ({})".format(
+            ", ".join(f"{column} {decl}" for column, decl in ARTIFACT_COLUMNS)))
+
+        # Add columns missing in databases created by older versions
+        columns = [row[1] for row in cur.execute("PRAGMA table_info(artifacts)")]
+        for column, decl in ARTIFACT_COLUMNS:
+            if column not in columns:
+                cur.execute(f"ALTER TABLE artifacts ADD COLUMN {column} {decl}")
+
+        # Eviction policy state, e.g. the GreedyDual-Size clock
+        cur.execute("CREATE TABLE IF NOT EXISTS eviction_state (policy text PRIMARY KEY, clock real)")
+
+        # Artifacts pending upload to remote caches. No eviction allowed while rows exist here.
+        cur.execute("CREATE TABLE IF NOT EXISTS upload_queue "
+                    "(identity text PRIMARY KEY, name text, task text, canonical_name text, "
+                    "session integer, pid text, queued timestamp)")
 
         # All process references to artifacts in the cache. No eviction allowed while rows exist here.
         cur.execute("CREATE TABLE IF NOT EXISTS artifact_refs (identity text, pid text)")
@@ -1389,11 +1565,16 @@ class ArtifactCache(StorageProvider):
         # A lock file may be safely deleted if the global cache lock is held and there are
         # no rows present.
         cur.execute("CREATE TABLE IF NOT EXISTS artifact_lockrefs (identity text, pid text)")
+
+        # Tasks claimed for execution by processes sharing the cache.
+        # Other processes defer execution of a task while a claim exists.
+        cur.execute("CREATE TABLE IF NOT EXISTS task_claims (identity text PRIMARY KEY, task text, pid text)")
         db.commit()
 
-    def _db_insert_artifact(self, db, identity, task_name, size):
+    def _db_insert_artifact(self, db, identity, task_name, size, created, expires, cost):
         cur = db.cursor()
-        cur.execute("INSERT INTO artifacts VALUES (?,?,?,?)", (identity, task_name, size, datetime.now()))
+        cur.execute("INSERT INTO artifacts VALUES (?,?,?,?,?,?,?,?,?)",
+                    (identity, task_name, size, datetime.now(), created, json.dumps(expires), cost, 0, 0.0))
         db.commit()
 
     def _db_update_artifact_size(self, db, identity, size):
@@ -1401,6 +1582,48 @@ class ArtifactCache(StorageProvider):
         cur.execute("UPDATE artifacts SET size = ? WHERE identity = ?", (size, identity))
         db.commit()
 
+    def _db_update_artifact_priority(self, db, identity):
+        record = self._db_select_artifact(db, identity)
+        if not record:
+            return
+        record = record[0]
+        priority = self._eviction_policy.priority(record, self._db_select_eviction_clock(db))
+        cur = db.cursor()
+        cur.execute("UPDATE artifacts SET priority = ? WHERE identity = ?", (priority, identity))
+        db.commit()
+
+    def _db_insert_upload(self, db, artifact):
+        cur = db.cursor()
+        cur.execute("INSERT OR REPLACE INTO upload_queue VALUES (?,?,?,?,?,?,?)",
+                    (artifact.identity, artifact.name, artifact.task.name, artifact.task.canonical_name,
+                     artifact.is_session(), self._pid, datetime.now()))
+        db.commit()
+
+    def _db_delete_upload(self, db, identity):
+        cur = db.cursor()
+        cur.execute("DELETE FROM upload_queue WHERE identity = ?", (identity,))
+        db.commit()
+
+    def _db_update_upload_pid(self, db, identity):
+        cur = db.cursor()
+        cur.execute("UPDATE upload_queue SET pid = ? WHERE identity = ?", (self._pid, identity))
+        db.commit()
+
+    def _db_select_uploads(self, db):
+        cur = db.cursor()
+        return [UploadRecord(*row) for row in cur.execute("SELECT * FROM upload_queue ORDER BY queued")]
+
+    def _db_select_eviction_clock(self, db):
+        cur = db.cursor()
+        record = cur.execute("SELECT clock FROM eviction_state WHERE policy = ?",
+                             (self._eviction_policy.name,)).fetchone()
+        return record[0] if record else 0.0
+
+    def _db_update_eviction_clock(self, db, clock):
+        cur = db.cursor()
+        cur.execute("INSERT OR REPLACE INTO eviction_state VALUES (?,?)", (self._eviction_policy.name, clock))
+        db.commit()
+
     def _db_delete_artifact(self, db, identity, and_refs=True):
         cur = db.cursor()
         if and_refs:
@@ -1411,8 +1634,10 @@ class ArtifactCache(StorageProvider):
     def _db_insert_reference(self, db, identity):
         cur = db.cursor()
         cur.execute("INSERT INTO artifact_refs VALUES (?,?)", (identity, self._pid))
-        cur.execute("UPDATE artifacts SET last_used = ? WHERE identity = ?", (datetime.now(), identity))
+        cur.execute("UPDATE artifacts SET last_used = ?, hits = IFNULL(hits, 0) + 1 WHERE identity = ?",
+                    (datetime.now(), identity))
         db.commit()
+        self._db_update_artifact_priority(db, identity)
 
     def _db_delete_reference(self, db, identity):
         cur = db.cursor()
@@ -1448,6 +1673,30 @@ class ArtifactCache(StorageProvider):
                              (identity,)).fetchone()
         return record[0]
 
+    def _db_insert_claim(self, db, identity, task_name):
+        cur = db.cursor()
+        cur.execute("INSERT INTO task_claims VALUES (?,?,?)", (identity, task_name, self._pid))
+        db.commit()
+
+    def _db_delete_claim(self, db, identity):
+        cur = db.cursor()
+        cur.execute("DELETE FROM task_claims WHERE identity = ? AND pid = ?", (identity, self._pid))
+        db.commit()
+
+    def _db_delete_claims_by_pid(self, db, pid):
+        cur = db.cursor()
+        cur.execute("DELETE FROM task_claims WHERE pid = ?", (pid,))
+        db.commit()
+
+    def _db_select_claim_pid(self, db, identity):
+        cur = db.cursor()
+        record = cur.execute("SELECT pid FROM task_claims WHERE identity = ?", (identity,)).fetchone()
+        return record[0] if record else None
+
+    def _db_select_claim_pids(self, db):
+        cur = db.cursor()
+        return [n[0] for n in cur.execute("SELECT DISTINCT pid FROM task_claims")]
+
     def _db_delete_references_by_pid(self, db, pid):
         cur = db.cursor()
         cur.execute("DELETE FROM artifact_refs WHERE pid = ?", (pid,))
@@ -1455,11 +1704,12 @@ class ArtifactCache(StorageProvider):
 
     def _db_select_artifact(self, db, identity):
         cur = db.cursor()
-        return list(cur.execute("SELECT * FROM artifacts WHERE identity = ?", (identity,)))
+        return [ArtifactRecord(*row) for row in cur.execute(
+            f"SELECT {ARTIFACT_SELECT} FROM artifacts WHERE identity = ?", (identity,))]
 
     def _db_select_artifacts(self, db):
         cur = db.cursor()
-        return list(cur.execute("SELECT * FROM artifacts"))
+        return [ArtifactRecord(*row) for row in cur.execute(f"SELECT {ARTIFACT_SELECT} FROM artifacts")]
 
     def _db_select_lock_pids(self, db):
         cur = db.cursor()
@@ -1479,17 +1729,28 @@ class ArtifactCache(StorageProvider):
 
     def _db_select_artifact_not_in_use(self, db, identity):
         cur = db.cursor()
-        return list(
-            cur.execute("SELECT * FROM artifacts WHERE identity = ? AND identity NOT IN "
-                        "(SELECT identity FROM artifact_refs) "
-                        "ORDER BY last_used", (identity,)))
+        return [ArtifactRecord(*row) for row in cur.execute(
+            f"SELECT {ARTIFACT_SELECT} FROM artifacts WHERE identity = ? AND identity NOT IN "
+            "(SELECT identity FROM artifact_refs) AND identity NOT IN "
+            "(SELECT identity FROM upload_queue) "
+            "ORDER BY last_used", (identity,))]
 
     def _db_select_artifacts_not_in_use(self, db):
         cur = db.cursor()
-        return list(
-            cur.execute("SELECT * FROM artifacts WHERE identity NOT IN "
-                        "(SELECT identity FROM artifact_refs) "
-                        "ORDER BY last_used"))
+        return [ArtifactRecord(*row) for row in cur.execute(
+            f"SELECT {ARTIFACT_SELECT} FROM artifacts WHERE identity NOT IN "
+            "(SELECT identity FROM artifact_refs) AND identity NOT IN "
+            "(SELECT identity FROM upload_queue) "
+            "ORDER BY last_used")]
+
+    def _db_select_queued_artifacts_not_in_use(self, db):
+        cur = db.cursor()
+        columns = ", ".join("artifacts." + column for column, _ in ARTIFACT_COLUMNS)
+        return [ArtifactRecord(*row) for row in cur.execute(
+            f"SELECT {columns} FROM artifacts INNER JOIN upload_queue "
+            "ON artifacts.identity = upload_queue.identity WHERE artifacts.identity NOT IN "
+            "(SELECT identity FROM artifact_refs) "
+            "ORDER BY upload_queue.queued")]
 
     def _db_select_sum_artifact_size(self, db):
         cur = db.cursor()
@@ -1538,6 +1799,21 @@ class ArtifactCache(StorageProvider):
             except Exception:
                 pass
 
+    def _db_invalidate_claims(self, db, try_all=False):
+        """ Removes task claims of processes that are no longer alive """
+        self._assert_cache_locked()
+        for pid in self._db_select_claim_pids(db):
+            if not try_all and pid == self._pid:
+                continue
+            try:
+                # Throws exception if lock is held
+                with self._pid_lock(pid):
+                    self._db_delete_claims_by_pid(db, pid)
+            except KeyboardInterrupt as e:
+                raise e
+            except Exception:
+                pass
+
     def _fs_invalidate_pids(self, db, try_all=False):
         """ Removes any stale pid files """
         self._assert_cache_locked()
@@ -1588,7 +1864,7 @@ class ArtifactCache(StorageProvider):
             "Can't compress an unpublished task artifact ({})", artifact._log_name)
 
         try:
-            artifact.tools.archive(artifact.path, archive)
+            artifact.tools.archive(artifact.path, archive, **self._compression_settings(artifact))
         except KeyboardInterrupt as e:
             raise e
         except Exception:
@@ -1598,6 +1874,80 @@ class ArtifactCache(StorageProvider):
         finally:
             fs.unlink(archive, ignore_errors=True)
 
+    # Limits of the samples used to train compression dictionaries
+    _dictionary_size = 112 << 10
+    _dictionary_max_samples = 2000
+    _dictionary_max_sample_size = 128 << 10
+    _dictionary_max_total_size = 16 << 20
+
+    def _compression_settings(self, artifact):
+        """ Returns the archive compression settings of an artifact. """
+        task = artifact.task
+        level = getattr(task, "compression_level", None)
+        level = getattr(task, "compression_level_" + artifact.name, level)
+        settings = {
+            "level": level if level is not None else self._compression_level,
+            "long": getattr(task, "compression_long", False),
+            "order": getattr(task, "compression_order", None),
+        }
+        if getattr(task, "compression_dictionary", False):
+            settings["dictionary"] = self._fs_get_compression_dictionary(artifact)
+        return settings
+
+    def _fs_get_compression_dictionary_path(self, task_name):
+        return fs.path.join(self.root, "dictionaries", task_name + ".zdict")
+
+    def _fs_get_compression_dictionary(self, artifact):
+        """
+        Returns the zstd dictionary of the artifact's task.
+
+        The dictionary is trained from files in previous artifacts of
+        the task present in the local cache. None is returned if there
+        isn't enough data to train a dictionary.
+        """
+        taskdir = fs.path.dirname(artifact.final_path)
+        path = self._fs_get_compression_dictionary_path(fs.path.basename(taskdir))
+        if fs.path.exists(path):
+            with open(path, "rb") as f:
+                return f.read()
+
+        samples = []
+        total_size = 0
+        for entry in sorted(os.listdir(taskdir)):
+            artifactdir = fs.path.join(taskdir, entry)
+            if entry.startswith(".") or artifactdir == artifact.final_path or not fs.path.isdir(artifactdir):
+                continue
+            for sample in sorted(fs.scandir(artifactdir)):
+                if fs.path.islink(sample):
+                    continue
+                with open(sample, "rb") as f:
+                    data = f.read(self._dictionary_max_sample_size)
+                if not data:
+                    continue
+                samples.append(data)
+                total_size += len(data)
+                if len(samples) >= self._dictionary_max_samples or total_size >= self._dictionary_max_total_size:
+                    break
+            if len(samples) >= self._dictionary_max_samples or total_size >= self._dictionary_max_total_size:
+                break
+
+        if not samples:
+            return None
+
+        try:
+            dictionary = tools.ZstdTrainDictionary(samples, self._dictionary_size)
+        except Exception as e:
+            artifact._debug("Failed to train compression dictionary: {}", e)
+            return None
+
+        fs.makedirs(fs.path.dirname(path))
+        temp = path + "." + str(self._pid)
+        with open(temp, "wb") as f:
+            f.write(dictionary)
+        fs.rename(temp, path)
+        artifact._debug("Trained compression dictionary from {} files", len(samples))
+        return dictionary
+
     def _fs_decompress_artifact(self, artifact):
         task = artifact.task
         archive = artifact.get_archive_path()
@@ -1613,6 +1963,25 @@ class ArtifactCache(StorageProvider):
         finally:
             fs.unlink(archive, ignore_errors=True)
 
+    def _fs_extract_artifact(self, artifact, archive):
+        """
+        Extracts an artifact archive provided by a storage provider in place.
+
+        Returns False on failure, in which case the artifact should be
+        downloaded instead.
+        """
+        try:
+            artifact.tools.extract(archive, artifact.temporary_path, ignore_owner=True)
+            artifact._read_manifest(temporary=True)
+            return True
+        except KeyboardInterrupt as e:
+            fs.rmtree(artifact.temporary_path, ignore_errors=True)
+            raise e
+        except Exception as e:
+            fs.rmtree(artifact.temporary_path, ignore_errors=True)
+            log.verbose("Failed to extract {}: {}", archive, str(e))
+            return False
+
     def _fs_delete_artifact(self, identity, task_name, onerror=None):
         fs.rmtree(self._fs_get_artifact_path(identity, task_name), ignore_errors=True, onerror=onerror)
         fs.rmtree(self._fs_get_artifact_tmppath(identity, task_name), ignore_errors=True, onerror=onerror)
@@ -1685,10 +2054,48 @@ class ArtifactCache(StorageProvider):
         except Exception:
             return True
 
+    def _is_artifact_expired(self, record):
+        # Artifacts recorded by older versions lack expiration data in the database
+        if record.expires is None or record.created is None:
+            return self._fs_is_artifact_expired(record.identity, record.name, record.last_used)
+        try:
+            strategy = ArtifactEvictionStrategyRegister.get().find(json.loads(record.expires))
+            return strategy.is_evictable({"created": record.created, "used": record.last_used})
+        except KeyboardInterrupt as e:
+            raise e
+        except Exception:
+            return True
+
+    def _trace(self, identity, size, cost):
+        """ Record a cache access in the configured trace file. """
+        if not self._trace_path or identity in self._traced:
+            return
+        self._traced.add(identity)
+        with utils.ignore_exception():
+            with open(fs.path.expanduser(self._trace_path), "a") as f:
+                f.write(json.dumps({
+                    "time": datetime.now().timestamp(),
+                    "identity": identity,
+                    "size": size,
+                    "cost": cost,
+                }) + "\n")
+
+    def _create_upload_queue(self):
+        return ArtifactUploadQueue(self, config.getint("jolt", "upload_threads", 4))
+
+    def _enqueue_upload(self, artifact):
+        with self._cache_lock(), self._db() as db:
+            self._db_insert_upload(db, artifact)
+
+    def _dequeue_upload(self, identity):
+        with self._cache_lock(), self._db() as db:
+            self._db_delete_upload(db, identity)
+
     def close(self):
         with self._cache_lock(), self._db() as db:
             self._db_invalidate_locks(db, try_all=True)
             self._db_invalidate_references(db, try_all=True)
+            self._db_invalidate_claims(db, try_all=True)
             self._fs_invalidate_pids(db, try_all=True)
 
     @contextlib.contextmanager
@@ -1725,13 +2132,13 @@ class ArtifactCache(StorageProvider):
         """ Discard list of artifacts. Cache lock must be held. """
         self._assert_cache_locked()
         evicted = 0
-        for identity, task_name, _, used in artifacts:
-            if not if_expired or self._fs_is_artifact_expired(identity, task_name, used):
+        for record in artifacts:
+            if not if_expired or self._is_artifact_expired(record):
                 with utils.delayed_interrupt():
-                    self._db_delete_artifact(db, identity)
-                    self._fs_delete_artifact(identity, task_name, onerror=onerror)
+                    self._db_delete_artifact(db, record.identity)
+                    self._fs_delete_artifact(record.identity, record.name, onerror=onerror)
                     evicted += 1
-                    log.debug("Evicted {}: {}", identity, task_name)
+                    log.debug("Evicted {}: {}", record.identity, record.name)
         return evicted == len(artifacts)
 
     ############################################################################
@@ -1769,12 +2176,15 @@ class ArtifactCache(StorageProvider):
             return False
 
         with self._cache_lock(), self._db() as db:
-            if self._db_select_artifact(db, artifact.identity) or self._db_select_reference(db, artifact.identity):
+            record = self._db_select_artifact(db, artifact.identity)
+            if record or self._db_select_reference(db, artifact.identity):
                 artifact.reload()
                 if artifact.is_temporary():
                     self._db_delete_artifact(db, artifact.identity, and_refs=False)
                     return False
                 self._db_insert_reference(db, artifact.identity)
+                if record:
+                    self._trace(artifact.identity, record[0].size, record[0].cost or 0.0)
                 return True
         return False
 
@@ -1866,23 +2276,36 @@ class ArtifactCache(StorageProvider):
             if self.is_available_locally(artifact):
                 artifact._info("Download skipped, already in local cache")
                 return True
+            ts = utils.duration()
             for provider in self._storage_providers:
+                archive = provider.download_path(artifact, force)
+                if archive and self._fs_extract_artifact(artifact, archive):
+                    self.commit(artifact, temporary=True, cost=ts.seconds)
+                    return True
                 if provider.download(artifact, force):
                     self._fs_decompress_artifact(artifact)
-                    self.commit(artifact, temporary=True)
+                    self.commit(artifact, temporary=True, cost=ts.seconds)
                     return True
         return len(self._storage_providers) == 0
 
-    def upload(self, artifact, force=False, locked=True):
+    def upload(self, artifact, force=False, locked=True, background=False):
         """
         Uploads an artifact from the local cache to all configured remote caches.
 
         The artifact is interprocess locked during the operation.
+
+        If background is True and background uploads are enabled, the
+        artifact is queued for upload and the method returns immediately.
+        The artifact is then locked by the background uploader once
+        released by the caller.
         """
         if not force and not self.upload_enabled():
             return False
         if not artifact.is_cacheable():
             return True
+        if background and self._upload_queue is not None:
+            self._upload_queue.submit(artifact, force)
+            return True
         raise_task_error_if(
             not self.is_available_locally(artifact), artifact.task,
             "Can't upload task artifact, no artifact present in the local cache ({})", artifact._log_name)
@@ -1916,6 +2339,12 @@ class ArtifactCache(StorageProvider):
         """
         if not artifact.is_unpackable():
             return True
+
+        # The artifact can no longer be uploaded once unpacked
+        raise_task_error_if(
+            not self.wait_for_uploads([artifact]), artifact.task,
+            "Failed to upload task artifact ({})", artifact._log_name)
+
         with self._thread_lock, self.lock_artifact(artifact, why="unpack") as artifact:
             raise_task_error_if(
                 not self.is_available_locally(artifact),
@@ -1966,7 +2395,7 @@ class ArtifactCache(StorageProvider):
         return True
 
     @utils.delay_interrupt
-    def commit(self, artifact, uploadable=True, temporary=True):
+    def commit(self, artifact, uploadable=True, temporary=True, cost=None):
         """
         Commits a task artifact to the cache.
 
@@ -1974,6 +2403,11 @@ class ArtifactCache(StorageProvider):
         adding an artifact database record as well as a process reference
         record.
 
+        The cost of the artifact is the time in seconds it took to
+        build or download it. If not given, the running time of the
+        producing task is used. The cost is used by cost-aware eviction
+        policies.
+
         Once the artifact is committed, eviction of other artifacts will
         take place if the resulting cache size exceeds the configured
         limit.
@@ -1981,23 +2415,44 @@ class ArtifactCache(StorageProvider):
         if not artifact.is_cacheable():
             return
 
+        if cost is None:
+            node = artifact.get_node()
+            cost = node.duration_running.seconds if node and getattr(node, "duration_running", None) else 0.0
+
         with self._cache_lock(), self._db() as db:
             self._fs_commit_artifact(artifact, uploadable, temporary)
             with utils.ignore_exception():  # Possibly already exists in DB, e.g. unpacked
-                self._db_insert_artifact(db, artifact.identity, artifact.task.canonical_name, artifact.get_size())
+                self._db_insert_artifact(
+                    db, artifact.identity, artifact.task.canonical_name, artifact.get_size(),
+                    artifact._created, artifact._expires.value, cost)
             self._db_update_artifact_size(db, artifact.identity, artifact.get_size())
             self._db_insert_reference(db, artifact.identity)
             artifact.reload()
+            if temporary:
+                self._trace(artifact.identity, artifact.get_size(), cost)
 
             evict_size = self._db_select_sum_artifact_size(db) - self._max_size
             if evict_size < 0:
                 return
 
-            unused = self._db_select_artifacts_not_in_use(db)
+            clock = self._db_select_eviction_clock(db)
+            unused = self._eviction_policy.select(self._db_select_artifacts_not_in_use(db))
             while evict_size > 0 and unused:
                 candidate, unused = unused[0], unused[1:]
                 if self._discard(db, [candidate], True):
-                    evict_size -= candidate[2]
+                    evict_size -= candidate.size
+                    clock = self._eviction_policy.evicted(candidate, clock)
+            self._db_update_eviction_clock(db, clock)
+
+            # Artifacts left in the upload queue by failed or interrupted
+            # uploads would otherwise pin cache space forever.
+            queued = self._db_select_queued_artifacts_not_in_use(db)
+            while evict_size > 0 and queued:
+                candidate, queued = queued[0], queued[1:]
+                log.warning("Cache size exceeded, dropping artifact not yet uploaded: {}", candidate.name)
+                if self._discard(db, [candidate], False):
+                    self._db_delete_upload(db, candidate.identity)
+                    evict_size -= candidate.size
 
     @utils.delay_interrupt
     def discard(self, artifact, if_expired=False, onerror=None):
@@ -2079,6 +2534,37 @@ class ArtifactCache(StorageProvider):
                     artifact.reload()
         return artifact
 
+    def claim_task(self, task):
+        """
+        Claim a task for execution by this process.
+
+        Claims are shared by all processes using the same cache. A task
+        claimed by another process, which is still alive, cannot be
+        claimed until that process releases it.
+
+        Returns True if the task was claimed, False otherwise.
+        """
+        with self._cache_lock(), self._db() as db:
+            pid = self._db_select_claim_pid(db, task.identity)
+            if pid == self._pid:
+                return True
+            if pid is not None:
+                try:
+                    # Throws exception if the claiming process is alive
+                    with self._pid_lock(pid):
+                        self._db_delete_claims_by_pid(db, pid)
+                except KeyboardInterrupt as e:
+                    raise e
+                except Exception:
+                    return False
+            self._db_insert_claim(db, task.identity, task.short_qualified_name)
+            return True
+
+    def release_task(self, task):
+        """ Release a task claimed by this process. """
+        with self._cache_lock(), self._db() as db:
+            self._db_delete_claim(db, task.identity)
+
     @contextlib.contextmanager
     def lock_artifact(self, artifact: Artifact, discard: bool = False, why: str = "publish"):
         """
@@ -2133,6 +2619,62 @@ class ArtifactCache(StorageProvider):
                     if self._db_select_lock_count(db, artifact.identity) == 0:
                         fs.unlink(lock_path, ignore_errors=True)
 
+    def wait_for_uploads(self, artifacts=None):
+        """
+        Wait for background uploads to finish.
+
+        Waits for the uploads of the given artifacts, or for all
+        uploads if no artifacts are given. Returns True if all
+        uploads were successful.
+        """
+        if self._upload_queue is None:
+            return True
+        if artifacts is None and self._upload_queue.pending() > 0:
+            log.info("Waiting for {} artifact upload(s) to finish", self._upload_queue.pending())
+        return self._upload_queue.wait(artifacts)
+
+    def abort_uploads(self):
+        """ Cancel background uploads not yet started. They can be resumed with drain_uploads(). """
+        if self._upload_queue is not None:
+            self._upload_queue.shutdown()
+
+    def drain_uploads(self):
+        """
+        Upload all artifacts left in the upload queue.
+
+        Artifacts queued by processes that are still alive are
+        not touched. Returns True if all uploads were successful.
+        """
+        records = []
+        with self._cache_lock(), self._db() as db:
+            for record in self._db_select_uploads(db):
+                if record.pid != self._pid:
+                    try:
+                        # Throws exception if owner process is alive
+                        with self._pid_lock(record.pid):
+                            pass
+                    except KeyboardInterrupt as e:
+                        raise e
+                    except Exception:
+                        continue
+                self._db_update_upload_pid(db, record.identity)
+                records.append(record)
+
+        if not records:
+            log.info("No pending uploads")
+            return True
+
+        queue = self._upload_queue or self._create_upload_queue()
+        with tools.Tools() as t:
+            artifacts = [QueuedArtifact(self, record, t) for record in records]
+            for artifact in artifacts:
+                if artifact.is_temporary():
+                    artifact._warning("Artifact no longer present in the local cache, dropped from upload queue")
+                    self._dequeue_upload(artifact.identity)
+                else:
+                    queue.submit(artifact, force=True)
+            return queue.wait()
+
     def precheck(self, artifacts, remote=True):
         """ Precheck artifacts for availability and cache status. """
         if not self.has_availability():
@@ -392,6 +392,25 @@ def build(ctx, task, network, keep_going, default, local,
     session = executors.create_session(dag) if options.network else {}
     queue = scheduler.TaskQueue()
 
+    # Download artifacts in the background before tasks need them
+    prefetcher = None
+    if config.getboolean("jolt", "prefetch", False):
+        prefetcher = scheduler.ArtifactPrefetcher(
+            acache,
+            max_workers=config.getint("jolt", "prefetch_threads", 2),
+            max_size=config.getsize("jolt", "prefetch_size", 1024 ** 3))
+
+    # Avoid executing the same tasks as other builds sharing the local cache
+    coordinator = None
+    if config.getboolean("jolt", "coordinate", False):
+        coordinator = scheduler.TaskCoordinator(acache)
+
+    # Look for artifacts published by other builds while this build is running
+    refresher = None
+    if not local and config.getint("jolt", "presence_refresh", 0) > 0:
+        refresher = scheduler.PresenceRefresher(
+            acache, interval=config.getint("jolt", "presence_refresh", 0))
+
     try:
         if not dag.has_tasks():
             return
@@ -406,6 +425,9 @@ def build(ctx, task, network, keep_going, default, local,
         with progress:
             in_progress = set()
 
+            if refresher:
+                refresher.start(dag)
+
             while dag.has_tasks() or not queue.empty():
                 # Find all tasks ready to be executed
                 leafs = dag.select(lambda graph, task: task.is_ready() and task not in in_progress)
@@ -415,16 +437,36 @@ def build(ctx, task, network, keep_going, default, local,
 
                 while leafs:
                     task = leafs.pop()
+                    if coordinator and not coordinator.claim(task):
+                        continue
+                    if refresher:
+                        refresher.consume(task)
+                    if prefetcher:
+                        prefetcher.consume(task)
                     executor = strategy.create_executor(session, task)
                     queue.submit(executor)
                     in_progress.add(task)
 
-                task, error = queue.wait()
+                if prefetcher:
+                    prefetcher.prefetch(dag, in_progress)
 
-                if not task:
+                # Poll for claims released by other builds while tasks are deferred
+                timeout = coordinator.interval if coordinator and coordinator.has_deferred() else None
+                task, error = queue.wait(timeout)
+
+                if not task and timeout is not None:
+                    continue
+                elif not task:
                     dag.debug()
                     break
-                elif task.is_goal() and task.duration_running:
+
+                if coordinator:
+                    coordinator.release(task)
+
+                if prefetcher:
+                    prefetcher.completed(task)
+
+                if task.is_goal() and task.duration_running:
                     goal_task_duration += task.duration_running.seconds
 
                 # Unpack tasks with overridden unpack() method
@@ -449,6 +491,8 @@ def build(ctx, task, network, keep_going, default, local,
             for failed in dag.failed + dag.unstable:
                 log.error("- {}", failed.log_name.strip("()"))
 
+        raise_error_if(not acache.wait_for_uploads(), "Failed to upload one or more task artifacts")
+
         for failed_task in dag.failed:
             failed_task.raise_for_status()
         if dag.failed:
@@ -460,6 +504,7 @@ def build(ctx, task, network, keep_going, default, local,
         try:
             queue.abort()
             executors.shutdown()
+            acache.abort_uploads()
             sys.exit(1)
         except KeyboardInterrupt:
             print()
@@ -467,6 +512,12 @@ def build(ctx, task, network, keep_going, default, local,
             os._exit(1)
     finally:
         queue.shutdown()
+        if prefetcher:
+            prefetcher.shutdown()
+        if refresher:
+            refresher.stop()
+        if coordinator:
+            coordinator.shutdown()
 
         for task in goal_tasks:
             for artifact in task.artifacts:
@@ -531,6 +582,36 @@ def clean(ctx, task, deps, expired):
             pass
 
 
+@cli.command(name="cache-replay", hidden=True)
+@click.argument("trace", type=click.Path(exists=True))
+@click.option("-s", "--size", type=str, help="Simulated cache size [jolt.cachesize].")
+@click.pass_context
+def cache_replay(ctx, trace, size):
+    """
+    Replay a recorded cache access trace.
+
+    The accesses recorded in TRACE are fed through all available
+    cache eviction policies and the resulting hit rates are reported.
+    Cache accesses are recorded when the ``jolt.cachetrace``
+    configuration key is set.
+    """
+    from jolt import eviction
+
+    if size:
+        # There is no such key, the size string is parsed as default value
+        max_size = config.getsize("cache-replay", "size", size)
+    else:
+        max_size = config.getsize("jolt", "cachesize", 1 * 1024 ** 3)
+
+    trace = list(eviction.read_trace(trace))
+    simulators = eviction.replay(trace, max_size)
+
+    print("{:<20} {:>8} {:>8} {:>9} {:>12}".format("Policy", "Hits", "Misses", "Hit rate", "Saved"))
+    for name, sim in simulators.items():
+        print("{:<20} {:>8} {:>8} {:>8.1f}% {:>11.0f}s".format(
+            name, sim.hits, sim.misses, sim.hit_rate * 100, sim.cost_saved))
+
+
 @cli.command(name="config")
 @click.option("-l", "--list", is_flag=True,
               help="List all configuration keys and values.")
@@ -825,6 +906,25 @@ def download(ctx, task, deps, copy, copy_all):
         queue.shutdown()
 
 
+@cli.command()
+@click.option("--drain", is_flag=True, help="Resume uploads left pending by interrupted builds.")
+@click.pass_context
+def upload(ctx, drain):
+    """
+    Upload pending task artifacts to remote caches.
+
+    When background uploads are enabled, artifacts are queued for upload
+    in the local cache once built. The queue is persistent. If a build is
+    interrupted before all uploads have finished, the --drain option can
+    be used to resume uploading. Artifacts queued by builds that are still
+    running are left untouched.
+    """
+    raise_error_if(not drain, "No action specified, see --help")
+    acache = cache.ArtifactCache.get()
+    raise_error_if(not acache.upload_enabled(), "Uploading is disabled")
+    raise_error_if(not acache.drain_uploads(), "Failed to upload one or more task artifacts")
+
+
 @cli.command(name="list")
 @click.argument("task", type=str, nargs=-1, required=False, shell_complete=_autocomplete_tasks)
 @click.option("-a", "--all", is_flag=True, help="List all direct and indirect dependencies of TASK.")
@@ -0,0 +1,185 @@
+from collections import namedtuple
+from datetime import datetime
+import json
+
+from jolt import utils
+
+
+# A row in the artifact cache database table ``artifacts``.
+ArtifactRecord = namedtuple(
+    "ArtifactRecord",
+    ["identity", "name", "size", "last_used", "created", "expires", "cost", "hits", "priority"])
+
+
+class ArtifactEvictionPolicy(object):
+    """
+    Base class for cache eviction policies.
+
+    An eviction policy decides in which order unused artifacts are
+    evicted from the local cache when the configured cache size is
+    exceeded. Policies only operate on artifact database records, so
+    no artifact manifests have to be read while selecting candidates.
+
+    Each artifact record carries a priority which is recalculated
+    every time the artifact is committed or used. Candidates with the
+    lowest priority are evicted first. Some policies also maintain a
+    clock that advances as artifacts are evicted. The clock is shared
+    between all processes using the cache.
+    """
+
+    name = None
+
+    def priority(self, record, clock):
+        """ Return the new priority of a committed or used artifact. """
+        return 0.0
+
+    def key(self, record):
+        """ Return the sort key of an eviction candidate. """
+        return record.priority or 0.0
+
+    def select(self, records):
+        """ Return eviction candidates in eviction order. """
+        return sorted(records, key=self.key)
+
+    def evicted(self, record, clock):
+        """ Return the new clock value after an artifact has been evicted. """
+        return clock
+
+
+class LeastRecentlyUsed(ArtifactEvictionPolicy):
+    """ Evicts the least recently used artifact first. """
+
+    name = "lru"
+
+    def priority(self, record, clock):
+        return record.last_used.timestamp() if record.last_used else 0.0
+
+    def key(self, record):
+        return record.last_used or datetime.min
+
+
+class GreedyDualSize(ArtifactEvictionPolicy):
+    """
+    Cost-aware eviction policy (GreedyDual-Size with frequency).
+
+    The priority of an artifact is the current clock value plus its
+    reuse frequency multiplied with the cost of recreating it,
+    i.e. the recorded build or download duration, per byte. Small,
+    expensive and popular artifacts are therefore retained longer
+    than large artifacts which are cheap to recreate.
+
+    When an artifact is evicted, the clock advances to its priority.
+    Artifacts that are not used again will eventually age out as
+    newly used artifacts are given higher priorities.
+    """
+
+    name = "greedy_dual_size"
+
+    # Lower bound of the cost of an artifact, in seconds.
+    # Used for artifacts with unknown cost.
+    min_cost = 1.0
+
+    def priority(self, record, clock):
+        cost = max(record.cost or 0.0, self.min_cost)
+        return clock + max(record.hits or 1, 1) * cost / max(record.size or 0, 1)
+
+    def evicted(self, record, clock):
+        return max(clock, record.priority or 0.0)
+
+
+@utils.Singleton
+class ArtifactEvictionPolicyRegister(object):
+    def __init__(self):
+        self.policies = {}
+
+    def add(self, policy):
+        self.policies[policy.name] = policy
+
+    def find(self, name):
+        return self.policies.get(name, LeastRecentlyUsed)()
+
+
+ArtifactEvictionPolicyRegister.get().add(LeastRecentlyUsed)
+ArtifactEvictionPolicyRegister.get().add(GreedyDualSize)
+
+
+class ArtifactEvictionSimulator(object):
+    """
+    Simulates a local artifact cache of a certain size.
+
+    Recorded cache accesses are replayed through an eviction policy
+    in order to measure the hit rate that the policy would have
+    achieved. Expiration strategies and artifacts in use by other
+    processes are not considered.
+    """
+
+    def __init__(self, policy, max_size):
+        self.policy = policy
+        self.max_size = max_size
+        self.clock = 0.0
+        self.records = {}
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.cost_saved = 0.0
+
+    def access(self, identity, size, cost, time=None):
+        """ Access an artifact. Returns True if the artifact was present. """
+        used = datetime.fromtimestamp(time) if time is not None else datetime.now()
+        record = self.records.get(identity)
+        hit = record is not None
+
+        if hit:
+            self.hits += 1
+            self.cost_saved += cost
+            record = record._replace(last_used=used, hits=record.hits + 1)
+        else:
+            self.misses += 1
+            record = ArtifactRecord(identity, None, size, used, used, None, cost, 1, 0.0)
+            self.size += size
+
+        self.records[identity] = record._replace(priority=self.policy.priority(record, self.clock))
+
+        if self.size > self.max_size:
+            candidates = [r for r in self.records.values() if r.identity != identity]
+            for candidate in self.policy.select(candidates):
+                if self.size <= self.max_size:
+                    break
+                del self.records[candidate.identity]
+                self.size -= candidate.size
+                self.clock = self.policy.evicted(candidate, self.clock)
+
+        return hit
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+def read_trace(path):
+    """
+    Read a recorded cache access trace.
+
+    The trace is a file with one JSON object per line. Each object
+    has the keys ``time``, ``identity``, ``size`` and ``cost``.
+    """
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def replay(trace, max_size, policies=None):
+    """
+    Replay a cache access trace through eviction policies.
+
+    Returns a dictionary of simulators, one per policy.
+    """
+    policies = policies or list(ArtifactEvictionPolicyRegister.get().policies.values())
+    simulators = {policy.name: ArtifactEvictionSimulator(policy(), max_size) for policy in policies}
+    for access in trace:
+        for simulator in simulators.values():
+            simulator.access(access["identity"], access["size"], access["cost"], access.get("time"))
+    return simulators
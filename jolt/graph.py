@@ -362,7 +362,7 @@ class TaskProxy(object):
             success = all([self.cache.download(artifact, force=force) for artifact in artifacts_persistent])
         return success
 
-    def upload(self, force=False, locked=False, session_only=False, persistent_only=False, artifacts=None):
+    def upload(self, force=False, locked=False, session_only=False, persistent_only=False, artifacts=None, background=False):
         artifacts = artifacts or self._artifacts
         if session_only:
             artifacts = list(filter(lambda a: a.is_session(), artifacts))
@@ -372,7 +372,17 @@ class TaskProxy(object):
             return True
         if not self.is_uploadable(artifacts):
             return False
-        return all([self.cache.upload(artifact, force=force, locked=locked) for artifact in artifacts])
+        return all([self.cache.upload(artifact, force=force, locked=locked, background=background) for artifact in artifacts])
+
+    def wait_for_uploads(self):
+        """ Wait for background uploads of the task's persistent artifacts to finish. """
+        artifacts = [artifact for artifact in self._artifacts if not artifact.is_session()]
+        return self.cache.wait_for_uploads(artifacts)
+
+    def wait_for_dependency_uploads(self):
+        """ Wait for background uploads of dependency artifacts to finish. """
+        artifacts = [artifact for child in self.children for artifact in child.artifacts]
+        return self.cache.wait_for_uploads(artifacts)
 
     def resolve_requirement_alias(self, name):
         return self.requirement_aliases.get(name)
@@ -814,7 +824,7 @@ class TaskProxy(object):
                     force_build = True
 
             if force_build or not available_locally:
-                with log.threadsink() as buildlog:
+                with log.threadsink(spilldir=self.tools.buildroot) as buildlog:
                     if self.task.is_runnable():
                         log.verbose("Host: {0}", getenv("HOSTNAME", "localhost"))
 
@@ -891,9 +901,10 @@ class TaskProxy(object):
 
                             # Must upload the artifact while still holding its lock, otherwise the
                             # artifact may become unpack():ed before we have a chance to.
+                            # Background uploads are instead awaited by unpack().
                             if force_upload or force_build or not available_remotely:
                                 raise_task_error_if(
-                                    not self.upload(force=force_upload, locked=False, persistent_only=True) \
+                                    not self.upload(force=force_upload, locked=False, persistent_only=True, background=True) \
                                     and self.cache.upload_enabled(),
                                     self, "Failed to upload task artifact")
 
@@ -929,7 +940,7 @@ class TaskProxy(object):
         self.task._verify_influence(context, artifact, self.tools)
         if artifact.is_main() and buildlog:
             with open(fs.path.join(artifact.path, ".build.log"), "w") as f:
-                f.write(buildlog.getvalue())
+                buildlog.copy(f)
         hooks.task_postpublish(self, artifact, self.tools)
         artifact.get_cache().commit(artifact)
 
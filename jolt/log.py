@@ -1,8 +1,10 @@
 from __future__ import print_function
+import codecs
 import glob
 import os
 import re
 import sys
+import tempfile
 import time
 import tqdm
 if os.name == "nt":
@@ -12,14 +14,13 @@ if os.name == "nt":
     os.system("")      # Hack to enable vt100
 import traceback
 from datetime import datetime
+import itertools
 import threading
 import logging
 import logging.handlers
+import zlib
+from collections import deque
 from contextlib import contextmanager
-try:
-    from StringIO import StringIO
-except Exception:
-    from io import StringIO
 
 from jolt import config
 from jolt.error import JoltError
@@ -63,22 +64,53 @@ logging.addLevelName(DEBUG, "DEBUG")
 logging.raiseExceptions = False
 
 
+def _format_message(record):
+    """ Returns the formatted message of a record, formatting it only once. """
+    try:
+        return record.__dict__["_message"]
+    except KeyError:
+        pass
+    try:
+        message = record.msg.format(*record.args)
+    except Exception:
+        message = record.msg
+    record._message = message
+    return message
+
+
+def _format_asctime(record):
+    """ Returns the formatted timestamp of a record, formatting it only once. """
+    try:
+        return record.__dict__["_asctime"]
+    except KeyError:
+        pass
+    asctime = datetime.fromtimestamp(record.created).strftime("%Y-%m-%d %H:%M:%S.%f")
+    record._asctime = asctime
+    return asctime
+
+
 class Formatter(logging.Formatter):
     def __init__(self, fmt, *args, **kwargs):
         super(Formatter, self).__init__(*args, **kwargs)
         self.fmt = fmt
+        self._key = "_formatted_{}".format(id(self))
 
     def format(self, record):
+        # The result is shared by all handlers using this formatter,
+        # e.g. the log file and task log sinks.
         try:
-            record.message = record.msg.format(*record.args)
-        except Exception:
-            record.message = record.msg
-        record.asctime = datetime.fromtimestamp(record.created).strftime("%Y-%m-%d %H:%M:%S.%f")
-        return self.fmt.format(
+            return record.__dict__[self._key]
+        except KeyError:
+            pass
+        record.message = _format_message(record)
+        record.asctime = _format_asctime(record)
+        text = self.fmt.format(
             levelname=record.levelname,
             message=record.message,
             asctime=record.asctime
         )
+        record.__dict__[self._key] = text
+        return text
 
 
 class ConsoleFormatter(logging.Formatter):
@@ -96,17 +128,14 @@ class ConsoleFormatter(logging.Formatter):
         self.fmt_prefix = "~\"" + self.fmt_prefix + "\\n\""
 
     def format(self, record):
-        try:
-            msg = record.msg.format(*record.args)
-        except Exception:
-            msg = record.msg
+        msg = _format_message(record)
         if sys.stdout.isatty() and sys.stderr.isatty():
             if record.levelno >= ERROR:
                 msg = colors.red(msg)
             elif record.levelno >= WARNING:
                 msg = colors.yellow(msg)
         record.message = msg
-        record.asctime = datetime.fromtimestamp(record.created).strftime("%Y-%m-%d %H:%M:%S.%f")
+        record.asctime = _format_asctime(record)
         record.prefix = True if record.__dict__.get("prefix", False) else False
 
         if not record.prefix and \
@@ -206,7 +235,11 @@ def start_file_log():
         outdated = logfiles[:len(logfiles) - logcount + 1]
         logfiles = logfiles[-logcount + 1:]
         for file in outdated:
-            os.unlink(file)
+            try:
+                os.unlink(file)
+            except FileNotFoundError:
+                # Already removed by a concurrent process
+                pass
 
     _file = logging.FileHandler(logfile)
     _file.setLevel(EXCEPTION)
@@ -263,6 +296,39 @@ def stderr(line, **kwargs):
     _logger_frontend.log(STDERR, line, extra=kwargs)
 
 
+def output(level, lines, thread=None, prefix=False):
+    """
+    Logs a batch of captured output lines.
+
+    The lines are logged verbatim, on behalf of the thread with
+    identifier ``thread``, or the calling thread if not set. Records
+    are cloned from a template, which is considerably cheaper than
+    logging the lines one by one.
+    """
+    if not lines or not _logger.isEnabledFor(level):
+        return
+    template = logging.LogRecord(
+        name=_logger.name,
+        level=level,
+        pathname=__file__,
+        lineno=0,
+        msg="",
+        args=(),
+        exc_info=None,
+    )
+    if thread is not None:
+        template.thread = thread
+    template.prefix = prefix
+    template = template.__dict__
+    with utils.delayed_interrupt():
+        for line in lines:
+            record = logging.LogRecord.__new__(logging.LogRecord)
+            record.__dict__.update(template)
+            record.msg = line.replace("{", "{{").replace("}", "}}")
+            record._message = line
+            logging.Logger.handle(_logger, record)
+
+
 def format_exception_msg(exc):
     te = traceback.TracebackException.from_exception(exc)
 
@@ -486,20 +552,258 @@ class _ThreadMapper(Filter):
 _thread_map = _ThreadMapper()
 
 
+class LogContext(object):
+    """
+    A log routing identity which is not bound to a thread.
+
+    Threads mapped to the context with map_thread() log on its behalf,
+    and sinks installed with threadsink() by a mapped thread receive the
+    records of all threads mapped to the context. It keeps the log of a
+    task together when its execution moves between threads.
+    """
+
+    _counter = itertools.count(1)
+
+    def __init__(self):
+        # Negative, never collides with the identifier of a real thread
+        self.ident = -next(LogContext._counter)
+
+
+class _ThreadDispatcher(logging.Handler):
+    """
+    Routes log records to sinks registered for the emitting thread.
+
+    A single dispatcher is installed in the jolt logger. Records are
+    looked up by thread, after applying thread mappings, instead of
+    being filtered by every sink, which keeps the cost of a log line
+    independent of the number of running tasks.
+    """
+
+    def __init__(self):
+        super(_ThreadDispatcher, self).__init__()
+        self._sinks = {}
+        self._sinks_lock = threading.Lock()
+
+    def add(self, threadid, sink):
+        with self._sinks_lock:
+            self._sinks[threadid] = self._sinks.get(threadid, ()) + (sink,)
+
+    def remove(self, threadid, sink):
+        with self._sinks_lock:
+            sinks = tuple(s for s in self._sinks.get(threadid, ()) if s is not sink)
+            if sinks:
+                self._sinks[threadid] = sinks
+            else:
+                self._sinks.pop(threadid, None)
+
+    def handle(self, record):
+        _thread_map.filter(record)
+        sinks = self._sinks.get(record.thread)
+        if not sinks:
+            return False
+        for sink in sinks:
+            if record.levelno >= sink.level:
+                sink.handle(record)
+        return True
+
+    def emit(self, record):
+        pass
+
+
+_dispatcher = _ThreadDispatcher()
+_logger.addHandler(_dispatcher)
+
+
+class TaskLog(object):
+    """
+    Bounded memory buffer for task log output.
+
+    The first and the last characters written to the log are kept in
+    memory. Output in between is compressed and spilled to an anonymous
+    temporary file in ``spilldir``, or in the system's temporary
+    directory if not set. The complete log is read back in order by
+    streaming it with :meth:`chunks` or by iterating over its lines.
+
+    The object is file-like and may be used as the stream of a logging
+    handler. Iterating over it yields lines without line terminators.
+    """
+
+    head_size = 1 << 20
+    """ Number of characters kept in memory at the start of the log. """
+
+    tail_size = 1 << 20
+    """ Number of characters kept in memory at the end of the log. """
+
+    def __init__(self, spilldir=None, head_size=None, tail_size=None):
+        self._spilldir = spilldir
+        self._head_size = head_size if head_size is not None else TaskLog.head_size
+        self._tail_size = tail_size if tail_size is not None else TaskLog.tail_size
+        self._head = []
+        self._head_len = 0
+        self._tail = deque()
+        self._tail_len = 0
+        self._spill = None
+        self._spill_len = 0
+        self._compressor = None
+        self._lock = threading.RLock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, tb):
+        self.close()
+
+    def __iter__(self):
+        return self.lines()
+
+    @property
+    def size(self):
+        """ Number of characters written to the log. """
+        return self._head_len + self._spill_len + self._tail_len
+
+    @property
+    def spilled(self):
+        """ Number of characters spilled to disk. """
+        return self._spill_len
+
+    def _spill_write(self, data):
+        if self._spill is None:
+            spilldir = self._spilldir if self._spilldir and fs.path.isdir(self._spilldir) else None
+            self._spill = tempfile.TemporaryFile(prefix="log-", dir=spilldir)
+            self._compressor = zlib.compressobj(1, zlib.DEFLATED, 31)
+        self._spill.write(self._compressor.compress(data.encode(errors="replace")))
+        self._spill_len += len(data)
+
+    def write(self, data):
+        if not data:
+            return
+        with self._lock:
+            if self._head_len < self._head_size:
+                head = data[:self._head_size - self._head_len]
+                self._head.append(head)
+                self._head_len += len(head)
+                data = data[len(head):]
+                if not data:
+                    return
+            self._tail.append(data)
+            self._tail_len += len(data)
+            while self._tail_len > self._tail_size:
+                data = self._tail.popleft()
+                excess = self._tail_len - self._tail_size
+                if len(data) > excess:
+                    self._tail.appendleft(data[excess:])
+                    data = data[:excess]
+                self._tail_len -= len(data)
+                self._spill_write(data)
+
+    def append(self, line):
+        """ Appends a line, terminating it with a newline if necessary. """
+        self.write(line if line.endswith("\n") else line + "\n")
+
+    def extend(self, lines):
+        """ Appends lines, terminating them with newlines if necessary. """
+        self.write("".join(line if line.endswith("\n") else line + "\n" for line in lines))
+
+    def flush(self):
+        pass
+
+    def _spill_chunks(self, size, chunksize=1 << 20):
+        decompressor = zlib.decompressobj(31)
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        offset = 0
+        while offset < size:
+            with self._lock:
+                self._spill.seek(offset)
+                data = self._spill.read(min(chunksize, size - offset))
+                self._spill.seek(0, os.SEEK_END)
+            if not data:
+                break
+            offset += len(data)
+            data = decoder.decode(decompressor.decompress(data))
+            if data:
+                yield data
+        data = decoder.decode(decompressor.flush(), final=True)
+        if data:
+            yield data
+
+    def chunks(self):
+        """
+        Streams the contents of the log.
+
+        Output written while the log is being read is not included.
+        """
+        with self._lock:
+            head = list(self._head)
+            tail = list(self._tail)
+            size = 0
+            if self._spill is not None:
+                self._spill.write(self._compressor.flush(zlib.Z_SYNC_FLUSH))
+                self._spill.flush()
+                size = self._spill.tell()
+        yield from head
+        if size:
+            yield from self._spill_chunks(size)
+        yield from tail
+
+    def lines(self):
+        """ Streams the lines of the log, without line terminators. """
+        remainder = ""
+        for data in self.chunks():
+            lines = (remainder + data).split("\n")
+            remainder = lines.pop()
+            yield from lines
+        if remainder:
+            yield remainder
+
+    def tail(self):
+        """
+        Returns the lines at the end of the log that are kept in memory.
+
+        All lines are returned unless output has been spilled to disk,
+        in which case the head, the spilled output and the first line
+        of the tail, which may be partial, are left out.
+        """
+        with self._lock:
+            spilled = self._spill is not None
+            data = "".join(self._tail) if spilled else "".join(self._head) + "".join(self._tail)
+        lines = data.split("\n")
+        if not lines[-1]:
+            lines.pop()
+        return lines[1:] if spilled else lines
+
+    def copy(self, fileobj):
+        """ Writes the contents of the log to a file object. """
+        for data in self.chunks():
+            fileobj.write(data)
+
+    def getvalue(self):
+        """ Returns the contents of the log as a string. """
+        return "".join(self.chunks())
+
+    def close(self):
+        """ Discards the log and removes spilled data from disk. """
+        with self._lock:
+            if self._spill is not None:
+                self._spill.close()
+                self._spill = None
+            self._head = []
+            self._tail = deque()
+            self._head_len = self._tail_len = self._spill_len = 0
+
+
 @contextmanager
-def threadsink(level=DEBUG):
+def threadsink(level=DEBUG, spilldir=None):
     threadid = threading.get_ident()
-    stringbuf = StringIO()
+    threadid = _thread_map.thread_map.get(threadid, threadid)
+    stringbuf = TaskLog(spilldir)
     handler = logging.StreamHandler(stringbuf)
     handler.setLevel(level)
     handler.setFormatter(_file_formatter)
-    handler.addFilter(_thread_map)
-    handler.addFilter(Filter(lambda record: record.thread == threadid))
-    _logger.addHandler(handler)
+    _dispatcher.add(threadid, handler)
     try:
         yield stringbuf
     finally:
-        _logger.removeHandler(handler)
+        _dispatcher.remove(threadid, handler)
 
 
 @contextmanager
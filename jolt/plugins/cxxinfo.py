@@ -45,6 +45,10 @@ class CppInfo(ArtifactAttributeSet):
             return CppInfoListVariable(self._artifact, "libraries")
         if name == "macros":
             return CppInfoDictVariable(self._artifact, "macros")
+        if name == "pch":
+            return CppInfoStringVariable(self._artifact, "pch")
+        if name == "pchkey":
+            return CppInfoStringVariable(self._artifact, "pchkey")
         if name == "sources":
             return CppInfoListVariable(self._artifact, "sources")
         assert False, "No such cxxinfo attribute: {0}".format(name)
@@ -42,9 +42,11 @@ Example:
 
 from functools import wraps
 from os import path
+from xml.etree import ElementTree as ET
 import json
 
 from jolt import BooleanParameter, IntParameter, Parameter, Runner
+from jolt import filesystem as fs
 from jolt import influence
 from jolt.error import raise_task_error, raise_task_error_if
 from jolt.plugins import junit
@@ -56,6 +58,102 @@ def import_failures(xml, report):
     return junit.import_junit_report(xml, report, errors=True, failures=True)
 
 
+_REPORT_COUNTERS = ["tests", "failures", "disabled", "errors", "skipped"]
+
+
+def _report_path(output, executable):
+    """ Returns the format and the path of the report file requested by GTEST_OUTPUT. """
+    fmt, _, target = output.partition(":")
+    if not target:
+        target = "test_detail." + fmt
+    elif target.endswith("/") or target.endswith(path.sep):
+        target = path.join(target, path.basename(executable) + "." + fmt)
+    return fmt, target
+
+
+def _sum_counters(merged, other, get, put):
+    for counter in _REPORT_COUNTERS:
+        if get(merged, counter) is not None and get(other, counter) is not None:
+            put(merged, counter, int(get(merged, counter)) + int(get(other, counter)))
+
+
+def _merge_junit_reports(reports, output):
+    """ Merges JUnit reports from multiple test processes, e.g. shards. """
+    root = None
+    suites = {}
+
+    def get(element, attr):
+        return element.get(attr)
+
+    def put(element, attr, value):
+        element.set(attr, str(value))
+
+    for report in reports:
+        try:
+            shard = ET.parse(report).getroot()
+        except (OSError, ET.ParseError):
+            continue
+        if root is None:
+            root = ET.Element(shard.tag, shard.attrib)
+        else:
+            _sum_counters(root, shard, get, put)
+            if root.get("time") is not None and shard.get("time") is not None:
+                root.set("time", str(max(float(root.get("time")), float(shard.get("time")))))
+        for suite in shard.findall("testsuite"):
+            merged = suites.get(suite.get("name"))
+            if merged is None:
+                suites[suite.get("name")] = suite
+                root.append(suite)
+                continue
+            merged.extend(list(suite))
+            _sum_counters(merged, suite, get, put)
+            if merged.get("time") is not None and suite.get("time") is not None:
+                merged.set("time", "{:.3f}".format(float(merged.get("time")) + float(suite.get("time"))))
+
+    if root is not None:
+        ET.ElementTree(root).write(output, encoding="UTF-8", xml_declaration=True)
+
+
+def _merge_json_reports(reports, output):
+    """ Merges JSON reports from multiple test processes, e.g. shards. """
+    root = None
+    suites = {}
+
+    def get(data, key):
+        return data.get(key)
+
+    def put(data, key, value):
+        data[key] = value
+
+    def seconds(data):
+        return float(str(data.get("time", "0s")).rstrip("s"))
+
+    for report in reports:
+        try:
+            with open(report) as fp:
+                shard = json.load(fp)
+        except (OSError, ValueError):
+            continue
+        if root is None:
+            root = dict(shard, testsuites=[])
+        else:
+            _sum_counters(root, shard, get, put)
+            root["time"] = "{:.3f}s".format(max(seconds(root), seconds(shard)))
+        for suite in shard.get("testsuites", []):
+            merged = suites.get(suite["name"])
+            if merged is None:
+                suites[suite["name"]] = suite
+                root["testsuites"].append(suite)
+                continue
+            merged["testsuite"] = merged.get("testsuite", []) + suite.get("testsuite", [])
+            _sum_counters(merged, suite, get, put)
+            merged["time"] = "{:.3f}s".format(seconds(merged) + seconds(suite))
+
+    if root is not None:
+        with open(output, "w") as fp:
+            json.dump(root, fp, indent=2)
+
+
 def break_on_failure(default: bool = False, param: bool = True, attr: str = "break_on_failure"):
     """
     Task class decorator controlling the GTEST_BREAK_ON_FAILURE environment variable.
@@ -494,6 +592,10 @@ class GTestRunner(Runner):
     The results of the report are also imported into Jolt and distributed
     with report emails if the email plugin has been enabled.
 
+    Test executables may be split into multiple processes, shards, which
+    are run in parallel. See :attr:`shards` and :attr:`jobs <jolt.Runner.jobs>`.
+    Reports written by the shards are merged.
+
     Example:
 
     .. literalinclude:: ../examples/googletest/runner.jolt
@@ -526,3 +628,50 @@ class GTestRunner(Runner):
 
     shuffle = BooleanParameter(True, help="Randomize test-case execution order.")
     """ Randomize test-case execution order. """
+
+    shards = 1
+    """
+    Number of processes to split each test executable into.
+
+    Test-cases are distributed among the processes by Google Test using
+    ``GTEST_TOTAL_SHARDS`` and ``GTEST_SHARD_INDEX``. If set to 0, the
+    number of threads returned by :func:`Tools.thread_count() <jolt.Tools.thread_count>`
+    is used. Set :attr:`jobs <jolt.Runner.jobs>` to run the shards in parallel.
+    """
+
+    def _executions(self, task, executable, tools):
+        shards = int(self.shards) or tools.thread_count()
+        output = tools.getenv("GTEST_OUTPUT")
+        executions = []
+
+        for index in range(shards):
+            name = task + ":" + executable
+            env = {}
+            if shards > 1:
+                name += "#{}/{}".format(index, shards)
+                env["GTEST_TOTAL_SHARDS"] = str(shards)
+                env["GTEST_SHARD_INDEX"] = str(index)
+            if output:
+                # Every process writes its own report, merged afterwards
+                fmt, target = _report_path(output, executable)
+                reports = self._gtest_reports.setdefault((fmt, tools.expand_path(target)), [])
+                root, ext = path.splitext(tools.expand_path(target))
+                report = "{}.{}{}".format(root, len(reports), ext)
+                reports.append(report)
+                env["GTEST_OUTPUT"] = "{}:{}".format(fmt, report)
+            executions.append((name, env))
+
+        return executions
+
+    def run(self, deps, tools):
+        self._gtest_reports = {}
+        try:
+            super().run(deps, tools)
+        finally:
+            for (fmt, target), reports in self._gtest_reports.items():
+                if fmt == "json":
+                    _merge_json_reports(reports, target)
+                else:
+                    _merge_junit_reports(reports, target)
+                for report in reports:
+                    fs.unlink(report, ignore_errors=True)
@@ -28,22 +28,22 @@ class LogStashHooks(TaskHook):
         with task.tools.tmpdir("logstash") as tmp:
             filepath = fs.path.join(tmp, "log")
             with open(filepath, "w") as f:
-                f.write(logbuffer)
+                logbuffer.copy(f)
             task.logstash = self._get_uri(task)
             task.tools.upload(filepath, task.logstash, exceptions=False)
 
     @contextmanager
     def task_run(self, task):
-        with log.threadsink() as logsink:
+        with log.threadsink(spilldir=task.tools.buildroot) as logsink:
             try:
                 yield
             except Exception as e:
                 if self._failed_enabled:
-                    self._stash_log(task, logsink.getvalue())
+                    self._stash_log(task, logsink)
                 raise e
             else:
                 if self._finished_enabled:
-                    self._stash_log(task, logsink.getvalue())
+                    self._stash_log(task, logsink)
 
 
 # Must run before other plugins which depend on the
@@ -1,14 +1,24 @@
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import contextlib
 import copy
 import functools
+import io
+import json
+from multiprocessing.connection import Client, Listener
 from ninja import ninja_syntax as ninja
 import os
 import platform
 import re
+import struct
+import subprocess
 import sys
+import tempfile
+import threading
+from pathlib import Path
 
 from jolt.tasks import Task, attributes as task_attributes
+from jolt import cache
 from jolt import config
 from jolt.influence import attribute as influence_attribute
 from jolt.influence import DirectoryInfluence, FileInfluence
@@ -18,14 +28,19 @@ from jolt import log
 from jolt import utils
 from jolt import filesystem as fs
 from jolt.error import raise_task_error
+from jolt.error import raise_error_if
 from jolt.error import raise_task_error_if
 from jolt.error import JoltError, JoltCommandError
+from jolt.plugins import objcache_main as objcache
+from jolt.plugins import remote_compile_main as remote_compile
 
 
 c_standard_default = None
 cxx_standard_default = None
 c_standards_list = [90, 99, 11, 17, 23]
 cxx_standards_list = [98, 11, 14, 17, 20, 23, 26]
+_unity_strategies = [False, None, True, "directory", "size", "time"]
+_unity_exts = [".c", ".cpp", ".cc", ".cxx"]
 
 
 class CompileError(JoltError):
@@ -36,6 +51,230 @@ class CompileError(JoltError):
             super().__init__("Compilation failed")
 
 
+def read_deps_log(path):
+    """
+    Reads a Ninja deps log.
+
+    Ninja records the inputs listed in depfiles of rules with
+    ``deps = gcc`` in a binary log, ``.ninja_deps``, in its build
+    directory. Later records for an output replace earlier ones.
+
+    Returns a dictionary with a list of inputs for each output, or an
+    empty dictionary if the log is missing or of an unsupported version.
+    Paths are interned and relative to Ninja's working directory unless
+    absolute.
+    """
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return {}
+
+    header = b"# ninjadeps\n"
+    if not data.startswith(header) or len(data) < len(header) + 4:
+        return {}
+    version, = struct.unpack_from("=i", data, len(header))
+    if version not in (3, 4):
+        return {}
+
+    # Version 4 records 64-bit modification times
+    skip = 3 if version == 4 else 2
+    deps = {}
+    paths = []
+    offset = len(header) + 4
+    while offset + 4 <= len(data):
+        size, = struct.unpack_from("=I", data, offset)
+        offset += 4
+        is_deps = size & 0x80000000
+        size &= 0x7fffffff
+        if size < 4 or size % 4 or offset + size > len(data):
+            # Truncated by an interrupted build
+            break
+
+        if is_deps:
+            ids = struct.unpack_from("={}i".format(size // 4), data, offset)
+            try:
+                deps[paths[ids[0]]] = [paths[id] for id in ids[skip:]]
+            except IndexError:
+                break
+        else:
+            checksum, = struct.unpack_from("=I", data, offset + size - 4)
+            if checksum != ~len(paths) & 0xffffffff:
+                break
+            path = data[offset:offset + size - 4].rstrip(b"\0")
+            paths.append(sys.intern(path.decode(errors="surrogateescape")))
+        offset += size
+    return deps
+
+
+def read_build_log(path):
+    """
+    Reads command durations from a Ninja build log.
+
+    Ninja records the start and end time of each command it runs in
+    ``.ninja_log`` in its build directory. Later records for an output
+    replace earlier ones.
+
+    Returns a dictionary with the duration in seconds of the latest
+    command producing each output, or an empty dictionary if the log
+    is missing. Paths are relative to Ninja's working directory unless
+    absolute.
+    """
+    try:
+        with open(path) as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return {}
+
+    if not lines or not lines[0].startswith("# ninja log v"):
+        return {}
+
+    durations = {}
+    for line in lines[1:]:
+        fields = line.split("\t")
+        if len(fields) < 5:
+            continue
+        try:
+            durations[fields[3]] = (int(fields[1]) - int(fields[0])) / 1000
+        except ValueError:
+            continue
+    return durations
+
+
+class NinjaWriter(ninja.Writer):
+    """ Ninja build file writer remembering the values of global variables. """
+
+    def __init__(self, output):
+        super().__init__(output)
+        self.variables = {}
+
+    def variable(self, key, value, indent=0):
+        if indent == 0 and value is not None:
+            self.variables[key] = " ".join(filter(None, value)) if isinstance(value, list) else str(value)
+        super().variable(key, value, indent)
+
+
+class DiagnosticParser(object):
+    """
+    Incremental parser of compiler and linker diagnostics.
+
+    Lines of build output are fed to the parser while the build is
+    running. Each line is matched on its own and source excerpts
+    following GCC style diagnostics are collected as error details.
+    Compiler diagnostics are grouped by location and the number of
+    reported locations per file is limited. Linker diagnostics are
+    reported one per matching line.
+    """
+
+    # Type, pattern, substrings of which one must be present for the pattern
+    # to be tried, source line used as details if missing, followed by
+    # source excerpts.
+    patterns = [
+        # GCC style errors
+        ("Compiler Error",
+         re.compile(r"(?P<location>(?P<file>.*?):(?P<line>[0-9]+):(?P<col>[0-9]+)): (?P<message>([^ ]*? )?(error:|[A-Z][0-9]*) .*)"),
+         None, True, True),
+        # GCC style warnings
+        ("Compiler Warning",
+         re.compile(r"(?P<location>(?P<file>.*?):(?P<line>[0-9]+):(?P<col>[0-9]+)): (?P<message>([^ ]*? )?warning: .*)"),
+         ("warning: ",), True, True),
+        # MSVC compiler errors
+        ("Compiler Error",
+         re.compile(r"(?P<location>(?P<file>.*?)\((?P<line>[0-9]+)\)): (?P<message>(fatal )?error( C[0-9]*?): .*)"),
+         ("error C",), True, False),
+        # Binutils/MSVC linker errors
+        ("Linker Error",
+         re.compile(r"(?P<location>(?P<file>.*?)(:.*?)?)( )?: (?P<message>(( fatal)?error LNK|warning LNK|undefined reference|multiple definition).*)"),
+         ("LNK", "undefined reference", "multiple definition"), False, False),
+        # LLVM linker errors
+        ("Linker Error",
+         re.compile(r"(?P<location>(.*?)ld(\.lld)?): (error|warning): (?P<message>.*)"),
+         (": error: ", ": warning: "), False, False),
+    ]
+
+    details_pattern = re.compile(r" ( |[0-9])*\| .*")
+    ansi_pattern = re.compile(r"\x1B[@-_][0-?]*[ -/]*[@-~]")
+
+    def __init__(self, max_per_file=10, max_errors=100):
+        self._lock = threading.Lock()
+        self._max_per_file = max_per_file
+        self._max_errors = max_errors
+        self._diagnostics = [OrderedDict() if with_file else [] for _, _, _, with_file, _ in self.patterns]
+        self._files = [{} for _ in self.patterns]
+        self._details = None
+
+    def _add(self, index, match):
+        error = match.groupdict()
+        diagnostics = self._diagnostics[index]
+        if not self.patterns[index][3]:
+            # One more than the report accepts, to let it note the truncation
+            if len(diagnostics) <= self._max_errors:
+                diagnostics.append(error)
+            return None
+
+        diagnostic = diagnostics.get(error["location"])
+        if diagnostic is not None:
+            diagnostic[1][error["message"]] = True
+            return None
+
+        if len(diagnostics) >= self._max_errors:
+            return None
+        files = self._files[index]
+        file = error.get("file") or error["location"]
+        if files.get(file, 0) >= self._max_per_file:
+            return None
+        files[file] = files.get(file, 0) + 1
+
+        details = []
+        diagnostics[error["location"]] = (error, OrderedDict([(error["message"], True)]), details)
+        return details
+
+    def _feed_line(self, line):
+        if "\x1b" in line:
+            line = self.ansi_pattern.sub("", line)
+        line = line.rstrip("\r\n")
+
+        # Source excerpt following a diagnostic
+        if self._details is not None:
+            if self.details_pattern.match(line):
+                self._details.append(line)
+                return
+            self._details = None
+
+        if ": " not in line:
+            return
+
+        for index, (_, pattern, keywords, _, excerpts) in enumerate(self.patterns):
+            if keywords and not any(keyword in line for keyword in keywords):
+                continue
+            match = pattern.match(line)
+            if match is None:
+                continue
+            details = self._add(index, match)
+            if excerpts:
+                self._details = details
+
+    def feed(self, lines):
+        """ Parses a batch of output lines. """
+        with self._lock:
+            for line in lines:
+                self._feed_line(line)
+
+    def report(self, report):
+        """ Adds parsed diagnostics to a task report. """
+        with self._lock:
+            for (type, _, _, with_file, _), diagnostics in zip(self.patterns, self._diagnostics):
+                if not with_file:
+                    for error in diagnostics:
+                        if not report.add_error(type, error["location"], error["message"]):
+                            break
+                    continue
+                report.add_errors_with_file(type, [
+                    (error, list(messages), "\n".join(details) + "\n" if details else "")
+                    for error, messages, details in diagnostics.values()
+                ])
+
+
 class attributes:
     @staticmethod
     def asflags(attrib, prepend=False):
@@ -628,6 +867,61 @@ class attributes:
         return utils.concat_attributes("sources", attrib, prepend)
 
 
+class DepfileInfluence(DirectoryInfluence):
+    """
+    Include path influence limited to headers actually used by a task.
+
+    Instead of hashing all files found in an include path, only the
+    headers listed in the depfiles written by the compiler during the
+    previous build of the task are hashed. The provider falls back to
+    hashing the whole include path, like :class:`DirectoryInfluence`,
+    when there is no record of a previous build, when the list of
+    source files has changed, or when a recorded header has been removed.
+
+    Note that a task is built twice before its identity is stable: once
+    with the whole include path as influence and once more with the
+    recorded headers. The same applies when the set of included headers
+    changes. New headers shadowing recorded headers in include paths
+    searched earlier are not detected.
+
+    Example:
+
+    .. code-block:: python
+
+        from jolt.plugins import ninja
+
+        @ninja.influence.incpaths(type=ninja.DepfileInfluence)
+        class Library(ninja.CXXLibrary):
+            incpaths = ["sdk/include"]
+            sources = ["src/*.cpp"]
+
+    """
+
+    def __init__(self, path):
+        super().__init__(path)
+        self._incpath = path.rstrip(os.sep)
+
+    def get_filelist(self, task):
+        try:
+            return self._files[task]
+        except KeyError:
+            pass
+
+        recorded = getattr(task, "_recorded_headers", None)
+        headers = recorded() if recorded else None
+        if headers is None:
+            return super().get_filelist(task)
+
+        incpath = task.tools.expand_path(self._incpath)
+        filelist = [Path(header) for header in headers if fs.is_relative_to(header, incpath)]
+        self._files[task] = filelist
+        return filelist
+
+    def is_influenced_by(self, task, path):
+        path = task.tools.expand_path(path)
+        return fs.is_relative_to(path, task.tools.expand_path(self._incpath))
+
+
 class influence:
     @staticmethod
     def incpaths(type=DirectoryInfluence):
@@ -814,7 +1108,7 @@ class SharedLibraryVariable(Variable):
         self._default = default
 
     def create(self, project, writer, deps, tools):
-        value = self._default if isinstance(project, CXXLibrary) and project.shared else ""
+        value = self._default if getattr(project, "shared", False) else ""
         writer.variable(self.name, str(value))
 
     @utils.cached.instance
@@ -826,9 +1120,28 @@ class GNUPCHVariables(Variable):
     pch_ext = ".pch"
     gch_ext = ".gch"
 
+    # Variables that must have the same values when a precompiled
+    # header is compiled and when it is used.
+    key_variables = [
+        "cxxstd", "optflag", "cxxflags", "shared_flags", "imported_cxxflags",
+        "extra_cxxflags", "covflags", "macros",
+    ]
+
     def __init__(self):
         pass
 
+    def key(self, project, writer, tools):
+        """
+        Returns the identity of the compiler and flags used for C++ sources.
+
+        A precompiled header can only be used by compilations with the
+        same identity as the compilation that produced it.
+        """
+        compiler = writer.variables.get("cxx_path")
+        values = [GNUObjectCacheVariable._compiler_id(compiler) if compiler else writer.variables.get("cxx", "")]
+        values += [writer.variables.get(name, "") for name in self.key_variables]
+        return utils.hashstring("\n".join(values))
+
     def create(self, project, writer, deps, tools):
         pch = [src for src in project.sources if src.endswith(self.pch_ext)]
 
@@ -860,6 +1173,426 @@ class GNUCoverageVariable(Variable):
             writer.variable("covflags", "")
 
 
+class GNUObjectCacheVariable(Variable):
+    """
+    Compiler wrapper consulting the object cache.
+
+    The wrapper is enabled with the ``object_cache`` option in the
+    ``[ninja]`` configuration section. Compiled objects are keyed by
+    the compiler command line, the toolchain identity and the contents
+    of the source file and the headers listed in its depfile.
+    """
+
+    _toolchain_ids = {}
+
+    @classmethod
+    def _compiler_id(cls, path):
+        stat = os.stat(path)
+        key = (path, stat.st_size, stat.st_mtime)
+        if key not in cls._toolchain_ids:
+            cls._toolchain_ids[key] = utils.hashfile(path)
+        return cls._toolchain_ids[key]
+
+    def _toolchain_id(self, project, tools):
+        ids = []
+        for name in ["cc", "cxx"]:
+            var = getattr(project, name, None)
+            if not isinstance(var, ToolEnvironmentVariable):
+                continue
+            value = tools.getenv((var._envname or var.name).upper(), var._default)
+            executable = tools.which(value.split()[0]) if value else None
+            if executable:
+                ids.append(self._compiler_id(executable))
+        return utils.hashstring(":".join(ids))
+
+    def create(self, project, writer, deps, tools):
+        stats = getattr(project, "_objcache_stats", None)
+        if not stats:
+            writer.variable(self.name, "")
+            return
+
+        command = [
+            utils.quote_path(sys.executable),
+            utils.quote_path(objcache.__file__),
+            "--cache", utils.quote_path(fs.path.join(get_cachedir(), "objects")),
+            "--toolchain", self._toolchain_id(project, tools),
+            "--stats", utils.quote_path(stats),
+        ]
+        shared = config.get("ninja", "object_cache_shared")
+        if shared:
+            command += ["--shared", utils.quote_path(shared)]
+        writer.variable(self.name, " ".join(command + ["--"]))
+
+    @utils.cached.instance
+    def get_influence(self, task):
+        return "OCV"
+
+
+class CompileAction(object):
+    """
+    A compilation to be executed by a :class:`CompileExecutor`.
+
+    Attributes:
+        command (list): The compiler command line.
+        cwd (str): Working directory of the command, relative to the
+            workspace root.
+        inputs (dict): Digests of the source file and all headers
+            within the workspace, by path relative to the workspace root.
+            Files outside of the workspace, e.g. system headers, are
+            expected to be provided by the toolchain.
+        outputs (list): Paths of files produced by the command,
+            relative to the working directory.
+        toolchain (dict): Identity of the compiler and identities of
+            the artifacts required by the task, by task name.
+        wsroot (str): Path of the workspace root on the client.
+    """
+
+    def __init__(self, command, cwd, inputs, outputs, toolchain, wsroot):
+        self.command = command
+        self.cwd = cwd
+        self.inputs = inputs
+        self.outputs = outputs
+        self.toolchain = toolchain
+        self.wsroot = wsroot
+
+    def verify_toolchain(self, tools):
+        """ Raises an error if the compiler of the action is not available. """
+        compiler = tools.which(self.command[0])
+        raise_error_if(
+            not compiler or GNUObjectCacheVariable._compiler_id(compiler) != self.toolchain.get("compiler"),
+            "Compiler not available: {}", self.command[0])
+
+
+class CompileResult(object):
+    """
+    The result of a :class:`CompileAction`.
+
+    Attributes:
+        returncode (int): Exit status of the command.
+        stdout (bytes): Standard output of the command.
+        stderr (bytes): Standard error of the command.
+        outputs (dict): Contents of the produced files, by path
+            relative to the working directory of the action.
+    """
+
+    def __init__(self, returncode, stdout=b"", stderr=b"", outputs=None):
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+        self.outputs = outputs or {}
+
+
+_compile_executors = {}
+
+
+class CompileExecutor(object):
+    """
+    Executes compilations of Ninja tasks on other hosts.
+
+    Executors are selected by name with the ``remote_compile`` option
+    in the ``[ninja]`` configuration section. Plugins register their
+    own executors with the :meth:`Register` decorator.
+    """
+
+    name = None
+
+    remote = True
+    """ Executes actions on other hosts. More jobs are then run by Ninja. """
+
+    @staticmethod
+    def Register(cls):
+        """ Decorator registering a compile executor class. """
+        _compile_executors[cls.name] = cls
+        return cls
+
+    @staticmethod
+    def get(name):
+        cls = _compile_executors.get(name)
+        raise_error_if(cls is None, "No such remote compile executor: {}", name)
+        return cls()
+
+    def execute(self, action, read_input):
+        """
+        Executes a compile action.
+
+        Args:
+            action (CompileAction): The action to execute.
+            read_input (function): Returns the content of an input
+                file given its digest.
+
+        Returns:
+            A :class:`CompileResult`. An exception should be raised if
+            the action could not be executed, in which case the file is
+            compiled locally instead.
+        """
+        raise NotImplementedError()
+
+
+@CompileExecutor.Register
+class LocalCompileExecutor(CompileExecutor):
+    """
+    Executes actions in a temporary directory on the local host.
+
+    Only the inputs of the action are available to the compiler,
+    which is how a remote worker would see it. The executor is used
+    by workers to execute actions and to test actions locally.
+    """
+
+    name = "local"
+    remote = False
+
+    def execute(self, action, read_input):
+        with tempfile.TemporaryDirectory(prefix="jolt-compile-") as root:
+            for path, digest in action.inputs.items():
+                path = fs.path.join(root, path)
+                fs.makedirs(fs.path.dirname(path))
+                with open(path, "wb") as f:
+                    f.write(read_input(digest))
+
+            cwd = fs.path.join(root, action.cwd)
+            for output in action.outputs:
+                fs.makedirs(fs.path.dirname(fs.path.join(cwd, output)))
+
+            command = action.command + ["-fdebug-prefix-map={}={}".format(root, action.wsroot)]
+            p = subprocess.run(command, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            outputs = {}
+            if p.returncode == 0:
+                for output in action.outputs:
+                    with open(fs.path.join(cwd, output), "rb") as f:
+                        outputs[output] = f.read()
+            return CompileResult(p.returncode, p.stdout, p.stderr, outputs)
+
+
+class RemoteCompileServer(object):
+    """
+    Receives compilation requests from the compiler wrapper run by Ninja.
+
+    Requests are turned into compile actions and executed by a
+    :class:`CompileExecutor`. The inputs of an action are the files
+    recorded for the object by the previous build, in the Ninja deps
+    log or in a kept depfile. Only sources without such a record are
+    preprocessed to list their dependencies. The object files and
+    depfiles returned are written to the build directory before the
+    wrapper is told that the compilation is done. The wrapper compiles
+    locally when a request is declined, which is also the case when
+    an action with recorded inputs fails, e.g. because of a new
+    include.
+    """
+
+    # Options of the compiler command line that produce dependency information
+    depopts = ("-MD", "-MMD", "-MP")
+    depopts_arg = ("-MF", "-MT", "-MQ")
+
+    def __init__(self, project, executor, deps, tools, jobs):
+        self._project = project
+        self._executor = executor
+        self._tools = tools
+        self._wsroot = tools.wsroot
+        self._pool = ThreadPoolExecutor(max_workers=jobs)
+        self._lock = threading.Lock()
+        self._digests = {}
+        self._paths = {}
+        self._listener = None
+        self._thread = None
+        self._stopped = False
+        self._authkey = os.urandom(16)
+        self._artifacts = {name: artifact.identity for name, artifact in deps.items()}
+        self._compilers = {}
+        self._depslog = read_deps_log(fs.path.join(project.outdir, ".ninja_deps"))
+        self.compiled = 0
+        self.requested = 0
+
+    def start(self):
+        """ Starts listening. Returns environment variables for the wrapper. """
+        self._listener = Listener(family="AF_UNIX", authkey=self._authkey)
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+        return {
+            "JOLT_REMOTE_COMPILE_ADDRESS": self._listener.address,
+            "JOLT_REMOTE_COMPILE_AUTHKEY": self._authkey.hex(),
+        }
+
+    def stop(self):
+        """ Stops listening and waits for pending requests. """
+        if self._listener is None:
+            return
+        self._stopped = True
+        try:
+            # Wake up the listening thread
+            Client(self._listener.address, authkey=self._authkey).close()
+        except OSError:
+            pass
+        self._thread.join()
+        self._listener.close()
+        self._pool.shutdown()
+
+    def _serve(self):
+        while True:
+            try:
+                conn = self._listener.accept()
+            except (OSError, EOFError):
+                if self._stopped:
+                    return
+                continue
+            if self._stopped:
+                conn.close()
+                return
+            self._pool.submit(self._handle, conn)
+
+    def _handle(self, conn):
+        with conn:
+            try:
+                request = conn.recv()
+                with self._lock:
+                    self.requested += 1
+                result = self._compile(request["command"], request["cwd"])
+            except Exception as e:
+                log.debug("Remote compilation failed: {}", str(e))
+                result = None
+            if result is not None:
+                with self._lock:
+                    self.compiled += 1
+            try:
+                conn.send(result)
+            except OSError:
+                pass
+
+    def _digest(self, path):
+        with self._lock:
+            digest = self._digests.get(path)
+        if digest is None:
+            digest = objcache.hash_file(path)
+            with self._lock:
+                self._digests[path] = digest
+                self._paths[digest] = path
+        return digest
+
+    def _read_input(self, digest):
+        with self._lock:
+            path = self._paths[digest]
+        with open(path, "rb") as f:
+            return f.read()
+
+    def _scan_command(self, command, output):
+        """ Returns a command line listing the dependencies of the source file. """
+        scan = []
+        args = iter(command)
+        for arg in args:
+            if arg in self.depopts or arg == "-c":
+                continue
+            if arg in self.depopts_arg or arg == "-o":
+                next(args, None)
+                continue
+            scan.append(arg)
+        return scan + ["-M", "-MT", output]
+
+    def _toolchain(self, command):
+        compiler = command[0]
+        with self._lock:
+            identity = self._compilers.get(compiler)
+        if identity is None:
+            path = self._tools.which(compiler)
+            identity = GNUObjectCacheVariable._compiler_id(path) if path else ""
+            with self._lock:
+                self._compilers[compiler] = identity
+        return {"compiler": identity, "artifacts": self._artifacts}
+
+    def _recorded_inputs(self, cwd, output, depfile):
+        """ Returns the inputs recorded for an object by the previous build, or None. """
+        relpath = fs.path.relpath(fs.path.join(cwd, output), self._wsroot)
+        inputs = self._depslog.get(relpath)
+        if inputs is not None:
+            return inputs
+        try:
+            with open(fs.path.join(cwd, depfile)) as f:
+                return objcache.parse_depfile(f.read())
+        except OSError:
+            return None
+
+    def _scanned_inputs(self, command, cwd, output):
+        p = subprocess.run(self._scan_command(command, output), cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        if p.returncode != 0:
+            return None
+        return objcache.parse_depfile(p.stdout.decode())
+
+    def _inputs(self, paths, cwd, source):
+        inputs = {}
+        for path in [source] + list(paths):
+            path = fs.path.normpath(fs.path.join(cwd, path))
+            relpath = fs.path.relpath(path, self._wsroot)
+            if relpath.startswith("..") or relpath in inputs:
+                continue
+            if not fs.path.exists(path):
+                # Removed since recorded
+                continue
+            inputs[relpath] = self._digest(path)
+        return inputs
+
+    def _compile(self, command, cwd):
+        files = objcache.parse_command(command)
+        if files is None:
+            return None
+        source, output, depfile = files
+
+        paths = self._recorded_inputs(cwd, output, depfile)
+        recorded = paths is not None
+        if not recorded:
+            paths = self._scanned_inputs(command, cwd, output)
+            if paths is None:
+                # Compile locally to get proper diagnostics
+                return None
+
+        action = CompileAction(
+            command=command,
+            cwd=fs.path.relpath(cwd, self._wsroot),
+            inputs=self._inputs(paths, cwd, source),
+            outputs=[output, depfile],
+            toolchain=self._toolchain(command),
+            wsroot=self._wsroot)
+        result = self._executor.execute(action, self._read_input)
+        if result.returncode != 0 and recorded:
+            # The recorded inputs may be incomplete
+            return None
+
+        if result.returncode == 0:
+            for output in action.outputs:
+                path = fs.path.join(cwd, output)
+                fs.makedirs(fs.path.dirname(path))
+                with open(path, "wb") as f:
+                    f.write(result.outputs[output])
+
+        return {
+            "returncode": result.returncode,
+            "stdout": result.stdout,
+            "stderr": result.stderr,
+        }
+
+
+class GNURemoteCompileVariable(Variable):
+    """
+    Compiler wrapper forwarding compilations to remote workers.
+
+    The wrapper is enabled with the ``remote_compile`` option in the
+    ``[ninja]`` configuration section.
+    """
+
+    def create(self, project, writer, deps, tools):
+        if not getattr(project, "_remote_compile", None):
+            writer.variable(self.name, "")
+            return
+
+        command = [
+            utils.quote_path(sys.executable),
+            utils.quote_path(remote_compile.__file__),
+            "--",
+        ]
+        writer.variable(self.name, " ".join(command))
+
+    @utils.cached.instance
+    def get_influence(self, task):
+        return "RCV"
+
+
 class Rule(HashInfluenceProvider):
     """ A source transformation rule.
 
@@ -993,13 +1726,25 @@ class Rule(HashInfluenceProvider):
         getattr(owner, "__rule_list")[name] = self
 
     def _out(self, project, infile, outfiles=None):
+        # Outputs are memoized while a build file is generated since
+        # they are requested both when inputs are queued and when
+        # build statements are emitted.
+        cache = getattr(project, "_rule_outputs", None)
+        if cache is not None:
+            key = (self, infile, tuple(outfiles) if outfiles else None)
+            result = cache.get(key)
+            if result is None:
+                result = cache[key] = self._expand_out(project, infile, outfiles)
+            return result
+        return self._expand_out(project, infile, outfiles)
+
+    def _expand_out(self, project, infile, outfiles=None):
         in_dirname_outdir = None
         in_dirname, in_basename = fs.path.split(infile)
         in_base, in_ext = fs.path.splitext(in_basename)
 
         if in_dirname and fs.path.isabs(in_dirname):
-            in_dirname_outdir = fs.path.relpath(in_dirname, project.tools.wsroot)
-            in_dirname = fs.path.relpath(in_dirname, project.tools.wsroot)
+            in_dirname = in_dirname_outdir = fs.path.relpath(in_dirname, project.tools.wsroot)
 
         result_files = []
         for outfile in outfiles or self.outfiles:
@@ -1041,18 +1786,19 @@ class Rule(HashInfluenceProvider):
 
     def build(self, project, writer, infiles, implicit=None, implicit_outputs=None, order_only=None):
         result = []
+        wsroot = project.tools.wsroot
         infiles = utils.as_list(infiles)
-        infiles_rel = [fs.path.relpath(infile, project.tools.wsroot) for infile in infiles]
+        infiles_rel = [fs.path.relpath(infile, wsroot) for infile in infiles]
         implicit = (self.implicit or []) + (implicit or [])
         implicit_outputs = (self.implicit_outputs or []) + (implicit_outputs or [])
         order_only = (self.order_only or []) + (order_only or [])
 
         if self.aggregate:
             outfiles, variables = self._out(project, infiles[0])
-            outfiles_rel = [fs.path.relpath(outfile, project.tools.wsroot) for outfile in outfiles]
+            outfiles_rel = [fs.path.relpath(outfile, wsroot) for outfile in outfiles]
             if implicit_outputs:
                 implicit_outfiles, _ = self._out(project, infiles[0], implicit_outputs)
-                implicit_outfiles_rel = [fs.path.relpath(outfile, project.tools.wsroot) for outfile in implicit_outfiles]
+                implicit_outfiles_rel = [fs.path.relpath(outfile, wsroot) for outfile in implicit_outfiles]
             else:
                 implicit_outfiles_rel = []
             writer.build(outfiles_rel, self.name, infiles_rel, variables=variables, implicit=implicit, implicit_outputs=implicit_outfiles_rel, order_only=self.order_only + order_only)
@@ -1060,10 +1806,10 @@ class Rule(HashInfluenceProvider):
         else:
             for infile, infile_rel in zip(infiles, infiles_rel):
                 outfiles, variables = self._out(project, infile)
-                outfiles_rel = [fs.path.relpath(outfile, project.tools.wsroot) for outfile in outfiles]
+                outfiles_rel = [fs.path.relpath(outfile, wsroot) for outfile in outfiles]
                 if implicit_outputs:
                     implicit_outfiles, _ = self._out(project, infile, implicit_outputs)
-                    implicit_outfiles_rel = [fs.path.relpath(outfile, project.tools.wsroot) for outfile in implicit_outfiles]
+                    implicit_outfiles_rel = [fs.path.relpath(outfile, wsroot) for outfile in implicit_outfiles]
                 else:
                     implicit_outfiles_rel = []
                 writer.build(outfiles_rel, self.name, infile_rel, variables=variables, implicit=implicit, implicit_outputs=implicit_outfiles_rel, order_only=order_only)
@@ -1312,14 +2058,15 @@ class GNUMRIWriter(FileListWriter):
         self.outfiles = outfiles
 
     def _data(self, project, infiles):
-        data = "create {}\n".format(self.outfiles[0])
+        data = ["create {}".format(self.outfiles[0])]
         for infile in infiles:
             _, ext = fs.path.splitext(infile)
             if ext == ".a":
-                data += "addlib {}\n".format(infile)
+                data.append("addlib {}".format(infile))
             else:
-                data += "addmod {}\n".format(infile)
-        data += "save\nend\n"
+                data.append("addmod {}".format(infile))
+        data.append("save\nend\n")
+        data = "\n".join(data)
         return data, utils.hashstring(data)
 
     @utils.cached.instance
@@ -1624,6 +2371,8 @@ class GNUToolchain(Toolchain):
     extra_ldflags = ProjectVariable(attrib="ldflags")
 
     covflags = GNUCoverageVariable()
+    objcache = GNUObjectCacheVariable()
+    remotecc = GNURemoteCompileVariable()
 
     task_fbflags = ProjectVariable(attrib="fbflags")
     task_protoflags = ProjectVariable(attrib="protoflags")
@@ -1638,7 +2387,7 @@ class GNUToolchain(Toolchain):
     mkdir_debug = MakeDirectory(name="$outdir_rel/.debug")
 
     compile_pch = GNUCompiler(
-        command="$cxxwrap $cxx -x c++-header $cxxstd $optflag $cxxflags $shared_flags $imported_cxxflags $extra_cxxflags $covflags $macros $incpaths -MMD -MF $out.d -c $in -o $out",
+        command="$objcache $remotecc $cxxwrap $cxx -x c++-header $cxxstd $optflag $cxxflags $shared_flags $imported_cxxflags $extra_cxxflags $covflags $macros $incpaths -MMD -MF $out.d -c $in -o $out",
         deps="gcc",
         depfile="$out.d",
         infiles=[GNUPCHVariables.pch_ext],
@@ -1647,7 +2396,7 @@ class GNUToolchain(Toolchain):
         variables={"desc": "[PCH] {in_base}{in_ext}"})
 
     compile_c = GNUCompiler(
-        command="$ccwrap $cc -x c $cstd $pch_flags $optflag $cflags $shared_flags $imported_cflags $extra_cflags $covflags $macros $incpaths -MMD -MF $out.d -c $in -o $out",
+        command="$objcache $remotecc $ccwrap $cc -x c $cstd $pch_flags $optflag $cflags $shared_flags $imported_cflags $extra_cflags $covflags $macros $incpaths -MMD -MF $out.d -c $in -o $out",
         deps="gcc",
         depfile="$out.d",
         infiles=[".c"],
@@ -1657,7 +2406,7 @@ class GNUToolchain(Toolchain):
         implicit=["$cc_path"])
 
     compile_cxx = GNUCompiler(
-        command="$cxxwrap $cxx -x c++ $cxxstd $pch_flags $optflag $cxxflags $shared_flags $imported_cxxflags $extra_cxxflags $covflags $macros $incpaths -MMD -MF $out.d -c $in -o $out",
+        command="$objcache $remotecc $cxxwrap $cxx -x c++ $cxxstd $pch_flags $optflag $cxxflags $shared_flags $imported_cxxflags $extra_cxxflags $covflags $macros $incpaths -MMD -MF $out.d -c $in -o $out",
         deps="gcc",
         depfile="$out.d",
         infiles=[".cc", ".cpp", ".cxx"],
@@ -1667,7 +2416,7 @@ class GNUToolchain(Toolchain):
         implicit=["$cxx_path"])
 
     compile_asm = GNUCompiler(
-        command="$ccwrap $cc -x assembler $pch_flags $asflags $shared_flags $imported_asflags $extra_asflags -MMD -MF $out.d -c $in -o $out",
+        command="$objcache $remotecc $ccwrap $cc -x assembler $pch_flags $asflags $shared_flags $imported_asflags $extra_asflags -MMD -MF $out.d -c $in -o $out",
         deps="gcc",
         depfile="$out.d",
         infiles=[".s", ".asm"],
@@ -1677,7 +2426,7 @@ class GNUToolchain(Toolchain):
         implicit=["$cc_path"])
 
     compile_asm_with_cpp = GNUCompiler(
-        command="$ccwrap $cc -x assembler-with-cpp $pch_flags $asflags $shared_flags $imported_asflags $extra_asflags $macros $incpaths -MMD -MF $out.d -c $in -o $out",
+        command="$objcache $remotecc $ccwrap $cc -x assembler-with-cpp $pch_flags $asflags $shared_flags $imported_asflags $extra_asflags $macros $incpaths -MMD -MF $out.d -c $in -o $out",
         deps="gcc",
         depfile="$out.d",
         infiles=[".S"],
@@ -2122,6 +2871,52 @@ class CXXProject(Task):
     previous build will be removed before the execution begins.
     """
 
+    unity = False
+    """ Combine C/C++ sources into unity translation units.
+
+    Instead of compiling each source file separately, batches of
+    sources are included into generated source files which are then
+    compiled. Common headers are parsed once per batch instead of
+    once per source, which can reduce compile time substantially in
+    projects with many small source files. Sources must not rely on
+    file local declarations with conflicting names, as such sources
+    can't be compiled in the same translation unit.
+
+    Supported values are:
+
+        - False / None - compile each source separately
+        - "size" / True - batches of at most ``unity_batch_size`` sources
+        - "directory" - batches of sources in the same directory, each of
+          at most ``unity_batch_size`` sources unless it is 0
+        - "time" - batches of sources expected to compile in about
+          ``unity_batch_time`` seconds, based on compile times measured
+          by Ninja in previous builds
+
+    Sources are batched in path order, with separate batches for C and C++.
+    Batches are compiled in parallel. A batch with a single source is
+    compiled as usual.
+
+    Example:
+
+      .. literalinclude:: ../examples/unity_build/unity.jolt
+         :language: python
+         :caption: examples/unity_build/unity.jolt
+
+    """
+
+    unity_batch_size = 8
+    """ Maximum number of sources in a unity translation unit. """
+
+    unity_batch_time = 10.0
+    """ Expected compile time in seconds of a unity translation unit. """
+
+    unity_unsafe = []
+    """ A list of sources that are always compiled separately in unity builds.
+
+    Path names may contain simple shell-style wildcards such as
+    '*' and '?'.
+    """
+
     abstract = True
     toolchain = None
 
@@ -2147,6 +2942,7 @@ class CXXProject(Task):
         self.libraries = utils.as_list(utils.call_or_return(self, self.__class__._libraries))
         self.macros = utils.as_list(utils.call_or_return(self, self.__class__._macros))
         self._pch_out = None
+        self._pch_key = None
         self.publishdir = self.expand(self.__class__.publishdir or '')
 
         self.influence.append(TaskAttributeInfluence("asflags"))
@@ -2162,6 +2958,14 @@ class CXXProject(Task):
         self.influence.append(TaskAttributeInfluence("binary"))
         self.influence.append(TaskAttributeInfluence("publishdir"))
         self.influence.append(TaskAttributeInfluence("toolchain"))
+        self.influence.append(TaskAttributeInfluence("unity"))
+        self.influence.append(TaskAttributeInfluence("unity_batch_size"))
+        self.influence.append(TaskAttributeInfluence("unity_batch_time"))
+        self.influence.append(TaskAttributeInfluence("unity_unsafe"))
+
+        raise_task_error_if(
+            self.unity not in _unity_strategies, self,
+            "unsupported unity build strategy '{0}'", self.unity)
 
         if self.source_influence:
             for source in self.sources:
@@ -2204,31 +3008,104 @@ class CXXProject(Task):
     def _init_sources(self):
         self.sources = utils.as_list(utils.call_or_return(self, self.__class__._sources))
 
+    def _read_depfile(self, tools, depfile):
+        """ Returns the inputs listed in a depfile. """
+        try:
+            data = tools.read_file(depfile)
+        except Exception:
+            return []
+
+        result = []
+        data = data.replace("\\\n", "")
+        for depline in data.splitlines():
+            depline = depline.strip()
+            depline = depline.split(":", 1)
+            if len(depline) <= 1:
+                continue
+
+            inputs = depline[1]
+            inputs = inputs.replace("\\ ", "\x00")
+            inputs = [dep.strip().replace("\x00", " ") for dep in inputs.split()]
+            result.extend(filter(lambda n: n, inputs))
+        return result
+
+    def _depfile_inputs(self, tools):
+        """
+        Returns the inputs of all objects, relative to the task's directory.
+
+        Inputs are read in bulk from the Ninja deps log. Depfiles are only
+        read for objects missing in the log, e.g. when built by rules
+        without ``deps = gcc``. Each unique path is only normalized once.
+        """
+        depslog = read_deps_log(fs.path.join(self.outdir, ".ninja_deps"))
+        paths = {}
+        result = set()
+        with tools.cwd(tools.wsroot):
+            for obj in getattr(self._writer, "_objects", []):
+                inputs = depslog.get(tools.expand_relpath(obj, tools.wsroot))
+                if inputs is None:
+                    inputs = self._read_depfile(tools, obj + ".d")
+                for path in inputs:
+                    relpath = paths.get(path)
+                    if relpath is None:
+                        relpath = paths[path] = sys.intern(tools.expand_relpath(path, self.joltdir))
+                    result.add(relpath)
+        return result
+
     def _verify_influence(self, deps, artifact, tools):
         # Verify that listed sources and their dependencies are influencing
         sources = set(self.sources + getattr(self, "headers", []))
-        with tools.cwd(tools.wsroot):
-            depfiles = [obj + ".d" for obj in getattr(self._writer, "_objects", [])]
-            for depfile in depfiles:
-                try:
-                    data = tools.read_file(depfile)
-                except Exception:
-                    continue
-
-                data = data.replace("\\\n", "")
-                for depline in data.splitlines():
-                    depline = depline.strip()
-                    depline = depline.split(":", 1)
-                    if len(depline) <= 1:
-                        continue
-
-                    inputs = depline[1]
-                    inputs = inputs.replace("\\ ", "\x00")
-                    inputs = [dep.strip().replace("\x00", " ") for dep in inputs.split()]
-                    inputs = [tools.expand_relpath(input, self.joltdir) for input in filter(lambda n: n, inputs)]
-                    sources = sources.union(inputs)
+        sources = sources.union(self._depfile_inputs(tools))
         super()._verify_influence(deps, artifact, tools, sources)
 
+    def _header_record_path(self):
+        return fs.path.join(
+            self.tools.buildroot, "ninja-headers",
+            utils.canonical(self.short_qualified_name) + ".json")
+
+    def _source_list_digest(self):
+        sources = utils.as_list(utils.call_or_return(self, self.__class__._sources))
+        sources = [path for source in sources for path in self.tools.glob(source)]
+        return utils.hashstring("\n".join(sorted(sources)))
+
+    @utils.cached.instance
+    def _recorded_headers(self):
+        """
+        Returns the headers recorded from depfiles during the previous build.
+
+        None is returned if there is no record, if the source list has
+        changed since the record was made, or if any of the headers
+        have been removed.
+        """
+        try:
+            record = json.loads(self.tools.read_file(self._header_record_path()))
+        except Exception:
+            return None
+        if record.get("task") != self.qualified_name:
+            return None
+        if record.get("sources") != self._source_list_digest():
+            return None
+        headers = record.get("headers", [])
+        if not all(fs.path.exists(header) for header in headers):
+            return None
+        return headers
+
+    def _record_headers(self, tools):
+        """ Records the headers listed in depfiles for use by DepfileInfluence. """
+        if not any(isinstance(ip, DepfileInfluence) for ip in self.influence):
+            return
+        buildroot = tools.expand_path(tools.buildroot)
+        headers = [fs.path.normpath(fs.path.join(self.joltdir, path)) for path in self._depfile_inputs(tools)]
+        headers = sorted(path for path in headers if not fs.is_relative_to(path, buildroot))
+        record = {
+            "task": self.qualified_name,
+            "sources": self._source_list_digest(),
+            "headers": headers,
+        }
+        path = self._header_record_path()
+        fs.makedirs(fs.path.dirname(path))
+        tools.write_file(path, json.dumps(record), expand=False)
+
     def _expand_headers(self):
         headers = []
         for header in getattr(self, "headers", []):
@@ -2259,18 +3136,234 @@ class CXXProject(Task):
             sources += list
         self.sources = sources
 
+    def _unity_dir(self):
+        return fs.path.join(self.outdir, "{0}.unity".format(self.binary))
+
+    def _read_unity_source(self, path):
+        """ Returns the sources included by a unity translation unit. """
+        try:
+            with open(path) as f:
+                lines = f.read().splitlines()
+        except OSError:
+            return []
+        dirname = fs.path.dirname(path)
+        return [
+            fs.path.normpath(fs.path.join(dirname, line[len('#include "'):-1]))
+            for line in lines if line.startswith('#include "')
+        ]
+
+    def _write_unity_source(self, path, sources):
+        """ Writes a unity translation unit unless its content is unchanged. """
+        dirname = fs.path.dirname(path)
+        data = "".join(
+            '#include "{0}"\n'.format(fs.as_posix(fs.path.relpath(source, dirname)))
+            for source in sources)
+        try:
+            with open(path) as f:
+                if f.read() == data:
+                    return
+        except OSError:
+            pass
+        fs.makedirs(dirname)
+        with open(path, "w") as f:
+            f.write(data)
+
+    def _unity_compile_times(self, sources, tools):
+        """
+        Returns the compile times of sources measured in previous builds.
+
+        The compile time of a unity translation unit is divided evenly
+        between the sources it includes.
+        """
+        durations = read_build_log(fs.path.join(self.outdir, ".ninja_log"))
+        if not durations:
+            return {}
+
+        def duration(source):
+            _, ext = fs.path.splitext(source)
+            outputs = self.find_rule(ext).output(self, source)
+            if not outputs:
+                return None
+            return durations.get(fs.path.relpath(outputs[0], tools.wsroot))
+
+        times = {}
+        for source in sources:
+            seconds = duration(source)
+            if seconds is not None:
+                times[source] = seconds
+
+        unitydir = tools.expand_path(self._unity_dir())
+        if fs.path.isdir(unitydir):
+            for name in sorted(os.listdir(unitydir)):
+                path = fs.path.join(unitydir, name)
+                members = self._read_unity_source(path)
+                seconds = duration(path)
+                if not members or seconds is None:
+                    continue
+                for member in members:
+                    times[member] = seconds / len(members)
+        return times
+
+    def _unity_batches(self, sources, times):
+        """ Groups sources into named batches according to the unity strategy. """
+        if self.unity == "directory":
+            groups = OrderedDict()
+            for source in sources:
+                groups.setdefault(fs.path.dirname(source), []).append(source)
+            batches = []
+            for dirname, group in groups.items():
+                name = utils.canonical(fs.path.relpath(dirname, self.joltdir))
+                size = self.unity_batch_size or len(group)
+                for index, offset in enumerate(range(0, len(group), size)):
+                    batches.append(("{0}_{1}".format(name, index), group[offset:offset + size]))
+            return batches
+
+        if self.unity == "time":
+            # Sources without measurements are assumed to take as long as
+            # the average measured source, or a batch share if there are none.
+            measured = [times[source] for source in sources if source in times]
+            if measured:
+                default = sum(measured) / len(measured)
+            else:
+                default = self.unity_batch_time / (self.unity_batch_size or 1)
+
+            groups, group, elapsed = [], [], 0.0
+            for source in sources:
+                seconds = times.get(source, default)
+                if group and elapsed + seconds > self.unity_batch_time:
+                    groups.append(group)
+                    group, elapsed = [], 0.0
+                group.append(source)
+                elapsed += seconds
+            if group:
+                groups.append(group)
+        else:
+            size = self.unity_batch_size or len(sources)
+            groups = [sources[offset:offset + size] for offset in range(0, len(sources), size)]
+
+        return [("unity_{0}".format(index), group) for index, group in enumerate(groups)]
+
+    def _unity_sources(self, sources, tools):
+        """
+        Replaces C/C++ sources with generated unity translation units.
+
+        Sources listed in ``unity_unsafe`` and sources of other types are
+        kept as is. Unity translation units are only rewritten if their
+        content changes, so that Ninja doesn't recompile them needlessly.
+        """
+        if not self.unity:
+            return sources
+
+        unsafe = set()
+        for pattern in utils.as_list(self.unity_unsafe):
+            unsafe.update(tools.expand_path(path) for path in self.tools.glob(pattern))
+
+        result, groups = [], OrderedDict()
+        for source in sources:
+            path = tools.expand_path(source)
+            _, ext = fs.path.splitext(path)
+            if ext not in _unity_exts or path in unsafe:
+                result.append(source)
+                continue
+            groups.setdefault(self.find_rule(ext), []).append(path)
+
+        times = {}
+        if self.unity == "time":
+            times = self._unity_compile_times([path for paths in groups.values() for path in paths], tools)
+
+        unitydir = tools.expand_path(self._unity_dir())
+        unity_sources = set()
+        for rule, paths in groups.items():
+            ext = [ext for ext in _unity_exts if ext in rule.infiles][0]
+            for name, batch in self._unity_batches(sorted(paths), times):
+                if len(batch) == 1:
+                    result.extend(batch)
+                    continue
+                path = fs.path.join(unitydir, name + ext)
+                self._write_unity_source(path, batch)
+                unity_sources.add(path)
+                result.append(path)
+
+        # Remove translation units of batches that no longer exist
+        if fs.path.isdir(unitydir):
+            for name in os.listdir(unitydir):
+                path = fs.path.join(unitydir, name)
+                if path not in unity_sources:
+                    fs.unlink(path, ignore_errors=True)
+
+        return result
+
+    def _import_pch(self, writer, deps, tools):
+        """
+        Uses a precompiled header published by a requirement.
+
+        The compiled header is used if it was compiled with the same
+        compiler and flags as the C++ sources of the task. Otherwise,
+        the published header is compiled again with the task's flags.
+        """
+        pch_flags = getattr(self.toolchain, "pch_flags", None)
+        if not isinstance(pch_flags, GNUPCHVariables):
+            return
+
+        # The key is only needed to publish or to use a precompiled header
+        providers = [artifact for _, artifact in deps.items() if artifact.cxxinfo.pch.get_value()]
+        if providers or isinstance(self, CXXPrecompiledHeader):
+            self._pch_key = pch_flags.key(self, writer, tools)
+        if not providers:
+            return
+
+        raise_task_error_if(
+            len(providers) > 1 or self._pch_out is not None, self,
+            "multiple precompiled headers found, only one is allowed")
+
+        artifact = providers[0]
+        sandbox = tools.sandbox(artifact, self.incremental)
+        header = tools.expand_path(fs.path.join(sandbox, artifact.cxxinfo.pch.get_value()))
+
+        if artifact.cxxinfo.pchkey.get_value() == self._pch_key:
+            self._pch_out = tools.expand_relpath(header + GNUPCHVariables.gch_ext, tools.wsroot)
+            return
+
+        self.info("Precompiled header '{}' was compiled with different flags, compiling it again",
+                  fs.path.basename(header))
+        self._pch = fs.path.basename(header)
+        self._pch_out = tools.expand_relpath("{outdir}/{binary}.dir/{_pch}" + GNUPCHVariables.gch_ext, tools.wsroot)
+        writer.sources.append(header)
+
     def _write_ninja_file(self, basedir, deps, tools, filename="build.ninja"):
-        with open(tools.expand_path(fs.path.join(basedir, filename)), "w") as fobj:
-            writer = ninja.Writer(fobj)
-            writer.depimports = [
-                tools.expand_relpath(dep, tools.wsroot)
-                for dep in self.depimports]
-            writer.objects = []
-            writer.sources = copy.copy(self.sources)
+        """
+        Generates the Ninja build file.
+
+        The file is only rewritten if its content has changed since
+        it was last generated. Ninja then doesn't have to reconsider
+        every build edge because of a modified manifest.
+        """
+        fobj = io.StringIO()
+        writer = NinjaWriter(fobj)
+        writer.depimports = [
+            tools.expand_relpath(dep, tools.wsroot)
+            for dep in self.depimports]
+        writer.objects = []
+        writer.sources = copy.copy(self.sources)
+        self._rule_outputs = {}
+        try:
             self._populate_rules_and_variables(writer, deps, tools)
+            self._import_pch(writer, deps, tools)
             self._populate_inputs(writer, deps, tools)
-            writer.close()
-            return writer
+        finally:
+            self._rule_outputs = None
+        data = fobj.getvalue()
+        writer.close()
+
+        path = tools.expand_path(fs.path.join(basedir, filename))
+        hashpath = path + ".hash"
+        digest = utils.hashstring(data)
+        if not fs.path.exists(path) or not fs.path.exists(hashpath) or tools.read_file(hashpath) != digest:
+            with open(path, "w") as fobj:
+                fobj.write(data)
+            with open(hashpath, "w") as fobj:
+                fobj.write(digest)
+        return writer
 
     def _write_shell_file(self, basedir, deps, tools, writer):
         filepath = fs.path.join(basedir, "compile")
@@ -2352,7 +3445,7 @@ if __name__ == "__main__":
 
     def _populate_inputs(self, writer, deps, tools, sources=None):
         # Source process queue
-        sources = sources or writer.sources
+        sources = sources or self._unity_sources(writer.sources, tools)
         if not sources:
             return
 
@@ -2390,10 +3483,10 @@ if __name__ == "__main__":
 
         # No more inputs/outputs to process, now emit all build rules
         for rule, source_list_origin in rule_source_list.items():
-            source_list, origins = [], set()
+            source_list, origins = [], OrderedDict()
             for source, origin in source_list_origin:
                 source_list.append(source)
-                origins.add(origin)
+                origins[origin] = True
             source_list = list(map(tools.expand_path, source_list))
             rule.build(self, writer, source_list, order_only=[origin.phony for origin in origins if origin and origin.phony])
 
@@ -2461,31 +3554,54 @@ if __name__ == "__main__":
         self.outdir_rel = self.tools.expand_relpath(self.outdir, tools.wsroot)
         self._expand_headers()
         self._expand_sources(deps, tools)
+        self._objcache_stats = None
+        if config.getboolean("ninja", "object_cache", False):
+            self._objcache_stats = fs.path.join(self.outdir, "objcache.stats")
+            fs.unlink(self._objcache_stats, ignore_errors=True)
+        self._remote_compile = config.get("ninja", "remote_compile")
         self._writer = self._write_ninja_file(self.outdir, deps, tools)
+        objects = self._objcache_artifact(deps, tools)
+        self._import_objects(objects)
         verbose = " -v" if log.is_verbose() else ""
         threads = config.get("jolt", "threads", tools.getenv("JOLT_THREADS", None))
         threads = " -j" + threads if threads else ""
         keep_going = " -k 0" if config.get_keep_going() else ""
         depsfile = self._get_keepdepfile(tools)
+        parser = self._diagnostic_parser()
+        server, environ = None, {}
+        if self._remote_compile:
+            jobs = config.getint("ninja", "remote_compile_jobs", 32)
+            executor = CompileExecutor.get(self._remote_compile)
+            server = RemoteCompileServer(self, executor, deps, tools, jobs)
+            environ = server.start()
+            if executor.remote:
+                threads = threads or " -j{}".format(jobs)
         try:
-            self.buildlog = tools.run(
-                "ninja{3}{2}{5} -C {0} -f {4} {1}",
-                tools.wsroot,
-                verbose,
-                threads,
-                depsfile,
-                fs.path.join(self.outdir, "build.ninja"),
-                keep_going,
-                output=True,
-            )
-            self._report_errors(self.buildlog)
+            with tools.environ(**environ):
+                self.buildlog = tools.run(
+                    "ninja{3}{2}{5} -C {0} -f {4} {1}",
+                    tools.wsroot,
+                    verbose,
+                    threads,
+                    depsfile,
+                    fs.path.join(self.outdir, "build.ninja"),
+                    keep_going,
+                    output=True,
+                    output_handler=parser.feed,
+                )
+            self._report_errors(parser=parser)
+            self._record_headers(tools)
+            self._export_objects(objects, tools)
         except JoltCommandError as e:
             self.buildlog = "\n".join(e.stdout)
-            report = self._report_errors(self.buildlog)
+            report = self._report_errors(parser=parser)
             error = self._first_reported_error(report)
             if error:
                 raise CompileError(error)
             raise e
+        finally:
+            self._report_remote_compile(server)
+            self._report_object_cache()
 
         if bool(getattr(self, "coverage", False)):
             self.covdatadir = tools.builddir("coverage-data")
@@ -2502,6 +3618,88 @@ if __name__ == "__main__":
                     if artifact.paths.coverage_data:
                         tools.copy(str(artifact.paths.coverage_data), self.covdatadir)
 
+    def _report_remote_compile(self, server):
+        """ Stops the remote compile server and reports statistics. """
+        if server is None:
+            return
+        server.stop()
+        if server.requested > 0:
+            self.info("Remote compilation: {} of {} object(s) compiled remotely",
+                      server.compiled, server.requested)
+
+    def _objcache_artifact(self, deps, tools):
+        """
+        Returns the artifact through which compiled objects are shared
+        with other hosts using the configured remote caches, or None.
+
+        The artifact is keyed by the task, the toolchain and the identities
+        of the task's requirements, but not by its sources. A build with
+        modified sources therefore finds the objects of unmodified sources.
+        Artifacts are never replaced, the first build to upload one
+        determines its content. Like session artifacts, they are not
+        kept in the local cache once the objects have been imported.
+        """
+        if not self._objcache_stats or not config.getboolean("ninja", "object_cache_remote", False):
+            return None
+        objcache_var = getattr(self, "objcache", None)
+        toolchain = objcache_var._toolchain_id(self, tools) if objcache_var else ""
+        requirements = sorted(artifact.identity for _, artifact in deps.items() if not artifact.is_session())
+        identity = utils.hashstring("\n".join([objcache.VERSION, self.qualified_name, toolchain] + requirements))
+        return cache.Artifact(cache.ArtifactCache.get(), None, identity=identity, name="objcache", session=True, tools=tools)
+
+    def _import_objects(self, artifact):
+        """ Downloads shared objects from remote caches into the local object cache. """
+        if artifact is None:
+            return
+        acache = artifact.get_cache()
+        try:
+            if acache.is_available_locally(artifact) or not acache.download_session_enabled():
+                return
+            if not acache.is_available_remotely(artifact, cache=False) or not acache.download(artifact):
+                return
+            local = objcache.ObjectCache(fs.path.join(get_cachedir(), "objects"))
+            local.merge(objcache.ObjectCache(artifact.path))
+        except Exception as e:
+            self.warning("Failed to download shared objects: {}", str(e))
+
+    def _export_objects(self, artifact, tools):
+        """ Uploads the objects used by the build to remote caches, unless already present. """
+        if artifact is None:
+            return
+        acache = artifact.get_cache()
+        try:
+            if acache.is_available_locally(artifact) or not acache.upload_enabled():
+                return
+            if acache.is_available_remotely(artifact, cache=False):
+                return
+            objects = objcache.read_objects(self._objcache_stats)
+            if not objects:
+                return
+            local = objcache.ObjectCache(fs.path.join(get_cachedir(), "objects"))
+            with acache.lock_artifact(artifact) as artifact:
+                if not artifact.is_temporary():
+                    return
+                with tools.tmpdir("objcache") as tmp, tools.cwd(tmp):
+                    local.export(objects, objcache.ObjectCache(tmp))
+                    artifact.collect("manifests")
+                    artifact.collect("objects")
+                acache.commit(artifact)
+            acache.upload(artifact)
+        except Exception as e:
+            self.warning("Failed to upload shared objects: {}", str(e))
+
+    def _report_object_cache(self):
+        """ Reports object cache statistics and evicts objects if the cache is full. """
+        if not self._objcache_stats:
+            return
+        hits, misses, saved = objcache.read_stats(self._objcache_stats)
+        if hits + misses > 0:
+            self.info("Object cache: {} of {} object(s) cached ({:.0f}%), {:.1f}s compile time saved",
+                      hits, hits + misses, 100 * hits / (hits + misses), saved)
+        if misses > 0:
+            max_size = config.getsize("ninja", "object_cache_size", 10 * 1024 ** 3)
+            objcache.ObjectCache(fs.path.join(get_cachedir(), "objects")).prune(max_size)
+
     def publish(self, artifact, tools):
         if bool(getattr(self, "coverage", False)):
             self.publish_coverage_data(artifact, tools)
@@ -2538,44 +3736,27 @@ if __name__ == "__main__":
             print("Use the 'compile' command to build individual compilation targets")
             super().debugshell(deps, tools)
 
-    def _report_errors(self, logbuffer):
-        """ Parses the build log and reports errors. """
+    def _diagnostic_parser(self):
+        """ Creates a parser for diagnostics in the build output. """
+        return DiagnosticParser(
+            max_per_file=config.getint("ninja", "max_errors_per_file", 10),
+            max_errors=config.getint("jolt", "task_max_errors", 100))
 
-        logbuffer = utils.strip_ansi_escape_sequences(logbuffer)
+    def _report_errors(self, logbuffer=None, parser=None):
+        """
+        Reports errors found in the build log.
 
-        with self.report() as report, utils.ignore_exception():
-            # GCC style errors
-            report.add_regex_errors_with_file(
-                "Compiler Error",
-                r"^(?P<location>(?P<file>.*?):(?P<line>[0-9]+):(?P<col>[0-9]+)): (?P<message>([^ ]*? )?(error:|[A-Z][0-9]*) .*)\n(?P<details>( ( |[0-9])*\| .*\n)+)?",
-                logbuffer,
-                self.outdir)
-
-            report.add_regex_errors_with_file(
-                "Compiler Warning",
-                r"^(?P<location>(?P<file>.*?):(?P<line>[0-9]+):(?P<col>[0-9]+)): (?P<message>([^ ]*? )?warning: .*)\n(?P<details>( ( |[0-9])*\| .*\n)+)?",
-                logbuffer,
-                self.outdir)
-
-            # MSVC compiler errors
-            report.add_regex_errors_with_file(
-                "Compiler Error",
-                r"^(?P<location>(?P<file>.*?)\((?P<line>[0-9]+)\)): (?P<message>(fatal )?error( C[0-9]*?): .*)",
-                logbuffer,
-                self.outdir)
-
-            # Binutils/MSVC linker errors
-            report.add_regex_errors(
-                "Linker Error",
-                r"^(?P<location>(?P<file>.*?)(:.*?)?)( )?: (?P<message>(( fatal)?error LNK|warning LNK|undefined reference|multiple definition).*)",
-                logbuffer)
-
-            # LLVM linker errors
-            report.add_regex_errors(
-                "Linker Error",
-                r"^(?P<location>(.*?)ld(\.lld)?): (error|warning): (?P<message>.*)",
-                logbuffer)
+        Diagnostics are taken from a parser that has been fed with the
+        output of the build while it was running, or by parsing a
+        complete log buffer.
+        """
+        if parser is None:
+            parser = self._diagnostic_parser()
+        if logbuffer is not None:
+            parser.feed(logbuffer.splitlines())
 
+        with self.report() as report, utils.ignore_exception():
+            parser.report(report)
             return report
 
     def _first_reported_error(self, report):
@@ -2759,3 +3940,78 @@ class CXXExecutable(CXXProject):
 
 
 CXXExecutable.__doc__ += CXXProject.__doc__
+
+
+class CXXPrecompiledHeader(CXXProject):
+    """
+    Builds a precompiled header shared by other tasks.
+
+    Only implemented for GCC/Clang toolchains.
+
+    The header to precompile must be listed in ``sources`` with a
+    ``.pch`` extension. It is compiled with the compiler and flags of
+    the task and published together with the compiled header. Instead
+    of compiling the same header themselves, tasks that require the
+    artifact include the header as usual, e.g. ``#include "prelude.pch"``.
+
+    The compiled header is used by consumers compiling C++ sources
+    with the same compiler and with the same language standard,
+    optimization level, flags and macros. Otherwise, consumers fall back
+    to compiling the published header with their own flags. Headers
+    included by the precompiled header must then be available to the
+    consumers, e.g. through the include paths of other requirements.
+
+    Example:
+
+      .. code-block:: python
+
+        class Prelude(CXXPrecompiledHeader):
+            sources = ["include/prelude.pch"]
+            cxxstd = 17
+
+        class Lib(CXXLibrary):
+            requires = ["prelude"]
+            sources = ["src/*.cpp"]
+            cxxstd = 17
+
+    """
+
+    abstract = True
+
+    publishdir = "pch/"
+    """ The artifact path where the headers are published. """
+
+    shared = False
+    """ Compile the header for use in shared libraries. """
+
+    def __init__(self, *args, **kwargs):
+        super(CXXPrecompiledHeader, self).__init__(*args, **kwargs)
+        self.influence.append(TaskAttributeInfluence("shared"))
+
+    def publish(self, artifact, tools):
+        """
+        Publishes the precompiled header.
+
+        The header and the compiled header are collected into a directory
+        as specified by the ``publishdir`` class attribute. Include path
+        metadata for this directory is automatically exported, together
+        with the name of the header and the identity of the compiler and
+        flags used to compile it.
+        """
+        super().publish(artifact, tools)
+
+        raise_task_error_if(
+            self._pch_out is None or not self._pch_key, self,
+            "no precompiled header found, one header with a '{0}' extension must be listed as source",
+            GNUPCHVariables.pch_ext)
+
+        header = [source for source in self.sources if source.endswith(GNUPCHVariables.pch_ext)][0]
+        artifact.collect(header, self.publishdir, flatten=True)
+        with tools.cwd(tools.wsroot):
+            artifact.collect(self._pch_out, self.publishdir, flatten=True)
+        artifact.cxxinfo.incpaths.append(self.publishdir)
+        artifact.cxxinfo.pch = fs.path.join(self.publishdir, fs.path.basename(header))
+        artifact.cxxinfo.pchkey = self._pch_key
+
+
+CXXPrecompiledHeader.__doc__ += CXXProject.__doc__
@@ -0,0 +1,481 @@
+"""
+Object cache for C/C++ compilations.
+
+The module is executed by Ninja as a wrapper around GNU compiler
+command lines and must therefore only depend on the standard library.
+
+Objects are stored in two steps, similar to ccache's direct mode:
+
+ - A manifest is keyed by the compiler command line, the toolchain
+   identity and the hash of the source file. It lists the header sets,
+   with hashes, that the source has been compiled with, as recorded in
+   the depfiles written by the compiler. Relative paths are resolved
+   from the working directory, which is the workspace root, so objects
+   are shared between workspaces at different locations. The working
+   directory is only part of the key when it is embedded in debug
+   information, i.e. with ``-g`` but without a prefix map option.
+
+ - Objects are keyed by the manifest key and the hashes of all headers.
+   Together with the object, the depfile and the compiler output are
+   stored so that they can be restored on a hit.
+
+Compilations whose command lines don't include ``-c <source>``,
+``-o <object>`` and ``-MF <depfile>``, or that produce additional
+outputs such as coverage notes, are not cached.
+
+The size of stored objects is appended to a size file per key prefix.
+The files are summed to decide whether the cache must be pruned, which
+avoids a scan of all objects after every build. Pruning replaces the
+files with the actual sizes found.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+
+# Bump to invalidate all cached objects
+VERSION = "1"
+
+# Environment variables that influence compiler output
+ENVIRONMENT = [
+    "COMPILER_PATH",
+    "CPATH",
+    "CPLUS_INCLUDE_PATH",
+    "C_INCLUDE_PATH",
+    "GCC_EXEC_PREFIX",
+    "SOURCE_DATE_EPOCH",
+]
+
+# Options producing outputs that are not cached
+UNCACHEABLE = (
+    "--coverage",
+    "-fdump-",
+    "-fprofile-arcs",
+    "-fprofile-generate",
+    "-ftest-coverage",
+    "-gsplit-dwarf",
+    "-save-temps",
+)
+
+# Maximum number of header sets remembered per manifest
+MANIFEST_ENTRIES = 16
+
+# Options mapping the working directory in debug information
+PREFIX_MAP = (
+    "-fdebug-prefix-map=",
+    "-ffile-prefix-map=",
+)
+
+
+def hash_file(path):
+    h = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def hash_strings(strings):
+    h = hashlib.blake2b(digest_size=20)
+    for string in strings:
+        h.update(string.encode())
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def parse_command(command):
+    """ Returns the source, object and depfile of a compiler command line, or None. """
+    if any(arg.startswith(UNCACHEABLE) for arg in command):
+        return None
+
+    source = output = depfile = None
+    for arg, value in zip(command, command[1:]):
+        if arg == "-c" and not value.startswith("-"):
+            source = value
+        elif arg == "-o":
+            output = value
+        elif arg == "-MF":
+            depfile = value
+
+    if not source or not output or not depfile:
+        return None
+    return source, output, depfile
+
+
+def debug_dir(command):
+    """ Returns the working directory if it is embedded in debug information, otherwise an empty string. """
+    if any(arg.startswith(PREFIX_MAP) for arg in command):
+        return ""
+    if any(arg.startswith("-g") and arg != "-g0" for arg in command):
+        return os.getcwd()
+    return ""
+
+
+def parse_depfile(data):
+    """ Returns the prerequisites listed in a Makefile style depfile. """
+    prerequisites = []
+    data = data.replace("\\\n", "")
+    for line in data.splitlines():
+        line = line.split(":", 1)
+        if len(line) <= 1:
+            continue
+        inputs = line[1].replace("\\ ", "\x00")
+        prerequisites.extend(dep.replace("\x00", " ") for dep in inputs.split())
+    return prerequisites
+
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, temp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(temp, path)
+    except Exception:
+        os.unlink(temp)
+        raise
+
+
+def _append(path, line):
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, (line + "\n").encode())
+    finally:
+        os.close(fd)
+
+
+def _scandir(path):
+    try:
+        return [entry for entry in os.scandir(path) if not entry.name.startswith(".tmp")]
+    except OSError:
+        return []
+
+
+def _copy_atomic(src, dst):
+    dirname = os.path.dirname(dst) or "."
+    os.makedirs(dirname, exist_ok=True)
+    fd, temp = tempfile.mkstemp(dir=dirname, prefix=".tmp")
+    os.close(fd)
+    try:
+        shutil.copyfile(src, temp)
+        os.replace(temp, dst)
+    except Exception:
+        os.unlink(temp)
+        raise
+
+
+class ObjectCache(object):
+    """ A directory of compiled objects. """
+
+    def __init__(self, path):
+        self.path = path
+
+    def _manifest_path(self, key):
+        return os.path.join(self.path, "manifests", key[:2], key)
+
+    def _object_path(self, key):
+        return os.path.join(self.path, "objects", key[:2], key)
+
+    def _size_path(self, prefix):
+        return os.path.join(self.path, "sizes", prefix)
+
+    def _add_size(self, key, size):
+        path = self._size_path(key[:2])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _append(path, str(size))
+
+    def size(self):
+        """ Returns the size of the stored objects, as recorded in the size files. """
+        size = 0
+        for entry in _scandir(os.path.join(self.path, "sizes")):
+            try:
+                with open(entry.path) as f:
+                    size += sum(int(line) for line in f if line.strip())
+            except (OSError, ValueError):
+                continue
+        return size
+
+    def read_manifest(self, key):
+        try:
+            with open(self._manifest_path(key)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return []
+
+    def add_manifest_entry(self, key, entry):
+        entries = [e for e in self.read_manifest(key) if e["object"] != entry["object"]]
+        entries = [entry] + entries[:MANIFEST_ENTRIES - 1]
+        _write_atomic(self._manifest_path(key), json.dumps(entries).encode())
+
+    def lookup(self, key, hasher):
+        """
+        Find an object compiled with the current contents of its headers.
+
+        Returns the manifest entry of the object or None.
+        """
+        for entry in self.read_manifest(key):
+            if all(hasher(path) == digest for path, digest in entry["headers"]):
+                if os.path.isdir(self._object_path(entry["object"])):
+                    return entry
+        return None
+
+    def restore(self, objkey, output, depfile):
+        """ Copy a cached object to its destination. Returns the object info. """
+        path = self._object_path(objkey)
+        with open(os.path.join(path, "info")) as f:
+            info = json.load(f)
+        _copy_atomic(os.path.join(path, "object"), output)
+        _copy_atomic(os.path.join(path, "depfile"), depfile)
+        with open(os.path.join(path, "stdout"), "rb") as f:
+            info["stdout"] = f.read()
+        with open(os.path.join(path, "stderr"), "rb") as f:
+            info["stderr"] = f.read()
+
+        # The modification time is used to evict the least recently used objects
+        os.utime(path)
+        return info
+
+    def store(self, objkey, output, depfile, stdout, stderr, duration):
+        """ Store a compiled object. """
+        path = self._object_path(objkey)
+        if os.path.isdir(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp = tempfile.mkdtemp(dir=os.path.dirname(path), prefix=".tmp")
+        try:
+            shutil.copyfile(output, os.path.join(temp, "object"))
+            shutil.copyfile(depfile, os.path.join(temp, "depfile"))
+            with open(os.path.join(temp, "stdout"), "wb") as f:
+                f.write(stdout)
+            with open(os.path.join(temp, "stderr"), "wb") as f:
+                f.write(stderr)
+            with open(os.path.join(temp, "info"), "w") as f:
+                json.dump({"duration": duration}, f)
+            size = sum(entry.stat().st_size for entry in os.scandir(temp))
+            os.rename(temp, path)
+            self._add_size(objkey, size)
+        except OSError:
+            # Already stored by a concurrent compilation
+            shutil.rmtree(temp, ignore_errors=True)
+
+    def copy(self, objkey, cache):
+        """ Copy a cached object into another cache. """
+        path = cache._object_path(objkey)
+        if os.path.isdir(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp = tempfile.mkdtemp(dir=os.path.dirname(path), prefix=".tmp")
+        try:
+            shutil.rmtree(temp)
+            shutil.copytree(self._object_path(objkey), temp)
+            size = sum(entry.stat().st_size for entry in os.scandir(temp))
+            os.rename(temp, path)
+            cache._add_size(objkey, size)
+        except OSError:
+            shutil.rmtree(temp, ignore_errors=True)
+
+    def export(self, objects, cache):
+        """ Copy objects, given as manifest and object key pairs, and their manifest entries into another cache. """
+        for key, objkey in objects:
+            for entry in self.read_manifest(key):
+                if entry["object"] == objkey and os.path.isdir(self._object_path(objkey)):
+                    self.copy(objkey, cache)
+                    cache.add_manifest_entry(key, entry)
+                    break
+
+    def merge(self, cache):
+        """ Copy all objects and manifest entries of another cache into this cache. """
+        for prefix in _scandir(os.path.join(cache.path, "manifests")):
+            for manifest in _scandir(prefix.path):
+                for entry in reversed(cache.read_manifest(manifest.name)):
+                    if os.path.isdir(cache._object_path(entry["object"])):
+                        cache.copy(entry["object"], self)
+                        self.add_manifest_entry(manifest.name, entry)
+
+    def prune(self, max_size):
+        """
+        Remove the least recently used objects until the cache fits within max_size.
+
+        The objects are only scanned if the recorded size exceeds max_size.
+        """
+        if self.size() <= max_size:
+            return 0
+
+        objects = []
+        sizes = {}
+        for prefix in _scandir(os.path.join(self.path, "objects")):
+            sizes[prefix.name] = 0
+            for entry in _scandir(prefix.path):
+                entry_size = sum(f.stat().st_size for f in os.scandir(entry.path))
+                objects.append((entry.stat().st_mtime, entry_size, prefix.name, entry.path))
+                sizes[prefix.name] += entry_size
+
+        size = sum(sizes.values())
+        evicted = 0
+        for _, entry_size, prefix, path in sorted(objects):
+            if size <= max_size:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            size -= entry_size
+            sizes[prefix] -= entry_size
+            evicted += 1
+
+        # Replace the recorded sizes with the actual sizes
+        for prefix, size in sizes.items():
+            _write_atomic(self._size_path(prefix), (str(size) + "\n").encode())
+        return evicted
+
+
+def read_stats(path):
+    """
+    Read statistics recorded by compilations.
+
+    Returns a tuple with the number of hits, the number of misses and
+    the total compilation time saved in seconds.
+    """
+    hits = misses = saved = 0
+    try:
+        with open(path) as f:
+            for line in f:
+                fields = line.split()
+                if fields[:1] == ["hit"]:
+                    hits += 1
+                    saved += float(fields[1])
+                elif fields[:1] == ["miss"]:
+                    misses += 1
+    except OSError:
+        pass
+    return hits, misses, saved
+
+
+def read_objects(path):
+    """
+    Read the objects used by compilations, hits as well as misses.
+
+    Returns a list of manifest and object key pairs.
+    """
+    objects = []
+    try:
+        with open(path) as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) == 4:
+                    objects.append((fields[2], fields[3]))
+    except OSError:
+        pass
+    return objects
+
+
+def _record(path, result, saved=0.0, key=None, objkey=None):
+    if not path:
+        return
+    line = "{} {:.3f}".format(result, saved)
+    if key and objkey:
+        line += " {} {}".format(key, objkey)
+    _append(path, line)
+
+
+def _compile(command):
+    start = time.monotonic()
+    p = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    return p.returncode, p.stdout, p.stderr, time.monotonic() - start
+
+
+def _output(stdout, stderr):
+    sys.stdout.buffer.write(stdout)
+    sys.stdout.buffer.flush()
+    sys.stderr.buffer.write(stderr)
+    sys.stderr.buffer.flush()
+
+
+def run(caches, toolchain, command, stats=None):
+    """ Run a compiler command line, consulting the caches first. Returns the exit status. """
+    files = parse_command(command)
+    if files is None:
+        return subprocess.call(command)
+    source, output, depfile = files
+    start = time.monotonic()
+
+    hashes = {}
+
+    def hasher(path):
+        if path not in hashes:
+            try:
+                hashes[path] = hash_file(path)
+            except OSError:
+                hashes[path] = None
+        return hashes[path]
+
+    try:
+        environ = [os.environ.get(name, "") for name in ENVIRONMENT]
+        key = hash_strings([VERSION, toolchain, debug_dir(command)] + command + environ + [hash_file(source)])
+
+        for cache in caches:
+            entry = cache.lookup(key, hasher)
+            if entry is None:
+                continue
+            info = cache.restore(entry["object"], output, depfile)
+            for other in caches:
+                if other is cache:
+                    break
+                # Found in a shared cache, keep a local copy
+                cache.copy(entry["object"], other)
+                other.add_manifest_entry(key, entry)
+            _output(info["stdout"], info["stderr"])
+            _record(stats, "hit", max(0.0, info["duration"] - (time.monotonic() - start)), key, entry["object"])
+            return 0
+    except (OSError, ValueError, KeyError):
+        key = None
+
+    returncode, stdout, stderr, duration = _compile(command)
+    _output(stdout, stderr)
+    if returncode != 0 or key is None:
+        return returncode
+
+    objkey = None
+    try:
+        with open(depfile) as f:
+            headers = [path for path in parse_depfile(f.read()) if path != source]
+        headers = [[path, hash_file(path)] for path in headers]
+        objkey = hash_strings([key] + [path + ":" + digest for path, digest in headers])
+        for cache in caches:
+            cache.store(objkey, output, depfile, stdout, stderr, duration)
+            cache.add_manifest_entry(key, {"headers": headers, "object": objkey})
+    except (OSError, ValueError):
+        objkey = None
+
+    _record(stats, "miss", key=key, objkey=objkey)
+    return returncode
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compiler wrapper consulting an object cache.")
+    parser.add_argument("--cache", required=True, help="Path to the local object cache.")
+    parser.add_argument("--shared", help="Path to a shared object cache.")
+    parser.add_argument("--toolchain", default="", help="Identity of the toolchain.")
+    parser.add_argument("--stats", help="File to which statistics are appended.")
+    parser.add_argument("command", nargs=argparse.REMAINDER, help="Compiler command line.")
+    args = parser.parse_args()
+
+    command = args.command
+    if command[:1] == ["--"]:
+        command = command[1:]
+    if not command:
+        parser.error("no compiler command line given")
+
+    caches = [ObjectCache(args.cache)]
+    if args.shared:
+        caches.append(ObjectCache(args.shared))
+
+    sys.exit(run(caches, args.toolchain, command, args.stats))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Compiler wrapper forwarding compilations to the Jolt task running Ninja.
+
+The module is executed by Ninja as a wrapper around compiler command
+lines and must therefore only depend on the standard library.
+
+The task listens for compilation requests at the address found in the
+JOLT_REMOTE_COMPILE_ADDRESS environment variable. It turns them into
+actions executed by remote workers and writes the resulting object
+files. The command is run locally if the task is unreachable or if it
+declines the request, e.g. because the command can't be executed
+remotely.
+"""
+
+import os
+import subprocess
+import sys
+from multiprocessing.connection import Client
+
+
+def request(command):
+    """ Requests remote compilation. Returns the result or None. """
+    address = os.environ.get("JOLT_REMOTE_COMPILE_ADDRESS")
+    authkey = os.environ.get("JOLT_REMOTE_COMPILE_AUTHKEY")
+    if not address or not authkey:
+        return None
+    try:
+        with Client(address, authkey=bytes.fromhex(authkey)) as conn:
+            conn.send({"command": command, "cwd": os.getcwd()})
+            return conn.recv()
+    except (OSError, EOFError, ValueError):
+        return None
+
+
+def main():
+    command = sys.argv[1:]
+    if command[:1] == ["--"]:
+        command = command[1:]
+    if not command:
+        sys.exit("usage: remote_compile_main.py -- <compiler command line>")
+
+    result = request(command)
+    if result is None:
+        sys.exit(subprocess.call(command))
+
+    sys.stdout.buffer.write(result["stdout"])
+    sys.stdout.buffer.flush()
+    sys.stderr.buffer.write(result["stderr"])
+    sys.stderr.buffer.flush()
+    sys.exit(result["returncode"])
+
+
+if __name__ == "__main__":
+    main()
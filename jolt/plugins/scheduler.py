@@ -1,7 +1,11 @@
+import base64
 import click
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import ExitStack
 import grpc
+import json
 import queue
-from threading import Lock
+from threading import Lock, Thread, current_thread
 import time
 
 from google.protobuf.timestamp_pb2 import Timestamp
@@ -10,6 +14,7 @@ from jolt import cache
 from jolt import cli
 from jolt import colors
 from jolt import config
+from jolt import filesystem as fs
 from jolt import hooks
 from jolt import loader
 from jolt import log
@@ -19,8 +24,10 @@ from jolt import utils
 from jolt.error import LoggedJoltError, JoltError, raise_error, raise_error_if, raise_task_error, raise_task_error_if
 from jolt.graph import GraphBuilder
 from jolt.scheduler import ExecutorRegistry, JoltEnvironment, NetworkExecutor, NetworkExecutorFactory, WorkerStrategy
-from jolt.tasks import TaskRegistry
+from jolt.tasks import Parameter, Task, TaskRegistry
+from jolt.tools import Tools
 from jolt.options import JoltOptions
+from jolt.plugins import ninja
 from jolt.plugins import selfdeploy
 from jolt.plugins.remote_execution import log_pb2 as log_pb
 from jolt.plugins.remote_execution import log_pb2_grpc as log_grpc
@@ -117,11 +124,16 @@ class Queue(object):
     def __init__(self):
         self.q = queue.Queue()
 
+    def __iter__(self):
+        return self
+
     def __next__(self):
         """ Get the next item from the queue. """
         data = self.q.get()
         if data is None:
             raise StopIteration
+        if isinstance(data, Exception):
+            raise data
         return data
 
     def push(self, item):
@@ -132,6 +144,85 @@ class Queue(object):
         self.q.put(None)
 
 
+class TaskMultiplexer(object):
+    """
+    Multiplexes task executions on a single scheduler stream.
+
+    Task requests are sent to the scheduler on one bidirectional
+    ScheduleTasks stream per session. A single reactor thread receives
+    updates for all tasks and passes them to the callback registered
+    for the task, by task identity. No thread waits for the updates of
+    an individual task.
+
+    If the stream fails, the error is passed to the callbacks of all
+    tasks still waiting for updates and the multiplexer is closed.
+    """
+
+    # Statuses after which the scheduler sends no more updates for a task.
+    completed = [
+        common_pb.TaskStatus.TASK_FAILED,
+        common_pb.TaskStatus.TASK_PASSED,
+        common_pb.TaskStatus.TASK_UNSTABLE,
+        common_pb.TaskStatus.TASK_DOWNLOADED,
+        common_pb.TaskStatus.TASK_UPLOADED,
+        common_pb.TaskStatus.TASK_SKIPPED,
+        common_pb.TaskStatus.TASK_CANCELLED,
+        common_pb.TaskStatus.TASK_ERROR,
+    ]
+
+    def __init__(self, stub):
+        self.lock = Lock()
+        self.closed = False
+        self.requests = Queue()
+        self.tasks = {}
+        self.response = stub.ScheduleTasks(self.requests)
+        self.thread = Thread(target=self._dispatch, name="TaskMultiplexer", daemon=True)
+        self.thread.start()
+
+    def _dispatch(self):
+        """ Dispatch updates to the callbacks of their tasks. """
+        error = None
+        try:
+            for update in self.response:
+                completed = update.status in self.completed
+                with self.lock:
+                    if completed:
+                        callback = self.tasks.pop(update.request.task_id, None)
+                    else:
+                        callback = self.tasks.get(update.request.task_id)
+                if callback is not None:
+                    callback(update, None)
+        except (grpc.RpcError, grpc._channel._MultiThreadedRendezvous) as rpc_error:
+            error = rpc_error
+        finally:
+            with self.lock:
+                self.closed = True
+                tasks, self.tasks = self.tasks, {}
+            self.requests.close()
+            if error is None:
+                error = JoltError("Task stream to scheduler was closed")
+            for callback in tasks.values():
+                callback(None, error)
+
+    def schedule(self, request, callback):
+        """
+        Schedule a task for execution.
+
+        The callback is called by the reactor thread with each update of
+        the task, or with an exception if the stream fails, as
+        ``callback(update, error)``. It must not block.
+        """
+        with self.lock:
+            raise_error_if(self.closed, "Task stream to scheduler is closed")
+            self.tasks[request.task_id] = callback
+        self.requests.push(request)
+
+    def close(self):
+        """ Close the stream. Tasks waiting for updates are cancelled. """
+        self.response.cancel()
+        self.thread.join()
+
+
 class RemoteExecutor(NetworkExecutor):
     """
     Executor for remotely executed tasks.
@@ -149,8 +240,16 @@ class RemoteExecutor(NetworkExecutor):
     cache. The executor will attempt download session artifacts regardless of the
     task status. No error is raised if the download fails.
 
+    Only artifacts needed locally are downloaded, i.e. artifacts of goal tasks
+    and of tasks consumed by locally executed tasks. Session artifacts of failed
+    tasks are also downloaded for post-mortem analysis. The artifacts of a task
+    and its extensions are downloaded as a batch by the session transfer pool.
+
     """
 
+    # Delays between attempts to schedule a task on a multiplexed stream
+    retry_backoff = [1, 4, 10, 15, 20, 25, 35, 40]
+
     def __init__(self, factory, session, task):
         self.factory = factory
         self.session = session
@@ -173,39 +272,71 @@ class RemoteExecutor(NetworkExecutor):
         """
         self.session.cancel()
 
+    def download_artifacts(self, artifacts):
+        """
+        Download artifacts as a batch.
+
+        The artifacts are given as a list of (task, artifact) tuples.
+        Returns a list of tasks and artifacts that failed to download.
+        """
+        futures = [
+            (task, artifact, self.session.transfers.submit(task.cache.download, artifact))
+            for task, artifact in artifacts
+        ]
+        return [(task, artifact) for task, artifact, future in futures if not future.result()]
+
     def download_persistent_artifacts(self, task):
-        """ Download persistent artifacts from the cache. """
+        """ Download persistent artifacts needed locally from the cache. """
 
-        for extension in task.extensions:
-            self.download_persistent_artifacts(extension)
-        if not task.has_artifact():
-            return
         if not task.cache.download_enabled():
             return
-        if not task.is_downloadable():
-            return
-        raise_task_error_if(
-            not task.download(persistent_only=True), task,
-            "Failed to download artifact")
+
+        artifacts = []
+        skipped = 0
+        for extension in [task] + task.extensions:
+            if not extension.has_artifact():
+                continue
+            if not extension.is_downloadable():
+                continue
+            persistent = [artifact for artifact in extension.artifacts if not artifact.is_session()]
+            if self.session.is_needed_locally(extension):
+                artifacts.extend((extension, artifact) for artifact in persistent)
+            else:
+                skipped += len(persistent)
+
+        if skipped:
+            task.verbose("Skipped download of {} artifact(s) not needed locally", skipped)
+
+        for failed, _ in self.download_artifacts(artifacts):
+            raise_task_error(failed, "Failed to download artifact")
 
     def download_session_artifacts(self, task):
         """ Download session artifacts from the cache. """
 
-        for extension in task.extensions:
-            self.download_session_artifacts(extension)
-        if not task.has_artifact():
-            return
         if not task.cache.download_session_enabled():
             return
-        if not task.is_downloadable():
-            return
-        if not task.download(session_only=True):
-            task.warning("Failed to download session artifact")
-        if not task.is_resource():
-            # Tasks also download session artifacts of consumed resources
-            for resource in filter(lambda task: task.is_resource() and not task.is_workspace_resource(), task.children):
-                if not resource.is_available_locally(persistent_only=False):
-                    self.download_session_artifacts(resource)
+
+        def collect(task):
+            for extension in task.extensions:
+                yield from collect(extension)
+            if not task.has_artifact():
+                return
+            if not task.is_downloadable():
+                return
+            failed = task.status() in [common_pb.TaskStatus.TASK_FAILED, common_pb.TaskStatus.TASK_UNSTABLE]
+            if not failed and not self.session.is_needed_locally(task):
+                return
+            for artifact in task.artifacts:
+                if artifact.is_session():
+                    yield task, artifact
+            if not task.is_resource():
+                # Tasks also download session artifacts of consumed resources
+                for resource in filter(lambda task: task.is_resource() and not task.is_workspace_resource(), task.children):
+                    if not resource.is_available_locally(persistent_only=False):
+                        yield from collect(resource)
+
+        for failed, _ in self.download_artifacts(list(collect(task))):
+            failed.warning("Failed to download session artifact")
 
     def download_log(self, task):
         """ Download log and transfer lines into local logging system. """
@@ -229,6 +360,8 @@ class RemoteExecutor(NetworkExecutor):
         """ Run the task. """
         if self.is_aborted():
             return
+        if self.session.multiplex:
+            return self.run_multiplexed(env)
         try:
             with hooks.task_run([self.task] + self.task.extensions), self.task.run_resources():
                 try:
@@ -246,25 +379,57 @@ class RemoteExecutor(NetworkExecutor):
         """ Initialize the build session and schedule the task. """
 
         try:
-            self.session.make_build_request()
-
-            self.task.queued(remote=True)
-            for extension in self.task.extensions:
-                extension.queued(remote=True)
-
-            request = scheduler_pb.TaskRequest(
-                build_id=self.session.build_id,
-                task_id=self.task.identity,
-            )
-            response = self.session.exec.ScheduleTask(request)
+            request = self.make_task_request()
+            response = self.session.schedule_task(request)
 
             self.update_logstash(self.task)
             self.run_task(env, response)
-            self.download_persistent_artifacts(self.task)
+            self.finish_task()
 
-            self.task.finished_execution(remote=True)
-            for extension in self.task.extensions:
-                extension.finished_execution(remote=True)
+        except Exception as e:
+            self.handle_error(e)
+
+    def make_task_request(self):
+        """
+        Register the build with the scheduler and mark the task as queued.
+
+        Returns the request scheduling the task.
+        """
+        # Dependencies uploaded in the background must be available to workers
+        raise_task_error_if(
+            not self.task.wait_for_dependency_uploads(), self.task,
+            "Failed to upload dependency artifacts")
+
+        self.session.make_build_request()
+
+        self.task.queued(remote=True)
+        for extension in self.task.extensions:
+            extension.queued(remote=True)
+
+        return scheduler_pb.TaskRequest(
+            build_id=self.session.build_id,
+            task_id=self.task.identity,
+        )
+
+    def finish_task(self):
+        """ Download artifacts and mark the task as finished. """
+        self.download_persistent_artifacts(self.task)
+
+        self.task.finished_execution(remote=True)
+        for extension in self.task.extensions:
+            extension.finished_execution(remote=True)
+
+    def handle_error(self, error):
+        """
+        Handle an error raised while the task was scheduled or executed.
+
+        Returns if the error is to be ignored. Otherwise, the task is
+        marked as failed and the error is raised. Scheduler errors
+        which may be resolved by scheduling the task again are raised
+        after the build request has been cleared.
+        """
+        try:
+            raise error
 
         except TaskCancelledException:
             pass
@@ -299,98 +464,231 @@ class RemoteExecutor(NetworkExecutor):
 
             raise e
 
+    def run_multiplexed(self, env):
+        """
+        Run the task on the multiplexed task stream of the session.
+
+        The calling pool thread only acquires resources and submits the
+        task. Updates are then handled by the reactor thread of the
+        multiplexer. Once the task has completed, the task is finished
+        by a pool thread. Log records of all these threads are routed
+        to a log context of the task.
+
+        Returns a future which is done when the task is complete.
+        """
+        self.future = Future()
+        self.logcontext = log.LogContext()
+        self.exitstack = ExitStack()
+        self.attempt = 0
+        self.call_in_context(self.start_multiplexed)
+        return self.future
+
+    def call_in_context(self, func, *args):
+        """ Call a function, logging on behalf of the task. """
+        with log.map_thread(current_thread(), self.logcontext):
+            return func(*args)
+
+    def call_in_pool(self, func, *args):
+        """ Call a function in the factory thread pool, logging on behalf of the task. """
+        try:
+            self.factory.pool.submit(self.call_in_context, func, *args)
+        except RuntimeError:
+            # The pool has been shut down
+            self.call_in_context(func, *args)
+
+    def start_multiplexed(self):
+        """ Acquire resources and submit the task. """
+        try:
+            self.exitstack.enter_context(hooks.task_run([self.task] + self.task.extensions))
+            self.exitstack.enter_context(self.task.run_resources())
+        except Exception as e:
+            self.complete_multiplexed(e)
+            return
+        self.submit_multiplexed()
+
+    def submit_multiplexed(self):
+        """ Schedule the task on the multiplexed task stream. """
+        try:
+            request = self.make_task_request()
+            self.last_status = common_pb.TaskStatus.TASK_QUEUED
+            self.completed = False
+            self.update_logstash(self.task)
+            self.session.schedule_task_multiplexed(request, self.on_update)
+        except Exception as e:
+            self.finish_multiplexed(e)
+
+    def on_update(self, progress, error):
+        """ Handle a task update. Called by the multiplexer reactor thread. """
+        if self.completed:
+            return
+        with log.map_thread(current_thread(), self.logcontext):
+            try:
+                if error is not None:
+                    raise error
+                if not self.handle_update(progress, self.last_status):
+                    self.last_status = progress.status
+                    return
+            except Exception as e:
+                error = e
+        self.completed = True
+        self.call_in_pool(self.finish_multiplexed, error)
+
+    def finish_multiplexed(self, error=None):
+        """
+        Finish the task after its final update, or after an error.
+
+        Scheduler errors are retried by submitting the task again.
+        """
+        if error is None:
+            try:
+                self.finish_task()
+            except Exception as e:
+                error = e
+
+        if error is not None:
+            try:
+                self.handle_error(error)
+                error = None
+            except (grpc.RpcError, grpc._channel._MultiThreadedRendezvous) as rpc_error:
+                if self.attempt + 1 < len(self.retry_backoff):
+                    log.debug("Exception caught, retrying : " + str(rpc_error))
+                    time.sleep(self.retry_backoff[self.attempt])
+                    self.attempt += 1
+                    self.submit_multiplexed()
+                    return
+                try:
+                    raise_task_error(self.task, rpc_error.details(), type="Scheduler Error")
+                except Exception as e:
+                    error = e
+            except Exception as e:
+                error = e
+
+        self.complete_multiplexed(error)
+
+    def complete_multiplexed(self, error=None):
+        """ Release resources and complete the future of the task. """
+        try:
+            try:
+                if error is not None:
+                    if self.exitstack.__exit__(type(error), error, error.__traceback__):
+                        error = None
+                else:
+                    self.exitstack.close()
+            except Exception as e:
+                error = e
+            if error is not None and self.task.is_unstable:
+                error = None
+            self.download_session_artifacts(self.task)
+        except Exception as e:
+            error = error or e
+
+        if error is not None:
+            self.future.set_exception(error)
+        else:
+            self.future.set_result(None)
+
     def run_task(self, env, response):
         """ Run the task.
 
         Task updates are received from the scheduler and forwarded to the
-        logging system. The task is marked as running when the scheduler
-        responds with a task running status.
-
-        A change in task status is used to determine when the task has
-        completed. The task is marked as completed when the scheduler
-        responds with a task passed, skipped, downloaded, or uploaded status.
-        An exception is raised if the scheduler responds with a task error,
-        failed, unstable, or cancelled status.
+        logging system until the task has completed.
         """
 
         last_status = common_pb.TaskStatus.TASK_QUEUED
 
         for progress in response:
-            for line in progress.loglines:
-                log.log(
-                    log.pb_to_level(line.level),
-                    line.message,
-                    created=line.time.ToMicroseconds() / 1000000,
-                    context=line.context[:7],
-                    prefix=True)
+            if self.handle_update(progress, last_status):
+                break
+            last_status = progress.status
 
-            if progress.worker:
-                self.task.worker = progress.worker.hostname
+    def handle_update(self, progress, last_status):
+        """ Handle a task update from the scheduler.
 
-            if progress.status in [common_pb.TaskStatus.TASK_RUNNING] \
-               and progress.status != self.task.status():
-                self.task.running_execution(remote=True)
-                for extension in self.task.extensions:
-                    extension.running_execution(remote=True)
+        Log lines are forwarded to the logging system. The task is marked
+        as running when the scheduler responds with a task running status.
 
-            if progress.status in [common_pb.TaskStatus.TASK_QUEUED]:
-                if last_status in [common_pb.TaskStatus.TASK_RUNNING]:
-                    self.task.restarted_execution(remote=True)
-                    for extension in self.task.extensions:
-                        extension.restarted_execution(remote=True)
-
-            if progress.status in [
-                    common_pb.TaskStatus.TASK_PASSED,
-                    common_pb.TaskStatus.TASK_DOWNLOADED,
-                    common_pb.TaskStatus.TASK_UPLOADED,
-                    common_pb.TaskStatus.TASK_SKIPPED,
-            ]:
-                break
+        A change in task status is used to determine when the task has
+        completed. True is returned when the scheduler responds with a task
+        passed, skipped, downloaded, or uploaded status. An exception is
+        raised if the scheduler responds with a task error, failed,
+        unstable, or cancelled status. Otherwise, False is returned.
+        """
 
-            if progress.status in [common_pb.TaskStatus.TASK_CANCELLED]:
-                if last_status in [common_pb.TaskStatus.TASK_RUNNING]:
-                    self.task.failed_execution(remote=True, interrupt=True)
-                    for extension in self.task.extensions:
-                        extension.failed_execution(remote=True, interrupt=True)
-                raise TaskCancelledException()
-
-            if progress.status in [
-                    common_pb.TaskStatus.TASK_FAILED,
-                    common_pb.TaskStatus.TASK_UNSTABLE,
-            ]:
-                for error in progress.errors:
-                    with self.task.task.report() as report:
-                        report.add_error(
-                            error.type,
-                            error.location,
-                            error.message,
-                            error.details,
-                        )
-                self.task.raise_for_status()
-                raise raise_error("Remote execution failed")
-
-            if progress.status in [
-                    common_pb.TaskStatus.TASK_ERROR,
-            ]:
-                log.log(
-                    log.VERBOSE,
-                    f"Host: {progress.worker.hostname}",
-                    created=time.time(),
-                    context=self.task.identity[:7],
-                    prefix=True)
+        for line in progress.loglines:
+            log.log(
+                log.pb_to_level(line.level),
+                line.message,
+                created=line.time.ToMicroseconds() / 1000000,
+                context=line.context[:7],
+                prefix=True)
 
-                for error in progress.errors:
-                    with self.task.task.report() as report:
-                        report.add_error(
-                            error.type,
-                            error.location,
-                            error.message,
-                            error.details,
-                        )
-                self.task.raise_for_status(log_details=not self.factory.options.mute)
-                raise raise_error("Remote execution failed")
+        if progress.worker:
+            self.task.worker = progress.worker.hostname
 
-            last_status = progress.status
+        if progress.status in [common_pb.TaskStatus.TASK_RUNNING] \
+           and progress.status != self.task.status():
+            self.task.running_execution(remote=True)
+            for extension in self.task.extensions:
+                extension.running_execution(remote=True)
+
+        if progress.status in [common_pb.TaskStatus.TASK_QUEUED]:
+            if last_status in [common_pb.TaskStatus.TASK_RUNNING]:
+                self.task.restarted_execution(remote=True)
+                for extension in self.task.extensions:
+                    extension.restarted_execution(remote=True)
+
+        if progress.status in [
+                common_pb.TaskStatus.TASK_PASSED,
+                common_pb.TaskStatus.TASK_DOWNLOADED,
+                common_pb.TaskStatus.TASK_UPLOADED,
+                common_pb.TaskStatus.TASK_SKIPPED,
+        ]:
+            return True
+
+        if progress.status in [common_pb.TaskStatus.TASK_CANCELLED]:
+            if last_status in [common_pb.TaskStatus.TASK_RUNNING]:
+                self.task.failed_execution(remote=True, interrupt=True)
+                for extension in self.task.extensions:
+                    extension.failed_execution(remote=True, interrupt=True)
+            raise TaskCancelledException()
+
+        if progress.status in [
+                common_pb.TaskStatus.TASK_FAILED,
+                common_pb.TaskStatus.TASK_UNSTABLE,
+        ]:
+            for error in progress.errors:
+                with self.task.task.report() as report:
+                    report.add_error(
+                        error.type,
+                        error.location,
+                        error.message,
+                        error.details,
+                    )
+            self.task.raise_for_status()
+            raise raise_error("Remote execution failed")
+
+        if progress.status in [
+                common_pb.TaskStatus.TASK_ERROR,
+        ]:
+            log.log(
+                log.VERBOSE,
+                f"Host: {progress.worker.hostname}",
+                created=time.time(),
+                context=self.task.identity[:7],
+                prefix=True)
+
+            for error in progress.errors:
+                with self.task.task.report() as report:
+                    report.add_error(
+                        error.type,
+                        error.location,
+                        error.message,
+                        error.details,
+                    )
+            self.task.raise_for_status(log_details=not self.factory.options.mute)
+            raise raise_error("Remote execution failed")
+
+        return False
 
 
 class RemoteSession(object):
@@ -443,11 +741,34 @@ class RemoteSession(object):
         # The build environment: client, workspace, etc.
         self.buildenv = None
 
+        # Schedule all tasks on a single stream instead of one stream per task.
+        self.multiplex = config.getboolean(NAME, "multiplex", False)
+        self.multiplexer = None
+
+        # Thread pool downloading artifacts of remotely executed tasks.
+        self.transfers = ThreadPoolExecutor(
+            max_workers=config.getint(NAME, "download_threads", 4),
+            thread_name_prefix="Download")
+
+        # Tasks whose artifacts are needed locally.
+        self.needed = set()
+
     def initialize(self, graph):
         """ Initialize the session with the scheduler. """
         self.tasks = graph.tasks
         self.pruned = graph.pruned
 
+        # Artifacts are needed locally by goals and by locally executed consumers
+        for task in self.tasks:
+            if task.is_goal(with_extensions=False):
+                self.needed.add(task)
+            if task.is_local():
+                self.needed.update(task.children)
+
+    def is_needed_locally(self, task):
+        """ Returns True if the artifacts of a task are needed locally. """
+        return task in self.needed
+
     @locked
     @utils.retried.on_exception(grpc.RpcError)
     def make_build_request(self):
@@ -504,6 +825,32 @@ class RemoteSession(object):
         self.build = None
         self.build_id = None
 
+        # Tasks are scheduled on a new stream once the build is registered again
+        if self.multiplexer:
+            self.multiplexer.close()
+        self.multiplexer = None
+
+    def schedule_task(self, request):
+        """
+        Schedule a task with the scheduler.
+
+        Returns an iterator over the updates of the task.
+        """
+        return self.exec.ScheduleTask(request)
+
+    def schedule_task_multiplexed(self, request, callback):
+        """
+        Schedule a task on the task stream shared by all tasks in the session.
+
+        The callback is called with the updates of the task by the reactor
+        thread of the multiplexer, see TaskMultiplexer.schedule().
+        """
+        with self.lock:
+            if self.multiplexer is None or self.multiplexer.closed:
+                self.multiplexer = TaskMultiplexer(self.exec)
+            multiplexer = self.multiplexer
+        multiplexer.schedule(request, callback)
+
     def cancel(self):
         """ Send a cancel request to the scheduler. """
 
@@ -563,6 +910,191 @@ class RemoteExecutionFactory(NetworkExecutorFactory):
         return session.create_executor(task)
 
 
+def _compile_artifact(name, digest, tools):
+    """ Returns the session artifact of a compile action or of its result. """
+    return cache.Artifact(cache.ArtifactCache.get(), None, identity=digest, name=name, session=True, tools=tools)
+
+
+class RemoteCompile(Task):
+    """
+    Executes a compile action of a Ninja task on a worker.
+
+    The action and its inputs are downloaded from the session artifact
+    uploaded by the :class:`SchedulerCompileExecutor` of the client.
+    The result, including diagnostics of failed compilations, is
+    uploaded in another session artifact.
+    """
+
+    name = "jolt/ninja/compile"
+    action = Parameter(help="Digest of the compile action.")
+    cacheable = False
+
+    def run(self, deps, tools):
+        digest = str(self.action)
+        acache = cache.ArtifactCache.get()
+
+        artifact = _compile_artifact("ninja-action", digest, tools)
+        raise_task_error_if(
+            not acache.download(artifact, force=True), self,
+            "Compile action not found in remote cache")
+        with open(fs.path.join(artifact.path, "action.json")) as f:
+            action = ninja.CompileAction(**json.load(f))
+        action.verify_toolchain(tools)
+
+        def read_input(digest):
+            with open(fs.path.join(artifact.path, "inputs", digest), "rb") as f:
+                return f.read()
+
+        result = ninja.LocalCompileExecutor().execute(action, read_input)
+
+        artifact = _compile_artifact("ninja-result", digest, tools)
+        with acache.lock_artifact(artifact) as artifact:
+            if artifact.is_temporary():
+                with tools.tmpdir("compile") as tmp, tools.cwd(tmp):
+                    for output, content in result.outputs.items():
+                        path = fs.path.join(tmp, "outputs", output)
+                        fs.makedirs(fs.path.dirname(path))
+                        with open(path, "wb") as f:
+                            f.write(content)
+                    with open(fs.path.join(tmp, "result.json"), "w") as f:
+                        json.dump({
+                            "returncode": result.returncode,
+                            "stdout": base64.b64encode(result.stdout).decode(),
+                            "stderr": base64.b64encode(result.stderr).decode(),
+                        }, f)
+                    artifact.collect("result.json")
+                    artifact.collect("outputs")
+                acache.commit(artifact)
+        raise_task_error_if(
+            not acache.upload(artifact, force=True), self,
+            "Failed to upload compile result")
+
+
+TaskRegistry.get().add_task_class(RemoteCompile)
+
+
+@ninja.CompileExecutor.Register
+class SchedulerCompileExecutor(ninja.CompileExecutor):
+    """
+    Executes compile actions on workers of the scheduler.
+
+    The action and its inputs are uploaded to the remote cache and
+    a build of a single :class:`RemoteCompile` task is registered with
+    the scheduler. Results are downloaded from the remote cache once
+    the task has finished. Results of identical actions are reused
+    without scheduling the task again.
+    """
+
+    name = "scheduler"
+
+    # Statuses of successfully executed tasks.
+    passed = [
+        common_pb.TaskStatus.TASK_PASSED,
+        common_pb.TaskStatus.TASK_DOWNLOADED,
+        common_pb.TaskStatus.TASK_UPLOADED,
+        common_pb.TaskStatus.TASK_SKIPPED,
+    ]
+
+    def __init__(self):
+        address = config.geturi(NAME, "grpc_uri", None) or config.geturi(NAME, "uri", "tcp://scheduler.:9090")
+        raise_error_if(address.scheme not in ["tcp"], "Invalid scheme in scheduler URI config: {}", address.scheme)
+        raise_error_if(not address.netloc, "Invalid network address in scheduler URI config: {}", address.netloc)
+        self.channel = grpc.insecure_channel(address.netloc, options=grpc_keepalive_opts)
+        self.exec = scheduler_grpc.SchedulerStub(self.channel)
+        self.priority = config.getint(NAME, "priority", 0)
+        self.lock = Lock()
+        self.buildenv = None
+        self.tools = Tools()
+
+    def execute(self, action, read_input):
+        digest = utils.hashstring(json.dumps(vars(action), sort_keys=True))
+        result = _compile_artifact("ninja-result", digest, self.tools)
+        acache = result.get_cache()
+        if not acache.is_available_locally(result) and not acache.is_available_remotely(result, cache=False):
+            self.upload_action(action, digest, read_input)
+            self.run_task(digest)
+        raise_error_if(not acache.download(result, force=True), "Compile result not found in remote cache")
+
+        with open(fs.path.join(result.path, "result.json")) as f:
+            data = json.load(f)
+        outputs = {}
+        if data["returncode"] == 0:
+            for output in action.outputs:
+                with open(fs.path.join(result.path, "outputs", output), "rb") as f:
+                    outputs[output] = f.read()
+        return ninja.CompileResult(
+            data["returncode"],
+            base64.b64decode(data["stdout"]),
+            base64.b64decode(data["stderr"]),
+            outputs)
+
+    def upload_action(self, action, digest, read_input):
+        """ Uploads the action and its inputs to the remote cache. """
+        artifact = _compile_artifact("ninja-action", digest, self.tools)
+        acache = artifact.get_cache()
+        with acache.lock_artifact(artifact) as artifact:
+            if artifact.is_temporary():
+                with self.tools.tmpdir("compile") as tmp:
+                    fs.makedirs(fs.path.join(tmp, "inputs"))
+                    for input_digest in set(action.inputs.values()):
+                        with open(fs.path.join(tmp, "inputs", input_digest), "wb") as f:
+                            f.write(read_input(input_digest))
+                    with open(fs.path.join(tmp, "action.json"), "w") as f:
+                        json.dump(vars(action), f)
+                    with self.tools.cwd(tmp):
+                        artifact.collect("action.json")
+                        artifact.collect("inputs")
+                acache.commit(artifact)
+        raise_error_if(not acache.upload(artifact, force=True), "Failed to upload compile action")
+
+    def make_buildenv(self, name, digest):
+        """ Returns the build environment of a compile task. """
+        with self.lock:
+            if self.buildenv is None:
+                jolt_loader = loader.JoltLoader.get()
+                self.buildenv = common_pb.BuildEnvironment(
+                    client=selfdeploy.get_client(),
+                    parameters=config.export_params(),
+                    workspace=common_pb.Workspace(
+                        builddir=jolt_loader.build_path_rel,
+                        cachedir=config.get_cachedir(),
+                        rootdir=jolt_loader.workspace_path,
+                        name=jolt_loader.workspace_name,
+                    ),
+                    loglevel=log.get_level_pb(),
+                    config=config.export_config(),
+                )
+        buildenv = common_pb.BuildEnvironment()
+        buildenv.CopyFrom(self.buildenv)
+        buildenv.tasks[name].CopyFrom(common_pb.Task(identity=digest, instance=digest, name=name))
+        return buildenv
+
+    def run_task(self, digest):
+        """ Registers a build with the compile task and waits for it to finish. """
+        name = utils.format_task_name(RemoteCompile.name, {"action": digest})
+        request = scheduler_pb.BuildRequest(
+            environment=self.make_buildenv(name, digest),
+            priority=self.priority,
+            logstream=False,
+        )
+        build = self.exec.ScheduleBuild(request)
+        try:
+            update = build.next()
+            raise_error_if(update.status == common_pb.BuildStatus.BUILD_REJECTED, "Build rejected by scheduler")
+
+            status = None
+            request = scheduler_pb.TaskRequest(build_id=update.build_id, task_id=digest)
+            for update in self.exec.ScheduleTask(request):
+                status = update.status
+                if status in TaskMultiplexer.completed:
+                    break
+            raise_error_if(
+                status not in self.passed, "Compile task failed: {}",
+                common_pb.TaskStatus.Name(status) if status is not None else "no status")
+        finally:
+            build.cancel()
+
+
 log.verbose("[Remote] Loaded")
 
 
@@ -27,6 +27,9 @@ class DiskVolume(cache.StorageProvider):
         fs.makedirs(self._path)
         self._upload = config.getboolean(NAME, "upload", True)
         self._download = config.getboolean(NAME, "download", True)
+        self._inplace = config.getboolean(NAME, "inplace", True)
+        self._index = config.getboolean(NAME, "index", False)
+        self._index_path = fs.path.join(self._path, "index")
 
     def _get_path(self, artifact):
         return artifact.tools.expand(
@@ -35,10 +38,14 @@ class DiskVolume(cache.StorageProvider):
             name=artifact.task.name,
             file=fs.path.basename(artifact.get_archive_path()))
 
+    def _get_entry(self, artifact):
+        return "{}/{}".format(artifact.task.name, fs.path.basename(artifact.get_archive_path()))
+
     def _get_temp(self, artifact):
         return artifact.tools.expand(
             "{path}/{name}/{file}",
             path=self._path,
+            name=artifact.task.name,
             file=uuid.uuid4())
 
     @utils.retried.on_exception(StaleFileHandleError)
@@ -65,6 +72,17 @@ class DiskVolume(cache.StorageProvider):
     def download_enabled(self):
         return self._download
 
+    def download_path(self, artifact, force=False):
+        if not self._download and not force:
+            return None
+        if not self._inplace:
+            return None
+        path = self._get_path(artifact)
+        if not fs.path.exists(path):
+            return None
+        log.verbose("[VOLUME] Extracting {}", path)
+        return path
+
     def upload(self, artifact, force=False):
         if not self._upload and not force:
             return True
@@ -79,6 +97,7 @@ class DiskVolume(cache.StorageProvider):
                 fs.rename(temp, path)
             else:
                 fs.unlink(temp)
+            self._append_index(artifact)
             return True
         except OSError as e:
             if e.errno != errno.EEXIST:
@@ -99,6 +118,67 @@ class DiskVolume(cache.StorageProvider):
         log.debug("[VOLUME] {} is{} present", path, "" if avail else " not")
         return avail
 
+    def _append_index(self, artifact):
+        if not self._index:
+            return
+        try:
+            # Appended with a single write to not interleave with other clients
+            with open(self._index_path, "a") as f:
+                f.write(self._get_entry(artifact) + "\n")
+        except OSError as e:
+            log.verbose("[VOLUME] Failed to update index, errno={}", os.strerror(e.errno))
+
+    def _read_index(self):
+        if not self._index:
+            return set()
+        try:
+            with open(self._index_path) as f:
+                return set(f.read().splitlines())
+        except FileNotFoundError:
+            return set()
+        except OSError as e:
+            log.verbose("[VOLUME] Failed to read index, errno={}", os.strerror(e.errno))
+            return set()
+
+    def _list(self, name):
+        try:
+            return set(os.listdir(fs.path.join(self._path, name)))
+        except FileNotFoundError:
+            return set()
+        except OSError as e:
+            log.verbose("[VOLUME] Failed to list {}, errno={}", name, os.strerror(e.errno))
+            return set()
+
+    def availability(self, artifacts):
+        """
+        Checks the presence of artifacts in the volume.
+
+        Artifacts recorded in the index are present. The directories of
+        the tasks of other artifacts are listed once each, instead of
+        probing for every artifact separately.
+        """
+        artifacts = utils.as_list(artifacts)
+        index = self._read_index()
+        listings = {}
+        present = []
+        missing = []
+
+        for artifact in artifacts:
+            entry = self._get_entry(artifact)
+            if entry in index:
+                present.append(artifact)
+                continue
+            name, file = entry.rsplit("/", 1)
+            if name not in listings:
+                listings[name] = self._list(name)
+            if file in listings[name]:
+                present.append(artifact)
+            else:
+                missing.append(artifact)
+
+        log.debug("[VOLUME] {} of {} artifacts present", len(present), len(artifacts))
+        return present, missing
+
 
 @cache.RegisterStorage
 class DiskVolumeFactory(cache.StorageProviderFactory):
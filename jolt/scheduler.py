@@ -1,9 +1,10 @@
-from concurrent.futures import ThreadPoolExecutor, as_completed, Future
+from concurrent.futures import ThreadPoolExecutor, as_completed, Future, TimeoutError
 import copy
 from functools import wraps
 import os
 import queue
-from threading import Lock
+from threading import Lock, RLock
+import time
 
 from jolt import common_pb2 as common_pb
 from jolt import config
@@ -58,26 +59,33 @@ class TaskQueue(object):
             self.futures[future] = executor
         return future
 
-    def wait(self):
+    def wait(self, timeout=None):
         """
         Wait for any task to complete.
 
         The method waits for the next task to complete and returns the task and any
         exception that may have occurred during execution. If no task is in progress,
-        the method returns None, None.
-        """
-
-        for future in as_completed(self.futures):
-            task = self.futures[future].task
-            try:
-                future.result()
-            except Exception as error:
-                return task, error
-            finally:
-                self.duration_acc += task.duration_running or 0
-                with self.futures_lock:
-                    del self.futures[future]
-            return task, None
+        or if no task completes within the timeout, the method returns None, None.
+        """
+
+        if timeout is not None and self.empty():
+            time.sleep(timeout)
+            return None, None
+
+        try:
+            for future in as_completed(self.futures, timeout=timeout):
+                task = self.futures[future].task
+                try:
+                    future.result()
+                except Exception as error:
+                    return task, error
+                finally:
+                    self.duration_acc += task.duration_running or 0
+                    with self.futures_lock:
+                        del self.futures[future]
+                return task, None
+        except TimeoutError:
+            pass
         return None, None
 
     def abort(self):
@@ -118,6 +126,337 @@ class TaskQueue(object):
             return len(self.futures) == 0
 
 
+class ArtifactPrefetcher(object):
+    """
+    Downloads artifacts of tasks that are about to be executed.
+
+    The prefetcher looks ahead in the ready frontier of the build graph,
+    i.e. at tasks that become ready as soon as the tasks currently in
+    progress have finished. The frontier is maintained incrementally:
+    only a task and its parents are re-evaluated when the task is
+    scheduled or completed. Persistent artifacts are downloaded in the
+    background for:
+
+     - tasks whose artifacts will be downloaded instead of built, and
+     - tasks waiting to be executed locally whose requirements were
+       executed elsewhere and are missing in the local cache.
+
+    The number of concurrent downloads and the total size of prefetched
+    artifacts not yet consumed are limited. Prefetched artifacts are
+    referenced by the build process and are therefore not evicted from
+    the local cache before they are consumed.
+
+    Artifacts are consumed when their task, or a task requiring them, is
+    scheduled for execution. Prefetched artifacts that are never consumed
+    are reported as waste when the prefetcher is shut down.
+    """
+
+    def __init__(self, cache, max_workers, max_size):
+        self._cache = cache
+        self._max_workers = max_workers
+        self._max_size = max_size
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="Prefetch")
+        self._lock = RLock()
+        self._futures = {}
+        self._submitted = set()
+        self._prefetched = {}
+        self._hits = 0
+        self._hit_size = 0
+        self._frontier = None
+        self._dirty = []
+
+    def _download(self, artifact):
+        """ Download an artifact. Returns True if it was downloaded. """
+        try:
+            if self._cache.is_available_locally(artifact):
+                return False
+            if not self._cache.is_available_remotely(artifact):
+                return False
+            artifact._debug("Prefetching artifact")
+            if not self._cache.download(artifact, force=True):
+                return False
+        except Exception as e:
+            artifact._debug("Prefetch failed: {}", e)
+            return False
+        with self._lock:
+            if artifact.identity in self._futures:
+                self._prefetched[artifact.identity] = artifact.get_size()
+        return True
+
+    def _size(self):
+        with self._lock:
+            return sum(self._prefetched.values())
+
+    def _active(self):
+        with self._lock:
+            return len([future for future in self._futures.values() if not future.done()])
+
+    def _update_frontier(self, graph, in_progress):
+        """
+        Re-evaluate the frontier membership of tasks affected by
+        tasks scheduled or completed since the last call.
+        """
+        if self._frontier is None:
+            self._frontier = {}
+            self._dirty = graph.select(lambda graph, task: True)
+
+        dirty, self._dirty = self._dirty, []
+        for task in dirty:
+            if task.is_extension() or task.is_completed() or task not in graph.nodes:
+                self._frontier.pop(task, None)
+            elif task in in_progress or all(child in in_progress for child in graph.successors(task)):
+                self._frontier[task] = None
+            else:
+                self._frontier.pop(task, None)
+
+    def _candidates(self, graph, in_progress):
+        """ Yields artifacts of tasks in the ready frontier. """
+        self._update_frontier(graph, in_progress)
+
+        for task in list(self._frontier):
+            if task.is_completed():
+                continue
+
+            if task not in in_progress:
+                # Tasks downloaded instead of built
+                if task.is_downloadable() and task.is_cacheable() and self._cache.download_enabled():
+                    for extension in [task] + task.extensions:
+                        yield from extension.artifacts
+
+                if not task.is_local():
+                    continue
+
+            elif not task.is_locally_executed() or task.is_running():
+                continue
+
+            # Requirements of tasks executed locally
+            for child in task.children:
+                if child.is_completed() and child.has_artifact() and not child.is_resource():
+                    yield from child.artifacts
+
+    def prefetch(self, graph, in_progress):
+        """
+        Start downloading artifacts of tasks in the ready frontier.
+
+        :param graph: The build graph.
+        :param in_progress: Set of tasks scheduled for execution.
+        """
+        for artifact in self._candidates(graph, in_progress):
+            if artifact.is_session() or not artifact.is_cacheable():
+                continue
+            with self._lock:
+                if artifact.identity in self._submitted:
+                    continue
+                if self._active() >= self._max_workers or self._size() >= self._max_size:
+                    return
+                self._submitted.add(artifact.identity)
+                self._futures[artifact.identity] = self._pool.submit(self._download, artifact)
+
+    def consume(self, task):
+        """ Record consumption of artifacts by a task scheduled for execution. """
+        # The task and its parents may have entered the frontier
+        self._dirty.append(task)
+        self._dirty.extend(task.ancestors)
+
+        artifacts = []
+        for extension in [task] + task.extensions:
+            artifacts.extend(extension.artifacts)
+        for child in task.children:
+            artifacts.extend(child.artifacts)
+
+        with self._lock:
+            for artifact in artifacts:
+                future = self._futures.pop(artifact.identity, None)
+                if future is None:
+                    continue
+                if future.done() and not future.cancelled() and future.result():
+                    self._hits += 1
+                    self._hit_size += self._prefetched.pop(artifact.identity, 0)
+                elif not future.done():
+                    # Consumer will wait for the download in progress
+                    self._hits += 1
+
+    def completed(self, task):
+        """ Record completion of a task. Its parents may have entered the frontier. """
+        self._dirty.append(task)
+        self._dirty.extend(task.ancestors)
+
+    def shutdown(self):
+        """ Cancel downloads not yet started and report prefetch statistics. """
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            waste = len(self._prefetched)
+            if self._hits or waste:
+                log.info("Prefetch: {} hit(s) ({}), {} wasted ({})",
+                         self._hits, utils.as_human_size(self._hit_size),
+                         waste, utils.as_human_size(self._size()))
+
+
+class PresenceRefresher(object):
+    """
+    Periodically refreshes the remote presence of artifacts during a build.
+
+    The presence of artifacts in remote caches is checked once before
+    the build starts. During long builds, other builds may publish
+    artifacts of tasks that this build has not yet started. The refresher
+    re-queries the availability of the persistent artifacts of such tasks
+    in the background. Artifacts found are recorded in the presence cache
+    of the artifact cache, which makes the execution strategy download
+    the artifacts instead of building the task once it becomes ready.
+
+    The number of tasks switched from build to download and the
+    estimated CPU time saved are reported when the refresher is stopped.
+    The estimate is based on task weights, as recorded by the autoweight
+    plugin.
+    """
+
+    def __init__(self, cache, interval):
+        self._cache = cache
+        self._lock = Lock()
+        self._pending = {}
+        self._found = set()
+        self._switched = 0
+        self._saved = 0
+        self._timer = Timer(interval, self._refresh)
+
+    @staticmethod
+    def _artifacts(task):
+        artifacts = []
+        for extension in [task] + task.extensions:
+            artifacts.extend(filter(lambda a: not a.is_session(), extension.artifacts))
+        return artifacts
+
+    @staticmethod
+    def _estimate(task):
+        # Task weights are cumulated with those of their ancestors
+        return max(0, task.weight - max([a.weight for a in task.ancestors] + [0]))
+
+    def start(self, graph):
+        """
+        Start refreshing the remote presence of tasks not yet built.
+
+        :param graph: The pruned build graph.
+        """
+        if not self._cache.has_availability():
+            return
+
+        def unbuilt(graph, task):
+            if task.is_extension() or task.is_alias() or task.is_resource():
+                return False
+            if not task.is_cacheable():
+                return False
+            return not task.is_available_locally() and not task.is_available_remotely()
+
+        tasks = graph.select(unbuilt)
+        with self._lock:
+            for task in tasks:
+                self._pending[task] = self._artifacts(task)
+        if self._pending:
+            self._timer.start()
+
+    def _refresh(self):
+        with self._lock:
+            pending = dict(self._pending)
+        if not pending:
+            return
+
+        artifacts = [artifact for artifacts in pending.values() for artifact in artifacts]
+        try:
+            present, _ = self._cache.availability(artifacts)
+        except Exception as e:
+            log.debug("Presence refresh failed: {}", e)
+            return
+
+        present = set(artifact.identity for artifact in present)
+        with self._lock:
+            for task, artifacts in pending.items():
+                if task not in self._pending:
+                    continue
+                if all(artifact.identity in present for artifact in artifacts):
+                    log.verbose("Artifact of {} published remotely, will not be built", task.short_qualified_name)
+                    del self._pending[task]
+                    self._found.add(task)
+
+    def consume(self, task):
+        """ Record that a task is about to be scheduled for execution. """
+        with self._lock:
+            self._pending.pop(task, None)
+            if task in self._found:
+                self._found.discard(task)
+                self._switched += 1
+                self._saved += self._estimate(task)
+
+    def stop(self):
+        """ Stop refreshing and report the number of tasks switched to download. """
+        self._timer.cancel()
+        with self._lock:
+            if self._switched:
+                log.info("Presence refresh: {} task(s) downloaded instead of built, {:.2f} CPU-hour(s) saved",
+                         self._switched, self._saved / 3600)
+
+
+class TaskCoordinator(object):
+    """
+    Coordinates task execution with other processes sharing the local cache.
+
+    Before a task is scheduled for execution, it is claimed in the cache
+    database. A task already claimed by another process is deferred
+    instead of being scheduled, leaving the worker slot to other ready
+    tasks. Deferred tasks are reconsidered periodically. Once the other
+    process releases its claim, the task artifacts are normally present
+    in the local cache and the task is skipped. If not, for example
+    because the other process failed, the task is claimed and executed.
+
+    Claims are released when tasks complete and when the coordinator
+    is shut down. Claims of processes that terminate unexpectedly are
+    removed by other processes.
+    """
+
+    interval = 1
+
+    def __init__(self, cache):
+        self._cache = cache
+        self._claimed = set()
+        self._deferred = set()
+
+    def claim(self, task):
+        """
+        Claim a task for execution.
+
+        Returns True if the task may be scheduled for execution,
+        or False if it has been deferred.
+        """
+        if task.is_alias() or task.is_resource() or not task.is_cacheable() \
+           or task.is_available_locally():
+            self._deferred.discard(task)
+            return True
+
+        if not self._cache.claim_task(task):
+            if task not in self._deferred:
+                task.info("Execution deferred, task claimed by another process")
+                self._deferred.add(task)
+            return False
+
+        self._deferred.discard(task)
+        self._claimed.add(task)
+        return True
+
+    def release(self, task):
+        """ Release the claim of a completed task. """
+        if task in self._claimed:
+            self._claimed.discard(task)
+            self._cache.release_task(task)
+
+    def has_deferred(self):
+        """ Returns true if tasks are waiting for claims held by other processes. """
+        return len(self._deferred) > 0
+
+    def shutdown(self):
+        """ Release all claims. """
+        for task in list(self._claimed):
+            self.release(task)
+
+
 class Executor(object):
     """
     Base class for all executors.
@@ -190,6 +529,10 @@ class Executor(object):
 
         Network executors have additional requirements. See the
         NetworkExecutor class for more information.
+
+        Executors which wait for the task to complete elsewhere may
+        return a Future instead of blocking. The pool thread is then
+        released and the task is complete once the future is done.
         """
         raise NotImplementedError
 
@@ -393,7 +736,12 @@ class Uploader(Executor):
         try:
             task.started_upload()
             raise_task_error_if(
-                not task.upload(persistent_only=True),
+                not task.upload(persistent_only=True, background=True),
+                task, "Failed to upload task artifact")
+            # Queued artifacts are uploaded by the cache's upload threads.
+            # The task is not uploaded until they have finished.
+            raise_task_error_if(
+                not task.wait_for_uploads(),
                 task, "Failed to upload task artifact")
         except Exception as e:
             with task.task.report() as report:
@@ -575,14 +923,24 @@ class ExecutorFactory(object):
         self._queue.task_done()
         try:
             if not self.is_aborted():
-                item.executor.run(item.env)
-        except KeyboardInterrupt as e:
-            self._aborted = True
-            item.future.set_exception(e)
-        except Exception as e:
-            if not self.is_keep_going():
+                result = item.executor.run(item.env)
+                if isinstance(result, Future):
+                    # Execution continues without occupying a pool thread
+                    result.add_done_callback(lambda future: self._completed(item, future.exception()))
+                    return
+        except (KeyboardInterrupt, Exception) as e:
+            self._completed(item, e)
+        else:
+            self._completed(item)
+
+    def _completed(self, item, error=None):
+        if error is not None:
+            if isinstance(error, KeyboardInterrupt) or not self.is_keep_going():
                 self._aborted = True
-            item.future.set_exception(e)
+        if item.future.cancelled():
+            return
+        if error is not None:
+            item.future.set_exception(error)
         else:
             item.future.set_result(item.executor)
 
@@ -36,6 +36,7 @@ from jolt.influence import files as file_influence
 from jolt.manifest import _JoltTask
 from jolt.tools import Tools
 from jolt import colors
+from jolt import config
 
 
 class Export(object):
@@ -1430,6 +1431,57 @@ class TaskBase(object):
     cacheable = True
     """ Whether the task produces an artifact or not. """
 
+    compression_dictionary = False
+    """
+    Compress artifacts using a zstd dictionary.
+
+    The dictionary is trained from previous artifacts of the task
+    found in the local cache and is embedded in archives uploaded
+    to remote caches. Dictionaries are most effective when many
+    small, similar files are published.
+    """
+
+    compression_level = None
+    """
+    zstd compression level used when artifacts are archived for upload.
+
+    Valid values are integers in the range 1 to 22, ``"store"`` for
+    incompressible content and ``"auto"`` to select a level based
+    on a sample of the artifact content. The default is taken from
+    the ``jolt.compression_level`` configuration key.
+
+    Per-artifact levels are set with ``compression_level_<artifact>``
+    attributes.
+
+    Example:
+
+        .. code-block:: python
+
+          # Headers and other text compress well at higher levels
+          compression_level = 12
+
+          # The logs artifact only contains compressed files
+          compression_level_logs = "store"
+    """
+
+    compression_long = False
+    """
+    Enable zstd long distance matching when artifacts are archived.
+
+    Improves compression of large artifacts with redundancy far apart,
+    such as multiple copies of the same library.
+    """
+
+    compression_order = None
+    """
+    Order of files in artifact archives.
+
+    By default, files are archived in directory order. When set to
+    ``"extension"``, files are grouped by file extension which places
+    similar content close together and may improve compression.
+    Archives are reproducible in either order.
+    """
+
     expires = Immediately()
     """An expiration strategy, defining when the artifact may be evicted from the cache.
 
@@ -2644,6 +2696,17 @@ class Runner(Task):
     are multiple task requirements.
     """
 
+    jobs = 1
+    """
+    Maximum number of executables to run in parallel.
+
+    If set to 0, the number of threads returned by
+    :func:`Tools.thread_count() <jolt.Tools.thread_count>` is used.
+    Parallel executables are started in order of their durations in
+    previous runs, longest first. All executables are run even if
+    one of them fails.
+    """
+
     requires = []
     """ List of tasks packaging executables to run. """
 
@@ -2653,10 +2716,50 @@ class Runner(Task):
     timeout = None
     """ Time after which the executable will be terminated """
 
+    def _executions(self, task, executable, tools):
+        """
+        Returns a list of processes to run for an executable.
+
+        Each process is identified by a name and is run with a
+        dictionary of additional environment variables. By default,
+        each executable is run in a single process.
+        """
+        return [(task + ":" + executable, {})]
+
+    @property
+    def _durations_path(self):
+        return fs.path.join(config.get_cachedir(), "runner.json")
+
+    def _run_parallel(self, commands, tools):
+        jobs = int(self.jobs) or tools.thread_count()
+        if jobs <= 1 or len(commands) <= 1:
+            for _, command in commands:
+                command()
+            return
+
+        # Start the longest running processes first, unknown first of all
+        history = utils.fromjson(self._durations_path, ignore_errors=True)
+        durations = history.get(self.qualified_name, {})
+        commands = sorted(commands, key=lambda c: -durations.get(c[0], float("inf")))
+
+        def run(name, command):
+            ts = utils.duration()
+            command()
+            durations[name] = ts.seconds
+
+        with ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="Runner") as pool:
+            futures = [pool.submit(run, name, command) for name, command in commands]
+        history = utils.fromjson(self._durations_path, ignore_errors=True)
+        history[self.qualified_name] = durations
+        utils.tojson(self._durations_path, history, ignore_errors=True)
+
+        for future in futures:
+            future.result()
+
     def run(self, deps, tools):
         args = tools.expand(self.args)
         timeout = int(self.timeout) if self.timeout is not None else None
-        found = False
+        commands = []
 
         for task, artifact in deps.items():
             if not artifact.task.is_cacheable():
@@ -2665,16 +2768,19 @@ class Runner(Task):
                 self.verbose("No executable found in task artifact for '{}'", task)
                 continue
             with tools.cwd(artifact.path):
-                found = True
                 exe = tools.expand_path(str(artifact.strings.executable))
                 exe = [exe] + args
                 exe = " ".join(exe) if self.shell else exe
-                tools.run(exe, shell=bool(self.shell), timeout=timeout)
+                for name, env in self._executions(task, str(artifact.strings.executable), tools):
+                    with tools.environ(**env):
+                        commands.append((name, tools._prepare_run(exe, shell=bool(self.shell), timeout=timeout)))
 
         raise_task_error_if(
-            not found, self,
+            not commands, self,
             "No executable found in any requirement artifact")
 
+        self._run_parallel(commands, tools)
+
 
 class ErrorProxy(object):
     def __init__(self, error):
@@ -2764,13 +2870,26 @@ class ReportProxy(object):
             else:
                 errors_by_location[error["location"]][1].append(error["message"])
 
-        for error, msgs, details in errors_by_location.values():
+        self.add_errors_with_file(type, errors_by_location.values())
+
+    def add_errors_with_file(self, type, errors):
+        """
+        Add errors found in a log to the build report.
+
+        Each error is a tuple with a dictionary of matched groups, a list
+        of messages reported for the location and error details. Groups
+        must include location, file and line. If details are missing,
+        the referenced line of the file is used instead.
+        """
+        files = {}
+        for error, msgs, details in errors:
             message = "\n".join(utils.unique_list(msgs))
             if not details:
                 with self._task.tools.cwd(self._task.tools.wsroot):
                     try:
-                        details = self._task.tools.read_file(error["file"])
-                        details = details.splitlines()
+                        if error["file"] not in files:
+                            files[error["file"]] = self._task.tools.read_file(error["file"]).splitlines()
+                        details = files[error["file"]]
                         details = str(error["line"]) + ": " + details[int(error["line"]) - 1]
                     except Exception:
                         details = ""
@@ -10,6 +10,8 @@ import mmap
 import subprocess
 import os
 import platform
+import queue
+import selectors
 import sys
 import threading
 import time
@@ -19,37 +21,62 @@ import glob
 import multiprocessing
 import re
 import shutil
+import stat
+import struct
 import tarfile
 import zipfile
 import bz2file
 import hashlib
+import io
 try:
     from compression import zstd as zstandard
 
     class _CompressionZstdCompressor:
-        def __init__(self, threads=1):
+        def __init__(self, threads=1, level=None, long=False, dictionary=None):
             self._options = {
                 zstandard.CompressionParameter.nb_workers: threads,
             }
+            if level is not None:
+                self._options[zstandard.CompressionParameter.compression_level] = level
+            if long:
+                self._options[zstandard.CompressionParameter.enable_long_distance_matching] = 1
+                self._options[zstandard.CompressionParameter.window_log] = ZSTD_LONG_WINDOW_LOG
+            self._dict = zstandard.ZstdDict(dictionary) if dictionary else None
 
         def stream_writer(self, stream):
-            return zstandard.ZstdFile(stream, mode='w', options=self._options)
+            return zstandard.ZstdFile(stream, mode='w', options=self._options, zstd_dict=self._dict)
 
-    def ZstdCompressor(threads=1):
-        return _CompressionZstdCompressor(threads=threads)
+    def ZstdCompressor(threads=1, level=None, long=False, dictionary=None):
+        return _CompressionZstdCompressor(threads=threads, level=level, long=long, dictionary=dictionary)
 
-    def ZstdFile(stream):
-        return zstandard.ZstdFile(stream)
+    def ZstdFile(stream, dictionary=None):
+        return zstandard.ZstdFile(stream, zstd_dict=zstandard.ZstdDict(dictionary) if dictionary else None)
+
+    def ZstdTrainDictionary(samples, size):
+        return zstandard.train_dict(samples, size).dict_content
 
 except ImportError:
     import zstandard
 
-    def ZstdCompressor(threads=1):
-        return zstandard.ZstdCompressor(threads=threads)
-
-    def ZstdFile(stream):
-        return zstandard.ZstdDecompressor().stream_reader(stream)
-
+    def ZstdCompressor(threads=1, level=None, long=False, dictionary=None):
+        level = level if level is not None else 3
+        dictionary = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+        if long:
+            params = zstandard.ZstdCompressionParameters.from_level(
+                level, enable_ldm=True, window_log=ZSTD_LONG_WINDOW_LOG, threads=threads)
+            return zstandard.ZstdCompressor(dict_data=dictionary, compression_params=params)
+        return zstandard.ZstdCompressor(level=level, dict_data=dictionary, threads=threads)
+
+    def ZstdFile(stream, dictionary=None):
+        dictionary = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+        return zstandard.ZstdDecompressor(dict_data=dictionary).stream_reader(stream)
+
+    def ZstdTrainDictionary(samples, size):
+        return zstandard.train_dictionary(size, samples).as_bytes()
+
+from collections import deque
+from collections.abc import MutableMapping
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
 from psutil import NoSuchProcess, Process
 from jinja2 import Environment, FileSystemLoader
@@ -87,32 +114,271 @@ def stderr_write(line):
     sys.stderr.flush()
 
 
-class Reader(threading.Thread):
-    def __init__(self, parent, stream, output=None, logbuf=None, output_rstrip=True):
-        super(Reader, self).__init__()
-        self.output = output
-        self.output_rstrip = output_rstrip
-        self.parent = parent
+class _SinkQueue(object):
+    """
+    Output batches waiting to be passed to their sinks.
+
+    A worker pool passes the batches on one at a time, in the order
+    they were read. A slow sink therefore only delays the streams
+    sharing its queue. The streams of a subprocess share a queue so
+    that its interleaved output stays in order. Reading from a stream
+    is paused while its queue is backlogged.
+    """
+
+    backlog_max = 64
+
+    def __init__(self, pool):
+        self._pool = pool
+        self._lock = threading.Lock()
+        self._batches = deque()
+        self._paused = []
+        self._busy = False
+
+    def put(self, stream, lines):
+        with self._lock:
+            self._batches.append((stream, lines))
+            if self._busy:
+                return
+            self._busy = True
+        self._pool.submit(self._drain)
+
+    def pause(self, stream):
+        """ Returns True if reading from the stream must wait until it is resumed. """
+        with self._lock:
+            if len(self._batches) < self.backlog_max:
+                return False
+            self._paused.append(stream)
+            return True
+
+    def _drain(self):
+        while True:
+            resumed = []
+            with self._lock:
+                if not self._batches:
+                    self._busy = False
+                    return
+                stream, lines = self._batches.popleft()
+                if len(self._batches) < self.backlog_max // 2:
+                    resumed, self._paused = self._paused, []
+            for paused in resumed:
+                paused.resume()
+            stream.deliver(lines)
+
+
+class _CapturedStream(object):
+    """
+    Output stream of a subprocess.
+
+    Data read from the stream is split into lines which are passed
+    in batches to a sink function through a sink queue.
+    """
+
+    # Partial lines longer than this are passed on without waiting for a newline
+    line_max = 1 << 20
+
+    def __init__(self, stream, sink, sink_queue, rstrip=True):
         self.stream = stream
-        self.logbuf = logbuf if logbuf is not None else []
-        self.start()
+        self.fd = stream.fileno()
+        self.error = None
+        self.resume = None
+        self._sink = sink
+        self._queue = sink_queue
+        self._rstrip = rstrip
+        self._remainder = b""
+        self._done = threading.Event()
+
+    def _emit(self, data):
+        lines = data.decode(errors="ignore").split("\n")
+        last = lines.pop()
+        if self._rstrip:
+            lines = [line.rstrip() for line in lines]
+            if last:
+                lines.append(last.rstrip())
+        else:
+            lines = [line + "\n" for line in lines]
+            if last:
+                lines.append(last)
+        self._queue.put(self, lines)
+
+    def deliver(self, lines):
+        """ Passes a batch of lines to the sink. None marks the end of the stream. """
+        if lines is None:
+            self._done.set()
+            return
+        if self.error is None:
+            try:
+                self._sink(lines)
+            except Exception as e:
+                self.error = e
+
+    def feed(self, data):
+        if self._remainder:
+            data = self._remainder + data
+        end = data.rfind(b"\n") + 1
+        if end == 0 and len(data) < self.line_max:
+            self._remainder = data
+            return
+        end = end or len(data)
+        self._remainder = data[end:]
+        self._emit(data[:end])
+
+    def pause(self):
+        """ Returns True if reading must wait until resume() is called. """
+        return self._queue.pause(self)
+
+    def close(self):
+        if self._remainder:
+            self._emit(self._remainder)
+            self._remainder = b""
+        self._queue.put(self, None)
+
+    def join(self):
+        """ Waits until the stream has been read to the end and passed to the sink. """
+        self._done.wait()
+        if self.error is not None:
+            log.debug("Failed to capture output: {0}", str(self.error))
 
-    def run(self):
-        line = ""
+
+class _OutputCapture(object):
+    """
+    Captures the output of running subprocesses.
+
+    A single thread waits for output from all registered streams using
+    a selector. Output is read in large chunks and complete lines are
+    queued for the streams' sinks in batches, instead of one line at a
+    time by a thread per stream. Sinks are called by a worker pool and
+    never block the capture thread. A stream whose sink falls behind
+    is not read until the sink has caught up, leaving the subprocess
+    to block on a full pipe.
+
+    Pipes can't be selected on Windows where each stream is instead
+    read by its own thread.
+    """
+
+    chunk_size = 64 << 10
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    @staticmethod
+    def get():
+        with _OutputCapture._instance_lock:
+            # The capture thread doesn't survive a fork
+            if _OutputCapture._instance is None or _OutputCapture._instance._pid != os.getpid():
+                _OutputCapture._instance = _OutputCapture()
+            return _OutputCapture._instance
+
+    def __init__(self):
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._pending = []
+        self._pool = ThreadPoolExecutor(thread_name_prefix="Sink")
+        self._thread = None
+        if os.name != "nt":
+            self._selector = selectors.DefaultSelector()
+            self._wakeup_r, self._wakeup_w = os.pipe()
+            self._selector.register(self._wakeup_r, selectors.EVENT_READ)
+            self._thread = threading.Thread(target=self._run, name="Capture", daemon=True)
+            self._thread.start()
+
+    def queue(self):
+        """ Returns a new sink queue, to be shared by streams whose output must stay in order. """
+        return _SinkQueue(self._pool)
+
+    def add(self, stream, sink, rstrip=True, sink_queue=None):
+        """ Starts capturing a stream. Returns a handle to join. """
+        captured = _CapturedStream(stream, sink, sink_queue or self.queue(), rstrip)
+        if self._thread is None:
+            threading.Thread(target=self._read, args=(captured,), daemon=True).start()
+            return captured
+        captured.resume = lambda: self._register(captured)
+        self._register(captured)
+        return captured
+
+    def _register(self, captured):
+        with self._lock:
+            self._pending.append(captured)
+        os.write(self._wakeup_w, b"\0")
+
+    def _read(self, captured):
+        resumed = threading.Event()
+        captured.resume = resumed.set
         try:
-            with log.map_thread(self, self.parent):
-                for line in iter(self.stream.readline, b''):
-                    if self.output_rstrip:
-                        line = line.rstrip()
-                    line = line.decode(errors='ignore')
-                    if self.output:
-                        self.output(line)
-                    self.logbuf.append((self, line))
-        except Exception as e:
-            if self.output:
-                self.output("{0}", str(e))
-                self.output(line)
-            self.logbuf.append((self, line))
+            for data in iter(lambda: os.read(captured.fd, self.chunk_size), b""):
+                captured.feed(data)
+                if captured.pause():
+                    resumed.wait()
+                    resumed.clear()
+        except OSError:
+            pass
+        finally:
+            captured.close()
+
+    def _run(self):
+        while True:
+            for key, _ in self._selector.select():
+                captured = key.data
+                if captured is None:
+                    os.read(self._wakeup_r, 4096)
+                    with self._lock:
+                        pending, self._pending = self._pending, []
+                    for captured in pending:
+                        self._selector.register(captured.fd, selectors.EVENT_READ, captured)
+                    continue
+                try:
+                    data = os.read(captured.fd, self.chunk_size)
+                except OSError:
+                    data = b""
+                if data:
+                    captured.feed(data)
+                    # Resumed by the sink queue once it has caught up
+                    if captured.pause():
+                        self._selector.unregister(captured.fd)
+                else:
+                    self._selector.unregister(captured.fd)
+                    captured.close()
+
+
+def _output_lines(options, level, thread):
+    """ Returns a function writing batches of captured lines to the console or log. """
+    if not options["output"]:
+        return None
+    if not options["output_stdout" if level == log.STDOUT else "output_stderr"]:
+        return None
+    if options["output_stdio"]:
+        stream = sys.stdout if level == log.STDOUT else sys.stderr
+
+        def write(lines):
+            stream.write("".join(line + "\n" for line in lines))
+            stream.flush()
+        return write
+    return lambda lines: log.output(level, lines, thread)
+
+
+# Prefixes of stdout and stderr lines in logs of interleaved output
+_REPLAY_STDOUT = "1"
+_REPLAY_STDERR = "2"
+
+
+def _capture_output(stream, logbuf, output, rstrip, handler=None, replay=None, prefix=None, sink_queue=None):
+    def sink(lines):
+        if output:
+            output(lines)
+        logbuf.extend(lines)
+        if replay is not None:
+            replay.extend(prefix + line for line in lines)
+        if handler:
+            handler(lines)
+    return _OutputCapture.get().add(stream, sink, rstrip, sink_queue)
+
+
+def _replay_output(replay):
+    """ Writes interleaved output of a failed command, in the order it was captured. """
+    for line in replay:
+        if line.startswith(_REPLAY_STDOUT):
+            log.stdout(line[1:])
+        else:
+            log.stderr(line[1:])
 
 
 def _normalize_run_kwargs(kwargs):
@@ -130,10 +396,12 @@ def _normalize_run_kwargs(kwargs):
         "output_stdio": kwargs.get("output_stdio", False),
         "output_stdout": kwargs.get("output_stdout", True),
         "output_stderr": kwargs.get("output_stderr", True),
+        "output_handler": kwargs.get("output_handler"),
         "return_stderr": kwargs.get("return_stderr", False),
         "shell": kwargs.get("shell", True),
         "timeout": timeout if type(timeout) is int and timeout > 0 else None,
         "new_session": kwargs.get("new_session", False),
+        "spilldir": kwargs.get("spilldir"),
     }
 
 
@@ -209,18 +477,17 @@ class _PopenFile(object):
         self._stdin_closed = False
         self._finalized = False
 
-        if options["output_stderr"]:
-            stderr_func = log.stderr if not options["output_stdio"] else stderr_write
-        else:
-            stderr_func = None
+        # Output replayed in order if the command fails
+        self._replay = log.TaskLog(options["spilldir"]) if self._output_on_error else None
 
-        self._stderrlog = []
-        self._stderr = Reader(
-            threading.current_thread(),
+        self._stderrlog = log.TaskLog(options["spilldir"])
+        self._stderr = _capture_output(
             process.stderr,
-            output=stderr_func if options["output"] else None,
-            logbuf=self._stderrlog,
-            output_rstrip=options["output_rstrip"])
+            self._stderrlog,
+            _output_lines(options, log.STDERR, threading.get_ident()),
+            options["output_rstrip"],
+            replay=self._replay,
+            prefix=_REPLAY_STDERR)
 
     def _emit_stdout(self, data):
         if not self._output:
@@ -237,6 +504,8 @@ class _PopenFile(object):
         if isinstance(data, bytes):
             data = data.decode(errors='ignore')
         self._stdoutbuf.append(data)
+        if self._replay is not None:
+            self._replay.extend(_REPLAY_STDOUT + line for line in data.splitlines())
         self._emit_stdout(data)
         return data
 
@@ -278,21 +547,14 @@ class _PopenFile(object):
             remaining = self._process.stdout.read()
             self._record_stdout(remaining)
             self._stderr.join()
-            self._stderrbuf = [line for _, line in self._stderrlog]
+            self._stderrbuf = self._stderrlog.tail()
             utils.call_and_catch(self._process.stdout.close)
             utils.call_and_catch(self._process.stderr.close)
             if self._process.stdin:
                 utils.call_and_catch(self._process.stdin.close)
 
         if self._process.returncode != 0 and self._output_on_error:
-            for data in self._stdoutbuf:
-                if self._output_rstrip:
-                    for line in data.splitlines():
-                        log.stdout(line.rstrip())
-                elif data:
-                    log.stdout(data)
-            for line in self._stderrbuf:
-                log.stderr(line)
+            _replay_output(self._replay)
 
         if not raise_on_error or self._process.returncode == 0:
             return
@@ -323,29 +585,28 @@ def _run(cmd, cwd, env, *args, **kwargs):
                 env=env,
             )
 
-            if options["output_stdout"]:
-                stdout_func = log.stdout if not options["output_stdio"] else stdout_write
-            else:
-                stdout_func = None
-
-            if options["output_stderr"]:
-                stderr_func = log.stderr if not options["output_stdio"] else stderr_write
-            else:
-                stderr_func = None
-
-            logbuf = []
-            stdout = Reader(
-                threading.current_thread(),
+            stdoutbuf = []
+            stderrbuf = log.TaskLog(options["spilldir"])
+            replay = log.TaskLog(options["spilldir"]) if options["output_on_error"] else None
+            thread = threading.get_ident()
+            sink_queue = _OutputCapture.get().queue()
+            stdout = _capture_output(
                 p.stdout,
-                output=stdout_func if options["output"] else None,
-                logbuf=logbuf,
-                output_rstrip=options["output_rstrip"])
-            stderr = Reader(
-                threading.current_thread(),
+                stdoutbuf,
+                _output_lines(options, log.STDOUT, thread),
+                options["output_rstrip"],
+                options["output_handler"],
+                replay=replay,
+                prefix=_REPLAY_STDOUT,
+                sink_queue=sink_queue)
+            stderr = _capture_output(
                 p.stderr,
-                output=stderr_func if options["output"] else None,
-                logbuf=logbuf,
-                output_rstrip=options["output_rstrip"])
+                stderrbuf,
+                _output_lines(options, log.STDERR, thread),
+                options["output_rstrip"],
+                replay=replay,
+                prefix=_REPLAY_STDERR,
+                sink_queue=sink_queue)
 
         timedout = _wait_for_process(p, options["timeout"])
 
@@ -360,26 +621,13 @@ def _run(cmd, cwd, env, *args, **kwargs):
             p.stderr.close()
 
     if p.returncode != 0 and options["output_on_error"]:
-        for reader, line in logbuf:
-            if reader is stdout:
-                log.stdout(line)
-            else:
-                log.stderr(line)
-
-    stdoutbuf = []
-    stderrbuf = []
-    for reader, line in logbuf:
-        if reader is stdout:
-            stdoutbuf.append(line)
-        else:
-            stderrbuf.append(line)
+        _replay_output(replay)
 
     if p.returncode != 0:
-        stderrbuf = [line for reader, line in logbuf if reader is stderr]
-        _raise_process_error(p, stdoutbuf, stderrbuf, timedout)
+        _raise_process_error(p, stdoutbuf, stderrbuf.tail(), timedout)
     if options["return_stderr"]:
         return "\n".join(stdoutbuf) if options["output_rstrip"] else "".join(stdoutbuf), \
-            "\n".join(stderrbuf) if options["output_rstrip"] else "".join(stderrbuf)
+            "\n".join(stderrbuf) if options["output_rstrip"] else stderrbuf.getvalue()
     return "\n".join(stdoutbuf) if options["output_rstrip"] else "".join(stdoutbuf)
 
 
@@ -575,6 +823,440 @@ class _Tarfile(tarfile.TarFile):
         return super().chown(*args, **kwargs)
 
 
+class _QueueReader(object):
+    """
+    Readable stream fed with chunks of data by a producer thread.
+
+    Chunks are passed through a bounded queue. An exception put
+    into the queue is raised in the consumer. None marks the end
+    of the stream.
+    """
+
+    def __init__(self, maxsize=16):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self._chunk = memoryview(b"")
+        self._eof = False
+
+    def produce(self, stream, chunksize):
+        try:
+            while True:
+                data = stream.read(chunksize)
+                if not data:
+                    break
+                self.queue.put(data)
+            self.queue.put(None)
+        except BaseException as e:
+            self.queue.put(e)
+
+    def read(self, size=-1):
+        result = []
+        while (size < 0 or size > 0) and not self._eof:
+            if not self._chunk:
+                chunk = self.queue.get()
+                if chunk is None:
+                    self._eof = True
+                    break
+                if isinstance(chunk, BaseException):
+                    raise chunk
+                self._chunk = memoryview(chunk)
+            data = self._chunk if size < 0 else self._chunk[:size]
+            self._chunk = self._chunk[len(data):]
+            result.append(data)
+            if size > 0:
+                size -= len(data)
+        return b"".join(result)
+
+
+class _ExtractedFile(object):
+    """
+    A regular file being written by the extraction thread pool.
+
+    The file is opened by the first writer. Ownership is reference
+    counted and the last writer closes the file and restores its
+    permissions and modification time.
+    """
+
+    def __init__(self, tarinfo, targetpath):
+        self.tarinfo = tarinfo
+        self.targetpath = targetpath
+        self._lock = threading.Lock()
+        self._fd = None
+        self._refs = 1
+
+    def acquire(self):
+        with self._lock:
+            self._refs += 1
+
+    def release(self):
+        with self._lock:
+            self._refs -= 1
+            if self._refs > 0:
+                return
+            if self._fd is None:
+                self._open()
+            os.close(self._fd)
+            self._fd = None
+        try:
+            os.chmod(self.targetpath, self.tarinfo.mode)
+            os.utime(self.targetpath, (self.tarinfo.mtime, self.tarinfo.mtime))
+        except OSError:
+            # Non-fatal, as in tarfile
+            pass
+
+    def _open(self):
+        self._fd = os.open(self.targetpath, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0), 0o666)
+
+    def write(self, offset, data):
+        with self._lock:
+            if self._fd is None:
+                self._open()
+        view = memoryview(data)
+        while view:
+            written = os.pwrite(self._fd, view, offset)
+            view = view[written:]
+            offset += written
+
+
+class _ParallelTarExtractor(object):
+    """
+    Pipelined extraction of tar streams.
+
+    One thread decompresses the archive while the calling thread
+    parses tar headers. Directories and symbolic links are created
+    by the calling thread, in archive order, while file contents are
+    written by a thread pool. Permissions and modification times of
+    directories are restored last, as by tarfile. Ownership is not
+    restored.
+
+    Members which are not regular files, directories or symbolic links,
+    as well as members which overwrite a previously extracted member, are
+    extracted by tarfile once all pending writes have finished.
+    """
+
+    # Size of decompressed chunks passed to the tar parser
+    readsize = 1 << 20
+
+    # Size of file chunks written by the thread pool
+    chunksize = 1 << 20
+
+    # Small files are written in batches of this many files
+    batchsize = 64
+
+    def __init__(self, max_workers):
+        self._max_workers = max(max_workers, 1)
+        self._pending = threading.BoundedSemaphore(self._max_workers * 4)
+        self._futures = []
+        self._batch = []
+        self._batch_bytes = 0
+
+    def _submit(self, pool, fn, *args):
+        self._pending.acquire()
+
+        def _run():
+            try:
+                fn(*args)
+            finally:
+                self._pending.release()
+        self._futures.append(pool.submit(_run))
+
+    def _wait(self, pool):
+        self._flush(pool)
+        futures, self._futures = self._futures, []
+        for future in futures:
+            future.result()
+
+    def _flush(self, pool):
+        if self._batch:
+            self._submit(pool, self._write_files, self._batch)
+            self._batch = []
+            self._batch_bytes = 0
+
+    @staticmethod
+    def _write(file, offset, data):
+        try:
+            file.write(offset, data)
+        finally:
+            file.release()
+
+    @staticmethod
+    def _write_files(batch):
+        for tarinfo, targetpath, data in batch:
+            fd = os.open(targetpath, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0), 0o666)
+            try:
+                view = memoryview(data)
+                while view:
+                    view = view[os.write(fd, view):]
+            finally:
+                os.close(fd)
+            try:
+                os.chmod(targetpath, tarinfo.mode)
+                os.utime(targetpath, (tarinfo.mtime, tarinfo.mtime))
+            except OSError:
+                # Non-fatal, as in tarfile
+                pass
+
+    @staticmethod
+    def _tarinfo(tar, member, filter_function, path):
+        get_extract_tarinfo = getattr(tar, "_get_extract_tarinfo", None)
+        if get_extract_tarinfo is not None:
+            return get_extract_tarinfo(member, filter_function, path)
+        return member
+
+    def extract(self, stream, path):
+        reader = _QueueReader()
+        producer = threading.Thread(target=reader.produce, args=(stream, self.readsize), daemon=True)
+        producer.start()
+
+        directories = []
+        created_dirs = set()
+        extracted = set()
+
+        try:
+            with ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix="Extract") as pool, \
+                 _Tarfile.open(mode="r|", fileobj=reader, ignore_owner=True) as tar:
+
+                get_filter_function = getattr(tar, "_get_filter_function", None)
+                filter_function = get_filter_function(None) if get_filter_function else None
+                extract_kwargs = {"filter": "fully_trusted"} if hasattr(tarfile, "fully_trusted_filter") else {}
+
+                for member in tar:
+                    tarinfo = self._tarinfo(tar, member, filter_function, path)
+                    if tarinfo is None:
+                        continue
+
+                    targetpath = os.path.join(path, tarinfo.name).rstrip("/").replace("/", os.sep)
+                    targetpath = os.path.normpath(targetpath)
+
+                    # Members overwriting each other are extracted in order
+                    if targetpath in extracted:
+                        self._wait(pool)
+                    extracted.add(targetpath)
+
+                    if not (tarinfo.isdir() or tarinfo.issym() or (tarinfo.isreg() and not tarinfo.issparse())):
+                        self._wait(pool)
+                        tar.extract(tarinfo, path, set_attrs=True, **extract_kwargs)
+                        continue
+
+                    upperdirs = os.path.dirname(targetpath)
+                    if upperdirs and upperdirs not in created_dirs:
+                        if not os.path.exists(upperdirs):
+                            os.makedirs(upperdirs)
+                        created_dirs.add(upperdirs)
+
+                    if tarinfo.isdir():
+                        directories.append((tarinfo, targetpath))
+                        try:
+                            os.mkdir(targetpath, 0o700)
+                        except FileExistsError:
+                            pass
+                        created_dirs.add(targetpath)
+
+                    elif tarinfo.issym():
+                        self._wait(pool)
+                        if os.path.lexists(targetpath):
+                            os.unlink(targetpath)
+                        os.symlink(tarinfo.linkname, targetpath)
+
+                    elif tarinfo.size <= self.chunksize:
+                        data = tar.extractfile(tarinfo).read()
+                        raise_error_if(len(data) != tarinfo.size, "unexpected end of data in archive")
+                        self._batch.append((tarinfo, targetpath, data))
+                        self._batch_bytes += len(data)
+                        if len(self._batch) >= self.batchsize or self._batch_bytes >= self.chunksize:
+                            self._flush(pool)
+
+                    else:
+                        file = _ExtractedFile(tarinfo, targetpath)
+                        fileobj = tar.extractfile(tarinfo)
+                        offset = 0
+                        while offset < tarinfo.size:
+                            data = fileobj.read(self.chunksize)
+                            raise_error_if(not data, "unexpected end of data in archive")
+                            file.acquire()
+                            self._submit(pool, self._write, file, offset, data)
+                            offset += len(data)
+                        self._submit(pool, file.release)
+
+                self._wait(pool)
+
+            # Restore directory attributes in reverse order, as tarfile does
+            directories.sort(key=lambda d: d[0].name, reverse=True)
+            for tarinfo, targetpath in directories:
+                try:
+                    os.utime(targetpath, (tarinfo.mtime, tarinfo.mtime))
+                    if tarinfo.mode is not None:
+                        os.chmod(targetpath, tarinfo.mode)
+                except OSError:
+                    pass
+        finally:
+            # Unblock the producer if extraction failed
+            while producer.is_alive():
+                try:
+                    reader.queue.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            producer.join()
+
+
+class _ReadaheadBudget(object):
+    """
+    Limits the number of bytes read ahead by a pool of threads.
+
+    Reservations are granted in entry order, so the entry the consumer
+    is waiting for can always make progress. A single reservation
+    larger than the limit is granted when nothing else is reserved.
+    """
+
+    def __init__(self, limit):
+        self._limit = limit
+        self._used = 0
+        self._next = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def _available(self, index, size):
+        if self._closed:
+            return True
+        return self._next == index and (self._used == 0 or self._used + size <= self._limit)
+
+    def reserve(self, index, size):
+        with self._cond:
+            self._cond.wait_for(lambda: self._available(index, size))
+            self._used += size
+            self._next += 1
+            self._cond.notify_all()
+
+    def release(self, size):
+        with self._cond:
+            self._used -= size
+            self._cond.notify_all()
+
+    def close(self):
+        """ Grants all pending and future reservations. """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class _ParallelTarArchiver(object):
+    """
+    Adds a directory tree to a tar stream, reading files concurrently.
+
+    The tree is listed up front and files are then statted and read
+    ahead by a thread pool while members are written by the calling
+    thread in a deterministic order. With the default order, the
+    archive is identical to one created by ``tar.add(rootdir, ".")``.
+
+    The ``extension`` order emits all directories first, followed by
+    other members grouped by file extension and name. Similar content
+    ends up close together in the stream which improves compression.
+
+    The result does not depend on the number of threads.
+    """
+
+    # Files larger than this are streamed by the calling thread
+    readahead_max = 4 << 20
+
+    # Maximum amount of file data read ahead but not yet archived
+    readahead_bytes = 64 << 20
+
+    def __init__(self, max_workers, order=None):
+        raise_error_if(order not in [None, "name", "extension"], "invalid archive order '{0}'", order)
+        self._max_workers = max(max_workers, 1)
+        self._order = order
+
+    @staticmethod
+    def _walk(path, arcname):
+        """ Lists a tree in the same order as tarfile.add(). """
+        entries = []
+        stack = [(path, arcname)]
+        while stack:
+            path, arcname = stack.pop()
+            entries.append((path, arcname))
+            if stat.S_ISDIR(os.lstat(path).st_mode):
+                for name in reversed(sorted(os.listdir(path))):
+                    stack.append((os.path.join(path, name), os.path.join(arcname, name)))
+        return entries
+
+    @staticmethod
+    def _extension_key(entry):
+        path, arcname = entry
+        name = os.path.basename(arcname)
+        return (os.path.splitext(name)[1], name, arcname)
+
+    def _sort(self, entries):
+        if self._order != "extension":
+            return entries
+        directories, others = [], []
+        for entry in entries:
+            (directories if stat.S_ISDIR(os.lstat(entry[0]).st_mode) else others).append(entry)
+        return directories + sorted(others, key=self._extension_key)
+
+    def _read(self, statter, budget, index, path, arcname):
+        size = None
+        try:
+            tarinfo = statter.gettarinfo(path, arcname)
+            if tarinfo is not None and tarinfo.isreg() and tarinfo.size <= self.readahead_max:
+                size = tarinfo.size
+        finally:
+            budget.reserve(index, size or 0)
+        data = None
+        if size is not None:
+            with open(path, "rb") as f:
+                data = f.read(size)
+        return tarinfo, data, size or 0
+
+    def add(self, tar, rootdir, arcname="."):
+        entries = self._sort(self._walk(rootdir, arcname))
+
+        # Stats in the pool don't affect hardlink detection of the archive
+        statter = tarfile.TarFile(fileobj=io.BytesIO(), mode="w")
+        budget = _ReadaheadBudget(self.readahead_bytes)
+
+        with ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix="Archive") as pool:
+            try:
+                self._add(tar, entries, statter, budget, pool)
+            finally:
+                budget.close()
+
+        statter.close()
+
+    def _add(self, tar, entries, statter, budget, pool):
+        window = self._max_workers * 4
+        futures = [pool.submit(self._read, statter, budget, index, *entry)
+                   for index, entry in enumerate(entries[:window])]
+
+        for index, (path, arcname) in enumerate(entries):
+            tarinfo, data, size = futures[index].result()
+            futures[index] = None
+            if index + window < len(entries):
+                futures.append(pool.submit(self._read, statter, budget, index + window, *entries[index + window]))
+
+            try:
+                self._addfile(tar, path, arcname, tarinfo, data)
+            finally:
+                budget.release(size)
+
+    def _addfile(self, tar, path, arcname, tarinfo, data):
+        if tarinfo is None:
+            return
+
+        # Hardlinks are detected in archive order
+        if tarinfo.isreg() or tarinfo.islnk():
+            if os.lstat(path).st_nlink > 1:
+                tarinfo = tar.gettarinfo(path, arcname)
+                data = data if tarinfo.isreg() else None
+
+        if tarinfo.isreg():
+            if data is not None:
+                tar.addfile(tarinfo, io.BytesIO(data))
+            else:
+                with open(path, "rb") as f:
+                    tar.addfile(tarinfo, f)
+        else:
+            tar.addfile(tarinfo)
+
+
 class JinjaTaskContext(Context):
     """
     Helper context for Jinja templates.
@@ -596,6 +1278,91 @@ class JinjaTaskContext(Context):
         return missing
 
 
+# Environment variable names are case-insensitive on Windows
+_environ_key = str.upper if os.name == "nt" else str
+
+# Shared copy of os.environ, see _os_environ()
+_os_environ_copy = None
+
+
+def _os_environ():
+    """
+    Returns a shared, read-only copy of the process environment.
+
+    The copy is reused for as long as the process environment is
+    unchanged, which is detected by comparing the raw environment
+    data of os.environ with the data the copy was made from.
+    """
+    global _os_environ_copy
+
+    data = getattr(os.environ, "_data", None)
+    cached = _os_environ_copy
+    if data is not None and cached is not None and cached[0] == data:
+        return cached[1]
+
+    cached = (dict(data) if data is not None else None, dict(os.environ))
+    _os_environ_copy = cached
+    return cached[1]
+
+
+class _Environ(MutableMapping):
+    """
+    Copy-on-write environment variable mapping.
+
+    Variables are looked up in a parent mapping which is shared, not
+    copied, between environments. Assigned and deleted variables are
+    recorded in the environment's own overlay where they shadow the
+    parent. The parent must not be modified.
+    """
+
+    def __init__(self, parent, overlay=None):
+        self._parent = parent
+        self._overlay = overlay or {}
+
+    def __getitem__(self, key):
+        key = _environ_key(key)
+        if key in self._overlay:
+            value = self._overlay[key]
+            if value is None:
+                raise KeyError(key)
+            return value
+        return self._parent[key]
+
+    def __setitem__(self, key, value):
+        self._overlay[_environ_key(key)] = value
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self._overlay[_environ_key(key)] = None
+
+    def __contains__(self, key):
+        key = _environ_key(key)
+        if key in self._overlay:
+            return self._overlay[key] is not None
+        return key in self._parent
+
+    def __iter__(self):
+        for key in self._parent:
+            if key not in self._overlay:
+                yield key
+        for key, value in self._overlay.items():
+            if value is not None:
+                yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+    def copy(self):
+        """ Returns a copy sharing the parent of this environment. """
+        return _Environ(self._parent, dict(self._overlay))
+
+    __copy__ = copy
+
+
 class Namespace(object):
     def __init__(self, child=False):
         self.child = child
@@ -615,6 +1382,58 @@ class NamespaceException(Exception):
     pass
 
 
+# zstd compression level used to store incompressible content
+ZSTD_STORE_LEVEL = -(1 << 17)
+
+# Window size used with long distance matching, 128 MiB.
+# This is the largest window decoders accept by default.
+ZSTD_LONG_WINDOW_LOG = 27
+
+# Magic number of the zstd skippable frame carrying the artifact archive
+# header. The frame is ignored by standard zstd decoders.
+ZSTD_HEADER_MAGIC = 0x184D2A5A
+
+
+def _zstd_write_header(stream, header, dictionary=None):
+    payload = json.dumps(header).encode() + b"\n" + (dictionary or b"")
+    stream.write(struct.pack("<II", ZSTD_HEADER_MAGIC, len(payload)))
+    stream.write(payload)
+
+
+def _zstd_read_header(stream):
+    """
+    Read the header of a zstd archive, if present.
+
+    Returns the header and the embedded dictionary. The stream
+    is positioned at the first compressed frame.
+    """
+    frame = stream.read(8)
+    if len(frame) == 8:
+        magic, size = struct.unpack("<II", frame)
+        if magic == ZSTD_HEADER_MAGIC:
+            header, dictionary = stream.read(size).split(b"\n", 1)
+            return json.loads(header), dictionary or None
+    stream.seek(0)
+    return {}, None
+
+
+class _ByteCounter(object):
+    """ Writable stream that discards data, counting the number of bytes written. """
+
+    def __init__(self):
+        self.count = 0
+
+    def write(self, data):
+        self.count += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
 def _subid(id, login):
     """ PIDs allowed to be mapped by a user. """
     with open(f"/etc/sub{id}") as subid:
@@ -669,7 +1488,7 @@ class Tools(object):
         self._deadline = None
         self._run_prefix = []
         self._cwd = fs.path.normpath(fs.path.join(config.get_workdir(), cwd or config.get_workdir()))
-        self._env = copy.deepcopy(env or os.environ)
+        self._env = _Environ(dict(env) if env else _os_environ())
         self._task = task
         if task:
             self._env["JOLTDIR"] = task.joltdir
@@ -759,24 +1578,101 @@ class Tools(object):
             archive.writeall(rootdir, ".")
         return filename
 
-    def _make_tarfile(self, filename, fmt, rootdir):
+    def _add_tree(self, tar, rootdir, order=None):
+        threads = self.thread_count()
+        if threads > 1 or order not in [None, "name"]:
+            _ParallelTarArchiver(threads, order).add(tar, rootdir, ".")
+        else:
+            tar.add(rootdir, ".")
+
+    def _make_tarfile(self, filename, fmt, rootdir, order=None):
         self.mkdirname(filename)
         with tarfile.open(filename, 'w|%s' % fmt) as tar:
-            tar.add(rootdir, ".")
+            self._add_tree(tar, rootdir, order)
         return filename
 
-    def _make_tarzstd(self, filename, rootdir):
+    def _zstd_select_level(self, rootdir):
+        """
+        Select a zstd compression level for the files in a directory.
+
+        A sample of the content is compressed at the fastest level.
+        Incompressible content, such as already compressed archives and
+        images, is stored. Highly compressible content, such as headers,
+        logs and other text, is compressed with a higher level.
+        """
+        sample = bytearray()
+        for dirpath, dirnames, filenames in os.walk(rootdir):
+            dirnames.sort()
+            for name in sorted(filenames):
+                path = os.path.join(dirpath, name)
+                if os.path.islink(path) or not os.path.isfile(path):
+                    continue
+                with open(path, "rb") as f:
+                    sample += f.read(self._zstd_sample_file_size)
+                if len(sample) >= self._zstd_sample_size:
+                    break
+            if len(sample) >= self._zstd_sample_size:
+                break
+        if not sample:
+            return None
+
+        counter = _ByteCounter()
+        with ZstdCompressor(level=1).stream_writer(counter) as stream:
+            stream.write(bytes(sample))
+        ratio = len(sample) / max(counter.count, 1)
+
+        if ratio < self._zstd_store_ratio:
+            return "store"
+        if ratio >= self._zstd_text_ratio:
+            return self._zstd_text_level
+        return None
+
+    # Parameters of the adaptive compression level selection
+    _zstd_sample_size = 1 << 20
+    _zstd_sample_file_size = 64 << 10
+    _zstd_store_ratio = 1.05
+    _zstd_text_ratio = 3.0
+    _zstd_text_level = 9
+
+    def _make_tarzstd(self, filename, rootdir, level=None, long=False, dictionary=None, order=None):
         self.mkdirname(filename)
+
+        if level == "auto":
+            level = self._zstd_select_level(rootdir)
+        raise_task_error_if(
+            level is not None and level != "store" and type(level) is not int, self._task,
+            "invalid zstd compression level '{0}'", level)
+
+        # Non-default settings are recorded in a header
+        header = {}
+        if level is not None:
+            header["level"] = level
+        if long:
+            header["long"] = True
+        if dictionary:
+            header["dictionary"] = len(dictionary)
+
         with open(filename, 'wb') as zstd_file:
-            compressor = ZstdCompressor(threads=self.thread_count())
+            if header:
+                _zstd_write_header(zstd_file, header, dictionary)
+            compressor = ZstdCompressor(
+                threads=self.thread_count(),
+                level=ZSTD_STORE_LEVEL if level == "store" else level,
+                long=long,
+                dictionary=dictionary)
             with compressor.stream_writer(zstd_file) as stream:
                 with tarfile.open(mode="w|", fileobj=stream) as tar:
-                    tar.add(rootdir, ".")
+                    self._add_tree(tar, rootdir, order)
         return filename
 
-    def _extract_tarzstd(self, filename, pathname, files=None):
+    def _extract_tarzstd(self, filename, pathname, files=None, ignore_owner=False):
         with open(filename, 'rb') as zstd_file:
-            with ZstdFile(zstd_file) as stream:
+            _, dictionary = _zstd_read_header(zstd_file)
+            with ZstdFile(zstd_file, dictionary) as stream:
+                # Ownership is only restored by tarfile when running as root
+                threads = self.thread_count()
+                if not files and threads > 1 and (ignore_owner or not hasattr(os, "geteuid") or os.geteuid() != 0):
+                    return _ParallelTarExtractor(threads).extract(stream, pathname)
                 with tarfile.open(mode="r|", fileobj=stream) as tar:
                     if files:
                         for file in files:
@@ -784,7 +1680,7 @@ class Tools(object):
                     else:
                         tar.extractall(pathname)
 
-    def archive(self, pathname, filename):
+    def archive(self, pathname, filename, level=None, long=False, dictionary=None, order=None):
         """ Creates a (compressed) archive.
 
         The type of archive to create is determined by the filename extension.
@@ -798,9 +1694,23 @@ class Tools(object):
         - tar.zst
         - zip
 
+        Compression settings only apply to tar.zst archives. They are
+        recorded in the archive which can then be extracted by
+        :func:`extract` without knowledge of the settings.
+
         Args:
             pathname (str): Directory path of files to be archived.
             filename (str): Name/path of created archive.
+            level (int, str): zstd compression level. Use ``"store"`` for
+                incompressible content, or ``"auto"`` to select a level
+                based on a sample of the content.
+            long (boolean): Enable zstd long distance matching.
+            dictionary (bytes): zstd compression dictionary. The
+                dictionary is embedded in the archive.
+            order (str): Order of files in tar archives. By default, files
+                are archived in directory order. Use ``"extension"`` to
+                group files by extension, which may improve compression.
+                Archives are reproducible in either order.
         """
         filename = self.expand_path(filename)
         pathname = self.expand_path(pathname)
@@ -816,7 +1726,7 @@ class Tools(object):
                 return filename
             fmt = "targz"
         elif filename.endswith(".tar.zst"):
-            return self._make_tarzstd(filename, rootdir=pathname)
+            return self._make_tarzstd(filename, rootdir=pathname, level=level, long=long, dictionary=dictionary, order=order)
         elif filename.endswith(".tgz"):
             if self.which("tar") and self.which("pigz"):
                 self.run("tar -I pigz -cf {} -C {} .", filename, pathname)
@@ -837,7 +1747,7 @@ class Tools(object):
             elif fmt == "7z":
                 outfile = self._make_7zfile(filename, fmt, rootdir=pathname)
             else:
-                outfile = self._make_tarfile(filename, fmt[3:], rootdir=pathname)
+                outfile = self._make_tarfile(filename, fmt[3:], rootdir=pathname, order=order)
             if outfile != filename:
                 shutil.move(outfile, filename)
             return filename
@@ -909,6 +1819,11 @@ class Tools(object):
 
         return self._builddir[name]
 
+    def _spilldir(self):
+        """ Directory where large command output is spilled to disk """
+        from jolt.loader import JoltLoader
+        return self.buildroot if JoltLoader.get().workspace_path else None
+
     @property
     def buildroot(self):
         """ Return the root path of all build directories """
@@ -1163,7 +2078,7 @@ class Tools(object):
                 with tools.environ(CC="clang"):
                     tools.run("make all")
         """
-        restore = {key: value for key, value in self._env.items()}
+        restore = self._env.copy()
 
         for key, value in kwargs.items():
             if value is not None:
@@ -1354,7 +2269,7 @@ class Tools(object):
                         tar.extractall(filepath)
             elif filename.endswith(".tar.zst"):
                 try:
-                    self._extract_tarzstd(filename, filepath, files)
+                    self._extract_tarzstd(filename, filepath, files, ignore_owner=ignore_owner)
                 except tarfile.StreamError as e:
                     raise_task_error(self._task, "failed to extract archive '{0}': {1}", filename, str(e))
             elif filename.endswith(".7z"):
@@ -1840,6 +2755,7 @@ class Tools(object):
 
         """
         cmd = self._prepare_run_command(cmd, args, kwargs)
+        kwargs.setdefault("spilldir", self._spilldir())
         options = _normalize_run_kwargs(kwargs)
 
         log.debug("Running: '{0}' (CWD: {1})", cmd, self._cwd)
@@ -1859,7 +2775,7 @@ class Tools(object):
                     shell=options["shell"],
                     start_new_session=options["new_session"],
                     cwd=self._cwd,
-                    env=self._env,
+                    env=dict(self._env),
                 )
 
             procfile = _PopenFile(
@@ -1877,6 +2793,28 @@ class Tools(object):
             finally:
                 self._restore_termios(termios_state)
 
+    def _prepare_run(self, cmd, *args, **kwargs):
+        """
+        Prepares a command to be run later, possibly by another thread.
+
+        The command is expanded and bound to the current working directory
+        and environment. Returns a function which runs the command and
+        returns its output like :func:`run`. Output is logged on behalf
+        of the calling thread.
+        """
+        cmd = self._prepare_run_command(cmd, args, kwargs)
+        kwargs.setdefault("spilldir", self._spilldir())
+        cwd, env = self._cwd, dict(self._env)
+        parent = threading.current_thread()
+
+        def run():
+            if threading.current_thread() is parent:
+                return _run(cmd, cwd, env, *args, **kwargs)
+            with log.map_thread(threading.current_thread(), parent):
+                return _run(cmd, cwd, env, *args, **kwargs)
+
+        return run
+
     def run(self, cmd, *args, **kwargs):
         """
         Runs a command in a shell interpreter.
@@ -1901,6 +2839,9 @@ class Tools(object):
             output_rstrip (boolean, optional): By default, output written
                 to stdout is stripped from whitespace at the end of the
                 string. This can be disabled by setting this argument to False.
+            output_handler (function, optional): A function called with
+                batches of lines written to stdout while the command is
+                running, e.g. to parse the output incrementally.
             shell (boolean, optional): Use a shell to run the command.
                 Default: True.
             timeout (int, optional): Timeout in seconds. The command will
@@ -1929,7 +2870,8 @@ class Tools(object):
         try:
             termios_state = self._capture_termios()
 
-            return _run(cmd, self._cwd, self._env, *args, **kwargs)
+            kwargs.setdefault("spilldir", self._spilldir())
+            return _run(cmd, self._cwd, dict(self._env), *args, **kwargs)
 
         finally:
             self._restore_termios(termios_state)
@@ -7,7 +7,7 @@ import mmap
 import re
 import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from functools import partial, wraps
+from functools import lru_cache, partial, wraps
 from threading import RLock
 from string import Formatter
 import os
@@ -238,7 +238,44 @@ class _SafeDict(object):
         return "{" + key + "}"
 
 
+@lru_cache(maxsize=8192)
+def _compile_format(string):
+    """
+    Parses a format string.
+
+    Returns the parsed literals and fields, and whether the fields can be
+    rendered without the generic formatter. Automatically numbered fields
+    and nested format specifications require the generic formatter.
+    """
+    fields = tuple(Formatter().parse(string))
+    simple = all(
+        name is None or (name and "{" not in spec)
+        for _, name, spec, _ in fields)
+    return fields, simple
+
+
 class JoltFormatter(Formatter):
+    def parse(self, format_string):
+        return _compile_format(format_string)[0]
+
+    def vformat(self, format_string, args, kwargs):
+        fields, simple = _compile_format(format_string)
+        if not simple:
+            return super().vformat(format_string, args, kwargs)
+        result = []
+        for literal, name, spec, conversion in fields:
+            if literal:
+                result.append(literal)
+            if name is None:
+                continue
+            if name.isidentifier():
+                value = kwargs[name]
+            else:
+                value, _ = self.get_field(name, args, kwargs)
+            value = self.convert_field(value, conversion)
+            result.append(format(value, spec))
+        return "".join(result)
+
     def convert_field(self, value, conversion):
         if conversion == "u":
             return str(value).upper()
@@ -253,9 +290,15 @@ class JoltFormatter(Formatter):
         return super().convert_field(value, conversion)
 
 
+_formatter = JoltFormatter()
+
+
 def expand(string, *args, **kwargs):
+    string = str(string)
+    if "{" not in string and "}" not in string:
+        return string
     ignore_errors = kwargs.get("ignore_errors") or False
-    return JoltFormatter().vformat(str(string), args, _SafeDict(kwargs, ignore_errors))
+    return _formatter.vformat(string, args, _SafeDict(kwargs, ignore_errors))
 
 
 class duration(object):
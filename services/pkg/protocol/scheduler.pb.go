@@ -499,7 +499,7 @@ var file_jolt_plugins_remote_execution_scheduler_proto_rawDesc = []byte{
 	0x67, 0x4c, 0x69, 0x6e, 0x65, 0x52, 0x08, 0x6c, 0x6f, 0x67, 0x6c, 0x69, 0x6e, 0x65, 0x73, 0x12,
 	0x22, 0x0a, 0x06, 0x65, 0x72, 0x72, 0x6f, 0x72, 0x73, 0x18, 0x05, 0x20, 0x03, 0x28, 0x0b, 0x32,
 	0x0a, 0x2e, 0x54, 0x61, 0x73, 0x6b, 0x45, 0x72, 0x72, 0x6f, 0x72, 0x52, 0x06, 0x65, 0x72, 0x72,
-	0x6f, 0x72, 0x73, 0x32, 0xa2, 0x01, 0x0a, 0x09, 0x53, 0x63, 0x68, 0x65, 0x64, 0x75, 0x6c, 0x65,
+	0x6f, 0x72, 0x73, 0x32, 0xd2, 0x01, 0x0a, 0x09, 0x53, 0x63, 0x68, 0x65, 0x64, 0x75, 0x6c, 0x65,
 	0x72, 0x12, 0x2e, 0x0a, 0x0d, 0x53, 0x63, 0x68, 0x65, 0x64, 0x75, 0x6c, 0x65, 0x42, 0x75, 0x69,
 	0x6c, 0x64, 0x12, 0x0d, 0x2e, 0x42, 0x75, 0x69, 0x6c, 0x64, 0x52, 0x65, 0x71, 0x75, 0x65, 0x73,
 	0x74, 0x1a, 0x0c, 0x2e, 0x42, 0x75, 0x69, 0x6c, 0x64, 0x55, 0x70, 0x64, 0x61, 0x74, 0x65, 0x30,
@@ -509,7 +509,10 @@ var file_jolt_plugins_remote_execution_scheduler_proto_rawDesc = []byte{
 	0x69, 0x6c, 0x64, 0x52, 0x65, 0x73, 0x70, 0x6f, 0x6e, 0x73, 0x65, 0x12, 0x2b, 0x0a, 0x0c, 0x53,
 	0x63, 0x68, 0x65, 0x64, 0x75, 0x6c, 0x65, 0x54, 0x61, 0x73, 0x6b, 0x12, 0x0c, 0x2e, 0x54, 0x61,
 	0x73, 0x6b, 0x52, 0x65, 0x71, 0x75, 0x65, 0x73, 0x74, 0x1a, 0x0b, 0x2e, 0x54, 0x61, 0x73, 0x6b,
-	0x55, 0x70, 0x64, 0x61, 0x74, 0x65, 0x30, 0x01, 0x42, 0x0e, 0x5a, 0x0c, 0x70, 0x6b, 0x67, 0x2f,
+	0x55, 0x70, 0x64, 0x61, 0x74, 0x65, 0x30, 0x01, 0x12, 0x2e, 0x0a, 0x0d, 0x53, 0x63, 0x68, 0x65,
+	0x64, 0x75, 0x6c, 0x65, 0x54, 0x61, 0x73, 0x6b, 0x73, 0x12, 0x0c, 0x2e, 0x54, 0x61, 0x73, 0x6b,
+	0x52, 0x65, 0x71, 0x75, 0x65, 0x73, 0x74, 0x1a, 0x0b, 0x2e, 0x54, 0x61, 0x73, 0x6b, 0x55, 0x70,
+	0x64, 0x61, 0x74, 0x65, 0x28, 0x01, 0x30, 0x01, 0x42, 0x0e, 0x5a, 0x0c, 0x70, 0x6b, 0x67, 0x2f,
 	0x70, 0x72, 0x6f, 0x74, 0x6f, 0x63, 0x6f, 0x6c, 0x62, 0x06, 0x70, 0x72, 0x6f, 0x74, 0x6f, 0x33,
 }
 
@@ -552,11 +555,13 @@ var file_jolt_plugins_remote_execution_scheduler_proto_depIdxs = []int32{
 	0,  // 8: Scheduler.ScheduleBuild:input_type -> BuildRequest
 	2,  // 9: Scheduler.CancelBuild:input_type -> CancelBuildRequest
 	4,  // 10: Scheduler.ScheduleTask:input_type -> TaskRequest
-	1,  // 11: Scheduler.ScheduleBuild:output_type -> BuildUpdate
-	3,  // 12: Scheduler.CancelBuild:output_type -> CancelBuildResponse
-	6,  // 13: Scheduler.ScheduleTask:output_type -> TaskUpdate
-	11, // [11:14] is the sub-list for method output_type
-	8,  // [8:11] is the sub-list for method input_type
+	4,  // 11: Scheduler.ScheduleTasks:input_type -> TaskRequest
+	1,  // 12: Scheduler.ScheduleBuild:output_type -> BuildUpdate
+	3,  // 13: Scheduler.CancelBuild:output_type -> CancelBuildResponse
+	6,  // 14: Scheduler.ScheduleTask:output_type -> TaskUpdate
+	6,  // 15: Scheduler.ScheduleTasks:output_type -> TaskUpdate
+	12, // [12:16] is the sub-list for method output_type
+	8,  // [8:12] is the sub-list for method input_type
 	8,  // [8:8] is the sub-list for extension type_name
 	8,  // [8:8] is the sub-list for extension extendee
 	0,  // [0:8] is the sub-list for field type_name
@@ -22,6 +22,7 @@ const (
 	Scheduler_ScheduleBuild_FullMethodName = "/Scheduler/ScheduleBuild"
 	Scheduler_CancelBuild_FullMethodName   = "/Scheduler/CancelBuild"
 	Scheduler_ScheduleTask_FullMethodName  = "/Scheduler/ScheduleTask"
+	Scheduler_ScheduleTasks_FullMethodName = "/Scheduler/ScheduleTasks"
 )
 
 // SchedulerClient is the client API for Scheduler service.
@@ -37,6 +38,12 @@ type SchedulerClient interface {
 	// The scheduler will assign the task to a free worker
 	// and updates will be sent back once the task is running.
 	ScheduleTask(ctx context.Context, in *TaskRequest, opts ...grpc.CallOption) (Scheduler_ScheduleTaskClient, error)
+	// Schedule multiple tasks to be executed.
+	// Task requests are streamed by the client and updates
+	// for all of them are sent back on the same stream.
+	// Each update carries the original request to identify
+	// the task that it belongs to.
+	ScheduleTasks(ctx context.Context, opts ...grpc.CallOption) (Scheduler_ScheduleTasksClient, error)
 }
 
 type schedulerClient struct {
@@ -120,6 +127,37 @@ func (x *schedulerScheduleTaskClient) Recv() (*TaskUpdate, error) {
 	return m, nil
 }
 
+func (c *schedulerClient) ScheduleTasks(ctx context.Context, opts ...grpc.CallOption) (Scheduler_ScheduleTasksClient, error) {
+	stream, err := c.cc.NewStream(ctx, &Scheduler_ServiceDesc.Streams[2], Scheduler_ScheduleTasks_FullMethodName, opts...)
+	if err != nil {
+		return nil, err
+	}
+	x := &schedulerScheduleTasksClient{stream}
+	return x, nil
+}
+
+type Scheduler_ScheduleTasksClient interface {
+	Send(*TaskRequest) error
+	Recv() (*TaskUpdate, error)
+	grpc.ClientStream
+}
+
+type schedulerScheduleTasksClient struct {
+	grpc.ClientStream
+}
+
+func (x *schedulerScheduleTasksClient) Send(m *TaskRequest) error {
+	return x.ClientStream.SendMsg(m)
+}
+
+func (x *schedulerScheduleTasksClient) Recv() (*TaskUpdate, error) {
+	m := new(TaskUpdate)
+	if err := x.ClientStream.RecvMsg(m); err != nil {
+		return nil, err
+	}
+	return m, nil
+}
+
 // SchedulerServer is the server API for Scheduler service.
 // All implementations must embed UnimplementedSchedulerServer
 // for forward compatibility
@@ -133,6 +171,12 @@ type SchedulerServer interface {
 	// The scheduler will assign the task to a free worker
 	// and updates will be sent back once the task is running.
 	ScheduleTask(*TaskRequest, Scheduler_ScheduleTaskServer) error
+	// Schedule multiple tasks to be executed.
+	// Task requests are streamed by the client and updates
+	// for all of them are sent back on the same stream.
+	// Each update carries the original request to identify
+	// the task that it belongs to.
+	ScheduleTasks(Scheduler_ScheduleTasksServer) error
 	mustEmbedUnimplementedSchedulerServer()
 }
 
@@ -149,6 +193,9 @@ func (UnimplementedSchedulerServer) CancelBuild(context.Context, *CancelBuildReq
 func (UnimplementedSchedulerServer) ScheduleTask(*TaskRequest, Scheduler_ScheduleTaskServer) error {
 	return status.Errorf(codes.Unimplemented, "method ScheduleTask not implemented")
 }
+func (UnimplementedSchedulerServer) ScheduleTasks(Scheduler_ScheduleTasksServer) error {
+	return status.Errorf(codes.Unimplemented, "method ScheduleTasks not implemented")
+}
 func (UnimplementedSchedulerServer) mustEmbedUnimplementedSchedulerServer() {}
 
 // UnsafeSchedulerServer may be embedded to opt out of forward compatibility for this service.
@@ -222,6 +269,32 @@ func (x *schedulerScheduleTaskServer) Send(m *TaskUpdate) error {
 	return x.ServerStream.SendMsg(m)
 }
 
+func _Scheduler_ScheduleTasks_Handler(srv interface{}, stream grpc.ServerStream) error {
+	return srv.(SchedulerServer).ScheduleTasks(&schedulerScheduleTasksServer{stream})
+}
+
+type Scheduler_ScheduleTasksServer interface {
+	Send(*TaskUpdate) error
+	Recv() (*TaskRequest, error)
+	grpc.ServerStream
+}
+
+type schedulerScheduleTasksServer struct {
+	grpc.ServerStream
+}
+
+func (x *schedulerScheduleTasksServer) Send(m *TaskUpdate) error {
+	return x.ServerStream.SendMsg(m)
+}
+
+func (x *schedulerScheduleTasksServer) Recv() (*TaskRequest, error) {
+	m := new(TaskRequest)
+	if err := x.ServerStream.RecvMsg(m); err != nil {
+		return nil, err
+	}
+	return m, nil
+}
+
 // Scheduler_ServiceDesc is the grpc.ServiceDesc for Scheduler service.
 // It's only intended for direct use with grpc.RegisterService,
 // and not to be introspected or modified (even as a copy)
@@ -245,6 +318,12 @@ var Scheduler_ServiceDesc = grpc.ServiceDesc{
 			Handler:       _Scheduler_ScheduleTask_Handler,
 			ServerStreams: true,
 		},
+		{
+			StreamName:    "ScheduleTasks",
+			Handler:       _Scheduler_ScheduleTasks_Handler,
+			ServerStreams: true,
+			ClientStreams: true,
+		},
 	},
 	Metadata: "jolt/plugins/remote_execution/scheduler.proto",
 }
@@ -2,6 +2,8 @@ package scheduler
 
 import (
 	"context"
+	"io"
+	"sync"
 
 	"github.com/srand/jolt/scheduler/pkg/protocol"
 	"github.com/srand/jolt/scheduler/pkg/utils"
@@ -94,3 +96,75 @@ func (s *schedulerService) ScheduleTask(request *protocol.TaskRequest, stream pr
 		}
 	}
 }
+
+func (s *schedulerService) ScheduleTasks(stream protocol.Scheduler_ScheduleTasksServer) error {
+	var err error
+	var sendLock sync.Mutex
+	var tasks sync.WaitGroup
+
+	ctx, cancel := context.WithCancel(stream.Context())
+	defer cancel()
+
+	// Updates of all tasks are relayed on the same stream
+	relay := func(observer TaskUpdateObserver) {
+		defer tasks.Done()
+		defer observer.Close()
+
+		for {
+			select {
+			case update := <-observer.Updates():
+				if update == nil {
+					return
+				}
+
+				sendLock.Lock()
+				err := stream.Send(update)
+				sendLock.Unlock()
+				if err != nil {
+					cancel()
+					return
+				}
+
+				if update.Status.IsCompleted() {
+					return
+				}
+
+			case <-ctx.Done():
+				return
+			}
+		}
+	}
+
+	for {
+		var request *protocol.TaskRequest
+
+		request, err = stream.Recv()
+		if err != nil {
+			if err == io.EOF {
+				err = nil
+			} else {
+				cancel()
+			}
+			break
+		}
+
+		var observer TaskUpdateObserver
+
+		observer, err = s.scheduler.ScheduleTask(request.BuildId, request.TaskId)
+		if err != nil {
+			cancel()
+			break
+		}
+
+		tasks.Add(1)
+		go relay(observer)
+	}
+
+	// Wait for all scheduled tasks to complete before closing the stream
+	tasks.Wait()
+
+	if err != nil {
+		return utils.GrpcError(err)
+	}
+	return nil
+}
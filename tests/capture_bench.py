@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+"""
+Benchmark of subprocess output capture.
+
+A command printing many lines is run while its output is logged to a
+task log, like in a running task. The previous line-by-line reader
+threads are compared with the capture engine used by Tools.run.
+
+Usage: capture_bench.py [LINES] [PROCESSES]
+"""
+
+import subprocess
+import sys
+import threading
+
+from jolt import log
+from jolt import tools
+from jolt import utils
+
+
+class Reader(threading.Thread):
+    """ Line-by-line reader thread previously used by Tools.run. """
+
+    def __init__(self, parent, stream, output=None, logbuf=None, output_rstrip=True):
+        super(Reader, self).__init__()
+        self.output = output
+        self.output_rstrip = output_rstrip
+        self.parent = parent
+        self.stream = stream
+        self.logbuf = logbuf if logbuf is not None else []
+        self.start()
+
+    def run(self):
+        line = ""
+        try:
+            with log.map_thread(self, self.parent):
+                for line in iter(self.stream.readline, b''):
+                    if self.output_rstrip:
+                        line = line.rstrip()
+                    line = line.decode(errors='ignore')
+                    if self.output:
+                        self.output(line)
+                    self.logbuf.append(line)
+        except Exception as e:
+            if self.output:
+                self.output("{0}", str(e))
+                self.output(line)
+            self.logbuf.append(line)
+
+
+def command(lines):
+    return f"seq {lines} | sed 's/$/ compiling src\\/module\\/file.cpp -O2 -Wall -Iinclude/'"
+
+
+def capture_reader(t, cmd):
+    p = subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    stdout, stderr = [], []
+    readers = [
+        Reader(threading.current_thread(), p.stdout, output=log.stdout, logbuf=stdout),
+        Reader(threading.current_thread(), p.stderr, output=log.stderr, logbuf=stderr),
+    ]
+    p.wait()
+    for reader in readers:
+        reader.join()
+    p.stdout.close()
+    p.stderr.close()
+    return len(stdout)
+
+
+def capture_engine(t, cmd):
+    return len(t.run(cmd).splitlines())
+
+
+CAPTURES = [capture_reader, capture_engine]
+
+
+def run(t, capture, lines, processes):
+    counts = [0] * processes
+
+    def task(index):
+        with log.threadsink():
+            counts[index] = capture(t, command(lines // processes))
+
+    ts = utils.duration()
+    threads = [threading.Thread(target=task, args=(i,)) for i in range(processes)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = ts.seconds
+
+    assert sum(counts) == lines // processes * processes
+    return elapsed
+
+
+def main():
+    lines = int(sys.argv[1] if len(sys.argv) > 1 else 1000000)
+    processes = int(sys.argv[2] if len(sys.argv) > 2 else 1)
+
+    # Keep terminal output out of the measurement
+    log.set_level(log.SILENCE)
+
+    t = tools.Tools()
+    print(f"{'Capture':<16} {'Processes':>10} {'Lines':>10} {'Time':>8} {'Throughput':>16}")
+    for capture in CAPTURES:
+        elapsed = run(t, capture, lines, processes)
+        print(f"{capture.__name__:<16} {processes:>10} {lines:>10} {elapsed:>7.2f}s "
+              f"{lines / max(elapsed, 1e-6):>9.0f} lines/s")
+
+
+if __name__ == '__main__':
+    main()
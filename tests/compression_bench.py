@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+"""
+Benchmark of artifact archive compression settings.
+
+Representative artifact contents are generated and archived with
+different zstd settings. The compression ratio and the throughput of
+compression and extraction are reported for each combination.
+
+Usage: compression_bench.py [SIZE_MB]
+"""
+
+import os
+import random
+import sys
+
+from jolt import loader
+from jolt import tools
+from jolt import utils
+
+
+loader.JoltLoader.get().set_workspace_path(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _text(rnd, size):
+    words = ["int", "void", "const", "struct", "return", "static", "namespace", "template",
+             "#include", "#define", "uint32_t", "std::vector", "nullptr", "if", "else", "for"]
+    data = []
+    length = 0
+    while length < size:
+        line = " ".join(rnd.choice(words) for _ in range(rnd.randint(2, 12))) + ";\n"
+        data.append(line)
+        length += len(line)
+    return "".join(data).encode()
+
+
+def headers(t, rnd, size):
+    """ Many small, similar text files. """
+    for i in range(max(size // (8 << 10), 1)):
+        t.write_file(f"include/header{i}.h", _text(rnd, 8 << 10).decode(), expand=False)
+
+
+def logs(t, rnd, size):
+    """ A few large, repetitive text files. """
+    for i in range(4):
+        t.write_file(f"logs/build{i}.log", _text(rnd, size // 4).decode(), expand=False)
+
+
+def binaries(t, rnd, size):
+    """ Object code like content with copies of the same library. """
+    library = bytes(rnd.getrandbits(8) for _ in range(size // 8)) + _text(rnd, size // 8)
+    for i in range(4):
+        with open(t.expand_path(f"lib/lib{i}.so"), "wb") as f:
+            f.write(library)
+
+
+def compressed(t, rnd, size):
+    """ Already compressed payload. """
+    with open(t.expand_path("data/payload.bin"), "wb") as f:
+        f.write(os.urandom(size))
+
+
+ARTIFACTS = [headers, logs, binaries, compressed]
+
+SETTINGS = [
+    ("default", {}),
+    ("auto", {"level": "auto"}),
+    ("store", {"level": "store"}),
+    ("9", {"level": 9}),
+    ("19", {"level": 19}),
+    ("3+long", {"long": True}),
+    ("3+dict", {"dictionary": True}),
+]
+
+
+def _size(path):
+    return sum(os.path.getsize(f) for f in utils.as_list(path))
+
+
+def main():
+    size = int(sys.argv[1] if len(sys.argv) > 1 else 16) << 20
+    rnd = random.Random(0)
+
+    with tools.Tools() as t, t.tmpdir("bench") as tmp, t.cwd(tmp):
+        print(f"{'Artifact':<12} {'Settings':<10} {'Ratio':>8} {'Compress':>12} {'Extract':>12}")
+
+        for artifact in ARTIFACTS:
+            for generation in ["previous", "current"]:
+                for subdir in ["include", "logs", "lib", "data"]:
+                    t.mkdir(f"{artifact.__name__}/{generation}/{subdir}")
+                with t.cwd(f"{artifact.__name__}/{generation}"):
+                    artifact(t, rnd, size)
+
+            rootdir = t.expand_path(f"{artifact.__name__}/current")
+            original = sum(_size(f) for f in t.glob(f"{rootdir}/**/*") if os.path.isfile(f))
+
+            # Dictionary trained from the previous generation of the artifact
+            samples = [
+                open(f, "rb").read(128 << 10)
+                for f in map(t.expand_path, t.glob(f"{artifact.__name__}/previous/**/*"))
+                if os.path.isfile(f)
+            ]
+            try:
+                dictionary = tools.ZstdTrainDictionary(samples, 112 << 10)
+            except Exception:
+                dictionary = None
+
+            for name, kwargs in SETTINGS:
+                kwargs = dict(kwargs)
+                if kwargs.get("dictionary"):
+                    if not dictionary:
+                        continue
+                    kwargs["dictionary"] = dictionary
+
+                archive = t.expand_path(f"{artifact.__name__}-{name}.tar.zst")
+                extracted = t.expand_path(f"{artifact.__name__}-{name}")
+
+                ts = utils.duration()
+                t.archive(rootdir, archive, **kwargs)
+                compress = ts.seconds
+
+                ts = utils.duration()
+                t.extract(archive, extracted)
+                extract = ts.seconds
+
+                ratio = original / _size(archive)
+                print(f"{artifact.__name__:<12} {name:<10} {ratio:>8.2f} "
+                      f"{original / (1 << 20) / max(compress, 1e-6):>8.1f} MB/s "
+                      f"{original / (1 << 20) / max(extract, 1e-6):>8.1f} MB/s")
+
+                t.rmtree(extracted)
+                t.unlink(archive)
+
+
+if __name__ == '__main__':
+    main()
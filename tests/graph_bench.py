@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+"""
+Benchmark of task graph construction.
+
+A recipe with one task requiring many other tasks, as in the
+test_many_deps scenario of nfr.jolt, is loaded from a temporary
+workspace. The graph of the task is then built, including the
+calculation of task identities, and the number of string expansions
+made in the process is counted, as is the peak resident set size of
+the process. The environment is padded with VARIABLES variables to
+resemble that of a typical CI runner. Finally, the time spent
+expanding typical format strings, with and without keywords, is
+measured.
+
+Usage: graph_bench.py [TASKS] [EXPANSIONS] [VARIABLES]
+"""
+
+import os
+import resource
+import sys
+import tempfile
+from contextlib import contextmanager
+
+from jolt import cache
+from jolt import cli  # noqa: F401, imported before graph to resolve import cycles
+from jolt import graph
+from jolt import log
+from jolt import utils
+from jolt.loader import JoltLoader
+from jolt.tasks import TaskRegistry
+
+
+RECIPE = """
+from jolt import *
+
+class Generator(TaskGenerator):
+    def generate(self):
+        tasks = []
+        names = ["t" + str(i) for i in range({tasks})]
+
+        for task_name in names:
+            class T(Task):
+                name = task_name
+            tasks.append(T)
+
+        class T(Task):
+            requires = names
+
+        return tasks + [T]
+"""
+
+
+@contextmanager
+def count_calls(module, name):
+    calls = [0]
+    function = getattr(module, name)
+
+    def wrapper(*args, **kwargs):
+        calls[0] += 1
+        return function(*args, **kwargs)
+
+    setattr(module, name, wrapper)
+    try:
+        yield calls
+    finally:
+        setattr(module, name, function)
+
+
+STRINGS = [
+    "src/main.cpp",
+    "{outdir}/{binary}.dir/{in_path}/{in_base}{in_ext}.o",
+    "{canonical_name}-{identity}",
+]
+
+KEYWORDS = {
+    "outdir": "build/ninja",
+    "binary": "main",
+    "in_path": "src",
+    "in_base": "main",
+    "in_ext": ".cpp",
+    "canonical_name": "main",
+    "identity": "0123456789abcdef",
+}
+
+
+def main():
+    tasks = int(sys.argv[1] if len(sys.argv) > 1 else 1000)
+    expansions = int(sys.argv[2] if len(sys.argv) > 2 else 300000)
+    variables = int(sys.argv[3] if len(sys.argv) > 3 else 300)
+
+    for i in range(variables):
+        os.environ[f"GRAPH_BENCH_{i}"] = f"/opt/graph_bench/{i}/bin:/usr/local/bin:/usr/bin:/bin"
+
+    log.set_level(log.SILENCE)
+
+    with tempfile.TemporaryDirectory() as path, count_calls(utils, "expand") as calls:
+        with open(os.path.join(path, "bench.jolt"), "w") as f:
+            f.write(RECIPE.replace("{tasks}", str(tasks)))
+
+        os.chdir(path)
+        registry = TaskRegistry.get()
+        loader = JoltLoader.get()
+        loader.set_workspace_path(path)
+        loader.load(registry)
+        acache = cache.ArtifactCache.get()
+
+        ts = utils.duration()
+        dag = graph.GraphBuilder(registry, acache).build(["t"])
+        elapsed = ts.seconds
+
+    # Peak resident set size, reported in KiB on Linux
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    print(f"{'Tasks':>8} {'Time':>8} {'Expansions':>12} {'Max RSS':>10}")
+    print(f"{len(dag.nodes):>8} {elapsed:>7.2f}s {calls[0]:>12} {rss:>7.0f}MiB")
+    print()
+
+    ts = utils.duration()
+    for i in range(expansions):
+        utils.expand(STRINGS[i % len(STRINGS)], **KEYWORDS)
+    elapsed = ts.seconds
+
+    print(f"{'Expansions':>12} {'Time':>8} {'Per call':>10}")
+    print(f"{expansions:>12} {elapsed:>7.2f}s {elapsed / expansions * 1e6:>8.2f}us")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+"""
+Benchmark of task log capture.
+
+Lines are logged by concurrent threads, each capturing its own output
+like a running task. The thread-routed dispatcher used by
+log.threadsink is compared with the previous approach of installing
+one filtered handler per thread in the jolt logger.
+
+Usage: log_bench.py [LINES] [THREADS]
+"""
+
+import logging
+import sys
+import threading
+from contextlib import contextmanager
+from io import StringIO
+
+from jolt import log
+from jolt import utils
+
+
+@contextmanager
+def filtered_threadsink(level=log.DEBUG):
+    threadid = threading.get_ident()
+    stringbuf = StringIO()
+    handler = logging.StreamHandler(stringbuf)
+    handler.setLevel(level)
+    handler.setFormatter(log._file_formatter)
+    handler.addFilter(log._thread_map)
+    handler.addFilter(log.Filter(lambda record: record.thread == threadid))
+    log._logger.addHandler(handler)
+    try:
+        yield stringbuf
+    finally:
+        log._logger.removeHandler(handler)
+
+
+SINKS = [filtered_threadsink, log.threadsink]
+
+
+def run(sink, lines, threads):
+    barrier = threading.Barrier(threads + 1)
+    output = [None] * threads
+
+    def worker(index):
+        with sink() as buf:
+            barrier.wait()
+            for i in range(lines // threads):
+                log.verbose("Line {} from task {}", i, index)
+            barrier.wait()
+            output[index] = buf.getvalue()
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    barrier.wait()
+    ts = utils.duration()
+    barrier.wait()
+    elapsed = ts.seconds
+    for thread in workers:
+        thread.join()
+
+    assert all(buf.count("\n") == lines // threads for buf in output)
+    return elapsed
+
+
+def main():
+    lines = int(sys.argv[1] if len(sys.argv) > 1 else 1000000)
+    threads = int(sys.argv[2] if len(sys.argv) > 2 else 64)
+
+    # Keep terminal output out of the measurement
+    log.set_level(log.SILENCE)
+
+    print(f"{'Sink':<22} {'Threads':>8} {'Lines':>10} {'Time':>8} {'Throughput':>16}")
+    for sink in SINKS:
+        elapsed = run(sink, lines, threads)
+        print(f"{sink.__name__:<22} {threads:>8} {lines:>10} {elapsed:>7.2f}s "
+              f"{lines / max(elapsed, 1e-6):>9.0f} lines/s")
+
+
+if __name__ == '__main__':
+    main()
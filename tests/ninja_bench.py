@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+"""
+Benchmark of Ninja build file generation.
+
+A synthetic C++ library with many source files is generated in a
+temporary workspace. The build file is then generated three times:
+from scratch, again without any changes, where the write is skipped,
+and after adding a source file, where the file is rewritten.
+
+Usage: ninja_bench.py [SOURCES]
+"""
+
+import os
+import sys
+import tempfile
+
+from jolt import log
+from jolt import utils
+from jolt.loader import JoltLoader
+from jolt.plugins import ninja
+
+
+def create_workspace(path, sources):
+    for i in range(sources):
+        source = os.path.join(path, "src", f"module{i // 100}", f"file{i}.cpp")
+        os.makedirs(os.path.dirname(source), exist_ok=True)
+        open(source, "w").close()
+
+
+def create_task(path):
+    class Library(ninja.CXXLibrary):
+        name = "library"
+        joltdir = path
+        sources = ["src/**/*.cpp"]
+
+    task = Library()
+    task.outdir = task.tools.builddir("ninja", incremental=True)
+    task.outdir_rel = task.tools.expand_relpath(task.outdir, task.tools.wsroot)
+    return task
+
+
+def generate(path):
+    task = create_task(path)
+    buildfile = os.path.join(task.outdir, "build.ninja")
+    mtime = os.stat(buildfile).st_mtime_ns if os.path.exists(buildfile) else None
+
+    ts = utils.duration()
+    task._expand_headers()
+    task._expand_sources({}, task.tools)
+    task._write_ninja_file(task.outdir, {}, task.tools)
+    elapsed = ts.seconds
+
+    written = mtime != os.stat(buildfile).st_mtime_ns
+    return len(task.sources), elapsed, written
+
+
+def main():
+    sources = int(sys.argv[1] if len(sys.argv) > 1 else 20000)
+
+    log.set_level(log.SILENCE)
+
+    with tempfile.TemporaryDirectory() as path:
+        create_workspace(path, sources)
+        JoltLoader.get().set_workspace_path(path)
+
+        print(f"{'Generation':<12} {'Sources':>10} {'Time':>8} {'Written':>8}")
+        for name in ["cold", "unchanged", "changed"]:
+            if name == "changed":
+                open(os.path.join(path, "src", "added.cpp"), "w").close()
+            count, elapsed, written = generate(path)
+            print(f"{name:<12} {count:>10} {elapsed:>7.2f}s {'yes' if written else 'no':>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+"""
+Benchmark of tar.zst artifact archive creation and extraction.
+
+Synthetic archives with many small files and with a few huge files
+are created sequentially with tarfile and with the parallel archiver
+used by Tools.archive, in directory and in extension order. They are
+then extracted sequentially with tarfile and with the pipelined
+extractor used by Tools.extract.
+
+Usage: tar_bench.py [SIZE_MB]
+"""
+
+import os
+import sys
+import tarfile
+
+from jolt import loader
+from jolt import tools
+from jolt import utils
+
+
+loader.JoltLoader.get().set_workspace_path(os.path.dirname(os.path.abspath(__file__)))
+
+
+def many_small_files(rootdir, size):
+    count = size // (4 << 10)
+    for i in range(count):
+        dirname = os.path.join(rootdir, f"dir{i % 100}")
+        os.makedirs(dirname, exist_ok=True)
+        with open(os.path.join(dirname, f"file{i}.h"), "wb") as f:
+            f.write(os.urandom(1 << 10) * 4)
+
+
+def few_huge_files(rootdir, size):
+    for i in range(4):
+        with open(os.path.join(rootdir, f"file{i}.bin"), "wb") as f:
+            for _ in range(size // 4 // (1 << 20)):
+                f.write(os.urandom(256 << 10) * 4)
+
+
+ARCHIVES = [many_small_files, few_huge_files]
+
+
+def archive_sequential(t, path, archive):
+    with t.environ(JOLT_THREADS="1"):
+        t.archive(path, archive)
+
+
+def archive_parallel(t, path, archive):
+    with t.environ(JOLT_THREADS=str(max(t.cpu_count(), 2))):
+        t.archive(path, archive)
+
+
+def archive_extension(t, path, archive):
+    with t.environ(JOLT_THREADS=str(max(t.cpu_count(), 2))):
+        t.archive(path, archive, order="extension")
+
+
+ARCHIVERS = [archive_sequential, archive_parallel, archive_extension]
+
+
+def extract_sequential(t, archive, path):
+    with open(archive, "rb") as f, tools.ZstdFile(f) as stream:
+        with tarfile.open(mode="r|", fileobj=stream) as tar:
+            tar.extractall(path)
+
+
+def extract_parallel(t, archive, path):
+    with t.environ(JOLT_THREADS=str(max(t.cpu_count(), 2))):
+        t.extract(archive, path, ignore_owner=True)
+
+
+EXTRACTORS = [extract_sequential, extract_parallel]
+
+
+def main():
+    size = int(sys.argv[1] if len(sys.argv) > 1 else 256) << 20
+
+    with tools.Tools() as t, t.tmpdir("bench") as tmp:
+        print(f"{'Archive':<18} {'Method':<20} {'Files':>8} {'Time':>8} {'Throughput':>12} {'Size':>10}")
+
+        for generate in ARCHIVES:
+            rootdir = os.path.join(tmp, generate.__name__)
+            os.makedirs(rootdir)
+            generate(rootdir, size)
+            files = sum(len(filenames) for _, _, filenames in os.walk(rootdir))
+
+            archive = os.path.join(tmp, generate.__name__ + ".tar.zst")
+            for create in ARCHIVERS:
+                t.unlink(archive, ignore_errors=True)
+                ts = utils.duration()
+                create(t, rootdir, archive)
+                elapsed = ts.seconds
+                print(f"{generate.__name__:<18} {create.__name__:<20} {files:>8} {elapsed:>7.2f}s "
+                      f"{size / (1 << 20) / max(elapsed, 1e-6):>7.1f} MB/s "
+                      f"{os.path.getsize(archive) / (1 << 20):>7.1f} MB")
+            t.rmtree(rootdir)
+
+            for extract in EXTRACTORS:
+                path = os.path.join(tmp, extract.__name__)
+                ts = utils.duration()
+                extract(t, archive, path)
+                elapsed = ts.seconds
+                print(f"{generate.__name__:<18} {extract.__name__:<20} {files:>8} {elapsed:>7.2f}s "
+                      f"{size / (1 << 20) / max(elapsed, 1e-6):>7.1f} MB/s")
+                t.rmtree(path)
+
+            t.unlink(archive)
+
+
+if __name__ == '__main__':
+    main()